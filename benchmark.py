@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+=====================================
+Pruebas de rendimiento (benchmark.py)
+=====================================
+
+Programa para medir el rendimiento de las partes principales de :mod:main.py con datos sintéticos (ver
+:mod:generador.py), sin necesitar los datos reales de los pacientes. Cada escenario se corre en un proceso nuevo y se
+mide el tiempo de la parte que interesa (sin contar la lectura de los datos que necesita), la memoria máxima del
+proceso y el número de elementos procesados por segundo. Los resultados se agregan como una línea JSON por escenario
+al archivo de resultados, para poder compararlos entre versiones.
+
+Escenarios
+----------
+
+- carga: lee todos los archivos de entrada, incluyendo el cálculo de las prioridades de los pacientes.
+- prioridad: calcula las prioridades de los pacientes ya leidos (ver :func:`~pacientes.buscarPrioridades` y
+  :func:`~pacientes.calcularPrioridades`).
+- bloques: asigna las vacunas de todas las fases por bloques (ver :func:`main.planificarFase` y
+  :func:`main.asignarFase`).
+- rondas: asigna las vacunas de todas las fases un paciente a la vez (ver :func:`main.computeAsignaciones`). Es
+  mucho más lento que bloques.
+- fechas: busca y reserva un día por paciente en los calendarios de las clínicas con
+  :func:`~helper.getAppropriatedate`.
+- escritura: escribe asignaciones.csv con las asignaciones ya calculadas (ver :class:`~salida.EscritorAsignaciones`).
+- actualizacion: calcula las segundas dosis de los vacunados (ver :func:`main.runUpdate`).
+- arranque: corre ``python main.py -u`` en un proceso nuevo y mide el tiempo total, incluyendo el arranque de Python
+  y la importación de los módulos. También indica si se importó pandas, que solo debe importarse al leer archivos
+  grandes.
+
+Parametros de uso
+-----------------
+
+-n  Número de pacientes, o varios separados por comas (por defecto 10000).
+-k  Número de clínicas, o varios separados por comas (por defecto 50).
+-s  Semilla de los datos sintéticos (por defecto 0).
+-e  Escenarios a correr separados por comas (por defecto todos menos rondas).
+-r  Número de repeticiones de cada escenario; se guarda el menor tiempo (por defecto 1).
+-w  Folder donde se generan los datos sintéticos (por defecto benchmark_datos). Los datos de cada escala se generan
+    una sola vez y se vuelven a usar.
+-o  Archivo donde se agregan los resultados (por defecto benchmark_resultados.jsonl).
+-a  Archivo de resultados de una versión anterior. Se compara cada escenario con el último resultado de la misma
+    escala y el programa termina con código 1 si alguno es más lento que la tolerancia.
+-t  Tolerancia de la comparación, en fracción del tiempo anterior (por defecto 0.1).
+-b  Presupuesto en segundos del escenario arranque en todas las escalas. El programa termina con código 1 si el
+    escenario tarda más. Por defecto el presupuesto es de 0.5 segundos y solo se revisa en las escalas de hasta 10000
+    pacientes; con -b 0 no se revisa.
+
+Por ejemplo, ``python benchmark.py -n 10000,1000000 -k 50,2000 -a anterior.jsonl``.
+"""
+import datetime
+import getopt
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+from generador import generarEntradas
+from helper import getAppropriatedate, readPriorityEdad, readPriorityCargos, readPriorityUnidades, \
+    readPriorityMunicipios
+from models.asignaciones import BloqueAsignaciones
+from models.calendario import crearCalendarios, numeroDia
+from models.clinicas import readClinicas
+from models.colas import crearColas
+from models.config import readConfig
+from models.excluidos import readIndiceExclusion
+from models.existencias import Existencias
+from models.lotes import readLotes
+from models.perfil import memoriaMaxima
+from models.pacientes import readPacientes, buscarPrioridades, calcularPrioridades, COLUMNAS_ASIGNACION
+from models.salida import EscritorAsignaciones
+from models.vacunas import readVacunas
+
+ESCENARIOS = ['carga', 'prioridad', 'bloques', 'rondas', 'fechas', 'escritura', 'actualizacion', 'arranque']
+
+# Presupuesto por defecto del escenario arranque, en segundos, y escala máxima de pacientes en la que se revisa. Con
+# 10000 pacientes main.py -u tarda cerca de 0.3 s sin importar pandas, y solo importar pandas toma cerca de 0.5 s, por
+# lo que una corrida que vuelva a importarlo al arrancar se pasa del presupuesto. Con más pacientes el archivo de
+# vacunados es grande y sí se lee con pandas.
+PRESUPUESTO_ARRANQUE = 0.5
+ESCALA_PRESUPUESTO = 10000
+
+
+def _archivo(params, nombre):
+    """
+    :return: Ubicación del archivo de entrada *nombre*.
+    :rtype: String
+    """
+    return params.getPathToFiles() + nombre
+
+
+def _contarFilas(fn):
+    """
+    :return: Número de filas del archivo CSV *fn*, sin contar el encabezado.
+    :rtype: int
+    """
+    with open(fn, encoding='latin') as f:
+        return sum(1 for _ in f) - 1
+
+
+def _leerEntradas(params):
+    """
+    Lee las clínicas, vacunas, lotes, pacientes y excluidos como lo hace :func:`main.runInitialAssignment` con -x.
+    :return: Tupla (clínicas, vacunas, lotes, colas de pacientes).
+    :rtype: tuple
+    """
+    lista_de_clinicas = readClinicas(_archivo(params, params.getFileClinicas()))
+    lista_de_vacunas = readVacunas(_archivo(params, params.getFileVacunas()))
+    lotes = readLotes(_archivo(params, params.getFileLotes()))
+    main.prepararLotes(lotes, lista_de_vacunas)
+    tabla = readPacientes(_archivo(params, params.getFilePacientes()), params, tabla=True)
+    excluidos = readIndiceExclusion([_archivo(params, fn) for fn in params.getFilesExcluidos()])
+    codigos = tabla.getCodigos()
+    indices_por_unidad = tabla.getIndicesPorUnidad()
+    for unidad in indices_por_unidad:
+        indices_por_unidad[unidad] = excluidos.filtrar(codigos, indices_por_unidad[unidad])
+    return lista_de_clinicas, lista_de_vacunas, lotes, crearColas(codigos, indices_por_unidad)
+
+
+def _asignarPorBloques(params, lista_de_clinicas, lista_de_vacunas, lotes, pacientes):
+    """
+    :return: Generador de las asignaciones de todas las fases, calculadas por bloques.
+    :rtype: generator
+    """
+    existencias = Existencias(lotes)
+    for fase in lista_de_clinicas.getFases():
+        restantes = main.capacidadesFase(lista_de_clinicas, fase)
+        plan = main.planificarFase(lotes, lista_de_clinicas, restantes, existencias, fase)
+        calendarios = crearCalendarios(lista_de_clinicas, params)
+        yield from main.asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios, lista_de_vacunas, None)
+
+
+def medirCarga(params):
+    """
+    Escenario carga: lee todos los archivos de entrada.
+    :return: Tupla (segundos, elementos procesados, nombre de los elementos).
+    :rtype: tuple
+    """
+    inicio = time.perf_counter()
+    readClinicas(_archivo(params, params.getFileClinicas()))
+    readVacunas(_archivo(params, params.getFileVacunas()))
+    readLotes(_archivo(params, params.getFileLotes()))
+    readIndiceExclusion([_archivo(params, fn) for fn in params.getFilesExcluidos()])
+    n = len(readPacientes(_archivo(params, params.getFilePacientes()), params, tabla=True))
+    return time.perf_counter() - inicio, n, 'pacientes'
+
+
+def medirPrioridad(params):
+    """
+    Escenario prioridad: calcula las prioridades de los pacientes, sin contar la lectura de pacientes.csv.
+    """
+    df = pd.read_csv(_archivo(params, params.getFilePacientes()), encoding="latin", usecols=COLUMNAS_ASIGNACION)
+    tablas = (readPriorityEdad(_archivo(params, params.getFileEdad())),
+              readPriorityCargos(_archivo(params, params.getFileCargos())),
+              readPriorityUnidades(_archivo(params, params.getFileUnidades())),
+              readPriorityMunicipios(_archivo(params, params.getFileMuni())))
+    inicio = time.perf_counter()
+    calcularPrioridades(df, params, buscarPrioridades(df, *tablas))
+    return time.perf_counter() - inicio, len(df), 'pacientes'
+
+
+def medirBloques(params):
+    """
+    Escenario bloques: asigna las vacunas de todas las fases por bloques, sin escribir las asignaciones.
+    """
+    entradas = _leerEntradas(params)
+    inicio = time.perf_counter()
+    n = sum(len(bloque) for bloque in _asignarPorBloques(params, *entradas))
+    return time.perf_counter() - inicio, n, 'asignaciones'
+
+
+def medirRondas(params):
+    """
+    Escenario rondas: asigna las vacunas de todas las fases un paciente a la vez, sin escribir las asignaciones.
+    """
+    lista_de_clinicas, lista_de_vacunas, lotes, pacientes = _leerEntradas(params)
+    inicio = time.perf_counter()
+    n = 0
+    existencias = Existencias(lotes)
+    for fase in lista_de_clinicas.getFases():
+        restantes = main.capacidadesFase(lista_de_clinicas, fase)
+        n += len(main.computeAsignaciones(lotes, lista_de_clinicas, restantes, pacientes,
+                                          crearCalendarios(lista_de_clinicas, params), lista_de_vacunas, fase, None,
+                                          existencias))
+    return time.perf_counter() - inicio, n, 'asignaciones'
+
+
+def medirFechas(params):
+    """
+    Escenario fechas: busca y reserva un día por paciente, en una clínica y a partir de una fecha al azar.
+    """
+    lista_de_clinicas = readClinicas(_archivo(params, params.getFileClinicas()))
+    n = _contarFilas(_archivo(params, params.getFilePacientes()))
+    rng = np.random.default_rng(0)
+    clinicas = [lista_de_clinicas[i] for i in rng.integers(0, len(lista_de_clinicas), n).tolist()]
+    inicio_campana = numeroDia(datetime.datetime(2021, 1, 1))
+    fechas = (inicio_campana + rng.integers(0, 180, n)).tolist()
+    calendarios = crearCalendarios(lista_de_clinicas, params)
+    inicio = time.perf_counter()
+    for clinica, fecha in zip(clinicas, fechas):
+        dia = getAppropriatedate(clinica.getCodigo(), calendarios, fecha, params, clinica.getCapacidad())
+        calendarios[clinica.getCodigo()].reservar(dia)
+    return time.perf_counter() - inicio, n, 'fechas'
+
+
+def medirEscritura(params):
+    """
+    Escenario escritura: escribe asignaciones.csv con las asignaciones de todas las fases ya calculadas.
+    """
+    bloque = BloqueAsignaciones.concatenar(list(_asignarPorBloques(params, *_leerEntradas(params))))
+    inicio = time.perf_counter()
+    escritor = EscritorAsignaciones(_archivo(params, 'asignaciones.csv'), directorio=params.getPathToFiles())
+    escritor.agregar(bloque)
+    escritor.cerrar()
+    return time.perf_counter() - inicio, len(bloque), 'filas'
+
+
+def medirActualizacion(params):
+    """
+    Escenario actualizacion: corre :func:`main.runUpdate` completo, incluyendo la lectura de los archivos.
+    """
+    n = _contarFilas(_archivo(params, params.getFileVacunados()))
+    inicio = time.perf_counter()
+    main.runUpdate(False, False)
+    return time.perf_counter() - inicio, n, 'vacunados'
+
+
+def medirArranque(params):
+    """
+    Escenario arranque: corre ``main.py -u`` en un proceso nuevo de Python, en el folder de los datos sintéticos.
+    El tiempo incluye el arranque del intérprete y la importación de los módulos; con -X importtime se revisa si se
+    importó pandas.
+    :return: Tupla (segundos, elementos procesados, nombre de los elementos, datos extra del resultado).
+    :rtype: tuple
+    """
+    n = _contarFilas(_archivo(params, params.getFileVacunados()))
+    fn_main = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    inicio = time.perf_counter()
+    corrida = subprocess.run([sys.executable, '-X', 'importtime', fn_main, '-u'], cwd=params.getPathToFiles(),
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    segundos = time.perf_counter() - inicio
+    pandas = any(linea.startswith('import time:') and linea.split('|')[-1].strip() == 'pandas'
+                 for linea in corrida.stderr.splitlines())
+    return segundos, n, 'vacunados', {'pandas': pandas}
+
+
+MEDICIONES = {'carga': medirCarga, 'prioridad': medirPrioridad, 'bloques': medirBloques, 'rondas': medirRondas,
+              'fechas': medirFechas, 'escritura': medirEscritura, 'actualizacion': medirActualizacion,
+              'arranque': medirArranque}
+
+
+def correrEscenario(escenario, fn_config):
+    """
+    Corre un escenario. Se llama en un proceso nuevo (ver :func:`medir`), para que la memoria máxima sea solo la del
+    escenario.
+    :param escenario: Nombre del escenario (ver :data:`ESCENARIOS`).
+    :type escenario: String
+    :param fn_config: Ubicación del ``config.txt`` de los datos sintéticos.
+    :type fn_config: String
+    :return: Tupla (segundos, elementos procesados, nombre de los elementos, memoria máxima en MB, datos extra del
+        resultado).
+    :rtype: tuple
+    """
+    main.params = readConfig(fn_config)
+    segundos, n, unidad, *extra = MEDICIONES[escenario](main.params)
+    return segundos, n, unidad, memoriaMaxima(), extra[0] if extra else {}
+
+
+def medir(escenario, fn_config, repeticiones=1):
+    """
+    Corre *repeticiones* veces el escenario, cada vez en un proceso nuevo.
+    :return: Diccionario con el menor tiempo, todos los tiempos, la memoria máxima y los elementos procesados por
+        segundo.
+    :rtype: dict
+    """
+    contexto = multiprocessing.get_context('spawn')
+    tiempos = []
+    memoria = None
+    for _ in range(repeticiones):
+        with contexto.Pool(1) as pool:
+            segundos, n, unidad, rss, extra = pool.apply(correrEscenario, (escenario, fn_config))
+        tiempos.append(segundos)
+        if rss is not None:
+            memoria = max(memoria or 0, rss)
+    mejor = min(tiempos)
+    result = {'segundos': round(mejor, 4), 'tiempos': [round(t, 4) for t in tiempos],
+              'rss_mb': None if memoria is None else round(memoria, 1), 'elementos': n, 'unidad': unidad,
+              'por_segundo': round(n / mejor, 1) if mejor > 0 else None}
+    result.update(extra)
+    return result
+
+
+def getVersion():
+    """
+    :return: Commit de git de esta versión del programa, o None si no se puede obtener.
+    :rtype: String
+    """
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(
+            __file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepararDatos(directorio, num_pacientes, num_clinicas, semilla):
+    """
+    Genera los datos sintéticos de una escala en un subfolder de *directorio*, si no se generaron antes.
+    :return: Ubicación del ``config.txt`` de los datos.
+    :rtype: String
+    """
+    destino = os.path.join(directorio, 'p' + str(num_pacientes) + '_c' + str(num_clinicas) + '_s' + str(semilla))
+    fn = os.path.join(os.path.abspath(destino), 'config.txt')
+    if not os.path.isfile(fn):
+        print("Generando " + str(num_pacientes) + " pacientes y " + str(num_clinicas) + " clínicas...")
+        fn = generarEntradas(destino, num_pacientes, num_clinicas, semilla)
+    return fn
+
+
+def leerResultados(fn):
+    """
+    :param fn: Archivo de resultados.
+    :type fn: String
+    :return: Diccionario con llave (escenario, pacientes, clínicas) y valor el último resultado guardado.
+    :rtype: dict
+    """
+    result = {}
+    with open(fn) as f:
+        for linea in f:
+            if linea.strip():
+                r = json.loads(linea)
+                result[(r['escenario'], r['pacientes'], r['clinicas'])] = r
+    return result
+
+
+def compararResultados(resultado, anteriores, tolerancia):
+    """
+    :return: True si *resultado* es más lento que el resultado anterior de la misma escala por más de *tolerancia*.
+    :rtype: bool
+    """
+    anterior = anteriores.get((resultado['escenario'], resultado['pacientes'], resultado['clinicas']))
+    if anterior is None:
+        return False
+    cambio = resultado['segundos'] / anterior['segundos'] - 1 if anterior['segundos'] > 0 else 0.0
+    regresion = cambio > tolerancia
+    print("    antes " + str(anterior['segundos']) + " s (" + str(anterior.get('version')) + "), cambio " +
+          "{:+.1%}".format(cambio) + (" REGRESION" if regresion else ""))
+    return regresion
+
+
+def correrBenchmark(argv):
+    """
+    Programa principal que recibe los parametros de entrada y corre los escenarios.
+    """
+    escalas_pacientes = [10000]
+    escalas_clinicas = [50]
+    semilla = 0
+    escenarios = [e for e in ESCENARIOS if e != 'rondas']
+    repeticiones = 1
+    directorio = 'benchmark_datos'
+    fn_resultados = 'benchmark_resultados.jsonl'
+    anteriores = None
+    tolerancia = 0.1
+    presupuesto = None
+
+    try:
+        opts, args = getopt.getopt(argv, "n:k:s:e:r:w:o:a:t:b:")
+    except getopt.GetoptError:
+        print('Argumento no reconocido')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-n':
+            escalas_pacientes = [int(n) for n in arg.split(',')]
+        if opt == '-k':
+            escalas_clinicas = [int(k) for k in arg.split(',')]
+        if opt == '-s':
+            semilla = int(arg)
+        if opt == '-e':
+            escenarios = arg.split(',')
+            for e in escenarios:
+                if e not in MEDICIONES:
+                    print('Escenario desconocido: ' + e + '. Los escenarios son ' + ', '.join(ESCENARIOS))
+                    sys.exit(2)
+        if opt == '-r':
+            repeticiones = max(int(arg), 1)
+        if opt == '-w':
+            directorio = arg
+        if opt == '-o':
+            fn_resultados = arg
+        if opt == '-a':
+            anteriores = leerResultados(arg)
+        if opt == '-t':
+            tolerancia = float(arg)
+        if opt == '-b':
+            presupuesto = float(arg)
+
+    version = getVersion()
+    maquina = {'sistema': platform.platform(), 'procesador': platform.processor() or platform.machine(),
+               'cpus': os.cpu_count(), 'python': platform.python_version(), 'numpy': np.__version__,
+               'pandas': pd.__version__}
+    regresiones = 0
+    for num_pacientes in escalas_pacientes:
+        for num_clinicas in escalas_clinicas:
+            fn_config = prepararDatos(directorio, num_pacientes, num_clinicas, semilla)
+            for escenario in escenarios:
+                resultado = {'escenario': escenario, 'pacientes': num_pacientes, 'clinicas': num_clinicas,
+                             'semilla': semilla, 'version': version,
+                             'fecha': datetime.datetime.now().isoformat(timespec='seconds')}
+                resultado.update(medir(escenario, fn_config, repeticiones))
+                resultado['maquina'] = maquina
+                print(escenario + " (" + str(num_pacientes) + " pacientes, " + str(num_clinicas) + " clínicas): " +
+                      str(resultado['segundos']) + " s, " + str(resultado['por_segundo']) + " " +
+                      resultado['unidad'] + "/s, " + str(resultado['rss_mb']) + " MB" +
+                      (", pandas importado" if resultado.get('pandas') else ""))
+                with open(fn_resultados, 'a') as f:
+                    f.write(json.dumps(resultado) + "\n")
+                if anteriores is not None and compararResultados(resultado, anteriores, tolerancia):
+                    regresiones += 1
+                limite = presupuesto
+                if limite is None and num_pacientes <= ESCALA_PRESUPUESTO:
+                    limite = PRESUPUESTO_ARRANQUE
+                if escenario == 'arranque' and limite and resultado['segundos'] > limite:
+                    print("    más lento que el presupuesto de " + str(limite) + " s")
+                    regresiones += 1
+    if regresiones:
+        print(str(regresiones) + " escenarios más lentos que la versión anterior o que el presupuesto.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    correrBenchmark(sys.argv[1:])
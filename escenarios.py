@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+==================================================
+Comparación de escenarios de pesos (escenarios.py)
+==================================================
+
+Programa para comparar cómo cambia la asignación de vacunas con distintos pesos de prioridad de ``config.txt``
+(pesoEdad, pesoHabita, pesoCovid, etc.) sin correr :mod:main.py una vez por combinación de pesos. Los archivos de
+entrada se leen una sola vez: se buscan las prioridades sin ponderar de cada paciente (ver
+:func:`~pacientes.buscarPrioridades`) y se guardan, junto con la unidad de cada paciente, en un folder temporal. Cada
+escenario se corre en un proceso que abre esos arreglos mapeados en memoria (ver :func:`~cache.leerArreglos`), por lo
+que todos los procesos comparten la misma memoria física. Para cada escenario solo se vuelve a calcular la prioridad
+combinada con sus pesos (ver :func:`~pacientes.ponderarPrioridades`) y se asignan las vacunas por bloques con el
+mismo resultado que ``main.py -x``; el plan de cuántos pacientes toma cada clínica de cada lote no depende de los
+pesos y se calcula una sola vez.
+
+Al terminar se muestra y se guarda una tabla con una fila por escenario y las columnas:
+
+- escenario: nombre del escenario.
+- Los pesos del escenario.
+- pacientes: número de pacientes asignados.
+- Una columna por fase con el número de primeras dosis asignadas en esa fase.
+- ultima_fecha: fecha de la última vacuna (primera o segunda dosis) de todas las clínicas.
+- espera_promedio: días promedio desde que llega el primer lote hasta la primera dosis de los pacientes asignados.
+- espera_riesgo: lo mismo, solo de los pacientes que tuvieron COVID-19, son diabéticos, tienen sobrepeso o cancer.
+- espera_mayores: lo mismo, solo de los pacientes de 60 años o más.
+- riesgo_asignados y mayores_asignados: número de pacientes asignados de esos grupos.
+- segundos: tiempo que tomó el escenario.
+
+La fecha de la última vacuna de cada clínica en cada escenario se guarda en otro archivo.
+
+La prioridad combinada suma la prioridad por edad una vez por cada componente positivo (ver
+:func:`~pacientes.ponderarPrioridades`), por lo que no todos los pesos cambian el orden de los pacientes:
+
+- pesoVih y pesoRenal no se usan al calcular la prioridad; -g no los acepta.
+- De pesoHabita, pesoTrabaja, pesoCargo, pesoCovid, pesoDiabetes, pesoPeso y pesoCancer solo importa si son positivos.
+- pesoEdad divide a toda la prioridad por igual; solo cambia el orden de los pacientes sin una edad válida, cuya
+  prioridad por edad es fija.
+
+Antes de correr los escenarios se avisa cuáles tienen la misma prioridad que otro escenario, solo en otra escala, y
+por lo tanto los mismos resultados.
+
+Parametros de uso
+-----------------
+
+-g  Nombre de un peso y sus valores separados por comas, por ejemplo -g pesoCovid=0,1. Se puede repetir; se corren
+    todas las combinaciones de los valores.
+-l  Archivo CSV con un escenario por fila y una columna por peso. Los pesos que no están en el archivo se toman de
+    config.txt. Si el archivo tiene la columna nombre, es el nombre del escenario.
+-j  Número de procesos en los que se corren los escenarios y se lee el archivo de pacientes (por defecto 1).
+-o  Archivo CSV donde se guarda la tabla de escenarios (por defecto escenarios.csv). La fecha de la última vacuna
+    de cada clínica se guarda en el mismo nombre terminado en _clinicas.csv.
+
+Sin -g ni -l se corre solo el escenario de config.txt. Por ejemplo,
+``python escenarios.py -g pesoCovid=0,1 -g pesoDiabetes=0,1 -j 4``.
+"""
+import csv
+import getopt
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import main
+from helper import readPriorityEdad, readPriorityCargos, readPriorityUnidades, readPriorityMunicipios
+from models.cache import guardarArreglos, leerArreglos
+from models.calendario import crearCalendarios
+from models.clinicas import readClinicas
+from models.colas import crearColasSeleccion
+from models.config import readConfig, PESOS
+from models.excluidos import readIndiceExclusion
+from models.lotes import readLotes
+from models.pacientes import TablaPacientes, leerCSVEnPartes, buscarPrioridades, buscarCondiciones, \
+    calcularPrioridades, ponderarPrioridades, COLUMNAS_ASIGNACION
+from models.tablas import leerFilas
+from models.vacunas import readVacunas
+
+# Edad a partir de la cual un paciente cuenta en espera_mayores.
+EDAD_MAYORES = 60
+
+# Arreglos de los pacientes que comparten los escenarios.
+PRIORIDADES = ('priorityEdad', 'priorityCargo', 'priorityHabita', 'priorityDependencia')
+CONDICIONES = ('tuvoCovid', 'diabetico', 'sobrepeso', 'cancer')
+
+# Pesos de config.txt que no se usan al calcular la prioridad (ver pacientes.ponderarPrioridades).
+PESOS_SIN_USO = ('pesoVih', 'pesoRenal')
+
+# Datos de los escenarios en cada proceso (ver iniciarProceso).
+_DATOS = {}
+
+
+def leerEscenarioBase(params, directorio, trabajos=1):
+    """
+    Lee los archivos de entrada y guarda en *directorio* los arreglos de los pacientes que necesitan los escenarios:
+    las prioridades sin ponderar, las condiciones, la edad y los indices de los pacientes agrupados por unidad (sin
+    los excluidos, igual que con ``main.py -x``).
+
+    :param params: Parametros de la configuracion
+    :type params: ConfigParams
+    :param directorio: Folder donde se guardan los arreglos. Debe existir.
+    :type directorio: String
+    :param trabajos: Opcional. Número de procesos en los que se lee el archivo de pacientes.
+    :type trabajos: int
+    :return: Tupla (lista de clínicas, diccionario de vacunas, lista de lotes ordenados, plan de cada fase).
+    :rtype: tuple
+    :raises ValueError: Si el archivo de pacientes es un padrón, que no guarda las prioridades sin ponderar.
+    """
+    ruta = params.getPathToFiles()
+    fn = ruta + params.getFilePacientes()
+    if os.path.isdir(fn):
+        raise ValueError("Los escenarios necesitan el archivo de pacientes, no el padrón " + fn)
+    lista_de_clinicas = readClinicas(ruta + params.getFileClinicas())
+    lista_de_vacunas = readVacunas(ruta + params.getFileVacunas())
+    lotes = readLotes(ruta + params.getFileLotes())
+    main.prepararLotes(lotes, lista_de_vacunas)
+    excluidos = readIndiceExclusion([ruta + fn_excluidos for fn_excluidos in params.getFilesExcluidos()])
+
+    df = leerCSVEnPartes(fn, COLUMNAS_ASIGNACION, trabajos)
+    prioridades = buscarPrioridades(df, readPriorityEdad(ruta + params.getFileEdad()),
+                                    readPriorityCargos(ruta + params.getFileCargos()),
+                                    readPriorityUnidades(ruta + params.getFileUnidades()),
+                                    readPriorityMunicipios(ruta + params.getFileMuni()))
+    condiciones = buscarCondiciones(df)
+    calcularPrioridades(df, params, prioridades)
+    tabla = TablaPacientes.desdeDataFrame(fn, df, ordenar=False)
+    codigos = tabla.getCodigos()
+    indices_por_unidad = tabla.getGruposPorUnidad()
+    for unidad in indices_por_unidad:
+        indices_por_unidad[unidad] = excluidos.filtrar(codigos, indices_por_unidad[unidad])
+
+    arreglos = dict(zip(PRIORIDADES, prioridades))
+    arreglos.update(zip(CONDICIONES, condiciones))
+    arreglos['edad'] = df['edad'].to_numpy(np.int64)
+    unidades = list(indices_por_unidad)
+    arreglos['orden'] = np.concatenate([indices_por_unidad[u] for u in unidades] + [np.zeros(0, dtype=np.int64)])
+    arreglos['limites'] = np.cumsum([0] + [len(indices_por_unidad[u]) for u in unidades])
+    guardarArreglos(directorio, arreglos, {'unidades': unidades})
+    return lista_de_clinicas, lista_de_vacunas, lotes, main.planificarFases(lotes, lista_de_clinicas,
+                                                                            lista_de_clinicas.getFases())
+
+
+def iniciarProceso(directorio, parametros, lista_de_clinicas, lista_de_vacunas, lotes, planes):
+    """
+    Abre los arreglos guardados por :func:`leerEscenarioBase` mapeados en memoria y guarda los datos que comparten
+    los escenarios del proceso.
+
+    :return: None
+    """
+    arreglos, objetos = leerArreglos(directorio, mmap=True)
+    _DATOS.update(arreglos=arreglos, unidades=objetos['unidades'], params=parametros,
+                  lista_de_clinicas=lista_de_clinicas, lista_de_vacunas=lista_de_vacunas, lotes=lotes, planes=planes,
+                  tomas=main.tomasPorUnidad(planes, lista_de_clinicas))
+
+
+def _promedio(valores):
+    """
+    :return: El promedio de *valores* redondeado a dos decimales, o None si no hay valores.
+    :rtype: float
+    """
+    return round(float(valores.mean()), 2) if len(valores) > 0 else None
+
+
+def correrEscenario(escenario):
+    """
+    Asigna las vacunas de todas las fases con los pesos del escenario. Se llama en cada proceso después de
+    :func:`iniciarProceso`.
+
+    :param escenario: Tupla (nombre, diccionario de pesos).
+    :type escenario: tuple
+    :return: Tupla (fila de la tabla de escenarios, diccionario con llave el código de la clínica y valor la fecha
+        de su última vacuna).
+    :rtype: tuple
+    """
+    inicio = time.perf_counter()
+    nombre, pesos = escenario
+    arreglos = _DATOS['arreglos']
+    lista_de_clinicas = _DATOS['lista_de_clinicas']
+    params = _DATOS['params'].conPesos(pesos)
+    priority = ponderarPrioridades([arreglos[p] for p in PRIORIDADES], [arreglos[c] for c in CONDICIONES], params)[-1]
+    orden, limites = arreglos['orden'], arreglos['limites']
+    indices_por_unidad = {unidad: orden[limites[k]:limites[k + 1]] for k, unidad in enumerate(_DATOS['unidades'])}
+    # Las colas devuelven el indice de cada paciente en lugar de su código.
+    pacientes = crearColasSeleccion(np.arange(len(priority)), indices_por_unidad, priority, _DATOS['tomas'])
+
+    result = {'escenario': nombre}
+    result.update(params.getPesos())
+    dosis = {}
+    ultimas = {}
+    indices = []
+    fechas = []
+    for fase, plan in zip(lista_de_clinicas.getFases(), _DATOS['planes']):
+        calendarios = crearCalendarios(lista_de_clinicas, params)
+        dosis[fase] = 0
+        for bloque in main.asignarFase(_DATOS['lotes'], lista_de_clinicas, plan, pacientes, calendarios,
+                                       _DATOS['lista_de_vacunas'], None):
+            primera = bloque.dosis == 1
+            indices.append(bloque.ids[primera].astype(np.int64))
+            fechas.append(bloque.fechas[primera])
+            dosis[fase] += int(primera.sum())
+            clinica = bloque.dependencias[0]
+            ultimas[clinica] = max(ultimas.get(clinica, bloque.fechas.max()), bloque.fechas.max())
+
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    fechas = np.concatenate(fechas) if fechas else np.zeros(0, dtype='datetime64[D]')
+    esperas = np.zeros(0)
+    if _DATOS['lotes']:
+        esperas = (fechas.astype(np.int64) - min(lote.getDia() for lote in _DATOS['lotes'])).astype(np.float64)
+    riesgo = np.any([arreglos[c][indices] > 0 for c in CONDICIONES], axis=0) if len(indices) else indices > 0
+    mayores = arreglos['edad'][indices] >= EDAD_MAYORES
+    result['pacientes'] = len(indices)
+    result.update(dosis)
+    result['ultima_fecha'] = str(max(ultimas.values())) if ultimas else None
+    result['espera_promedio'] = _promedio(esperas)
+    result['espera_riesgo'] = _promedio(esperas[riesgo])
+    result['espera_mayores'] = _promedio(esperas[mayores])
+    result['riesgo_asignados'] = int(riesgo.sum())
+    result['mayores_asignados'] = int(mayores.sum())
+    result['segundos'] = round(time.perf_counter() - inicio, 3)
+    return result, {clinica: str(fecha) for clinica, fecha in ultimas.items()}
+
+
+def leerValor(texto):
+    """
+    :param texto: Valor de un peso.
+    :type texto: String
+    :return: El peso como entero, o como número real si no es entero.
+    :rtype: float
+    """
+    try:
+        return int(texto)
+    except ValueError:
+        return float(texto)
+
+
+def crearMalla(valores_por_peso):
+    """
+    :param valores_por_peso: Lista de tuplas (nombre del peso, lista de valores).
+    :type valores_por_peso: list
+    :return: Lista de escenarios (nombre, pesos) con todas las combinaciones de los valores.
+    :rtype: list
+    """
+    nombres = [nombre for nombre, _ in valores_por_peso]
+    result = []
+    for valores in itertools.product(*[valores for _, valores in valores_por_peso]):
+        pesos = dict(zip(nombres, valores))
+        result.append((" ".join(n + "=" + str(v) for n, v in pesos.items()), pesos))
+    return result
+
+
+def llaveOrden(pesos, edades_validas):
+    """
+    :param pesos: Diccionario con todos los pesos de un escenario.
+    :type pesos: dict
+    :param edades_validas: True si todos los pacientes tienen una edad válida.
+    :type edades_validas: bool
+    :return: Lo único de los *pesos* que puede cambiar el orden de los pacientes (ver el docstring del módulo): si
+        cada peso es positivo y, si hay pacientes sin una edad válida, el valor de pesoEdad.
+    :rtype: tuple
+    """
+    result = []
+    for nombre in PESOS:
+        if nombre in PESOS_SIN_USO:
+            continue
+        peso = pesos[nombre]
+        result.append(peso if nombre == 'pesoEdad' and peso > 0 and not edades_validas else peso > 0)
+    return tuple(result)
+
+
+def avisarRepetidos(escenarios, params, directorio):
+    """
+    Muestra una advertencia por cada escenario que tiene la misma prioridad que uno anterior, solo en otra escala.
+
+    :param escenarios: Lista de escenarios (nombre, pesos).
+    :type escenarios: list
+    :param params: Parametros de la configuracion
+    :type params: ConfigParams
+    :param directorio: Folder con los arreglos guardados por :func:`leerEscenarioBase`.
+    :type directorio: String
+    :return: None
+    """
+    arreglos, _ = leerArreglos(directorio, mmap=True)
+    edades_validas = not (arreglos['priorityEdad'] == -1).any()
+    vistos = {}
+    for nombre, pesos in escenarios:
+        llave = llaveOrden(params.conPesos(pesos).getPesos(), edades_validas)
+        if llave in vistos:
+            print("Advertencia: El escenario " + nombre + " tiene la misma prioridad que " + vistos[llave] +
+                  ", solo en otra escala, por lo que sus resultados son los mismos.")
+        else:
+            vistos[llave] = nombre
+
+
+def leerLista(fn):
+    """
+    :param fn: Archivo CSV con un escenario por fila (ver el parámetro -l).
+    :type fn: String
+    :return: Lista de escenarios (nombre, pesos).
+    :rtype: list
+    """
+    result = []
+    for i, fila in enumerate(leerFilas(fn)):
+        nombre = fila.pop('nombre', None)
+        # Las columnas con vacíos se leen como números reales.
+        pesos = {peso: int(valor) if isinstance(valor, float) and valor.is_integer() else valor
+                 for peso, valor in fila.items() if valor == valor}
+        result.append((str(nombre) if nombre == nombre and nombre is not None else 'fila ' + str(i + 1), pesos))
+    return result
+
+
+def guardarTabla(fn, filas, columnas):
+    """
+    Guarda *filas* (diccionarios) en el archivo CSV *fn* con las *columnas* dadas.
+
+    :return: None
+    """
+    with open(fn, 'w', newline='') as f:
+        escritor = csv.DictWriter(f, columnas)
+        escritor.writeheader()
+        escritor.writerows(filas)
+
+
+def mostrarTabla(filas, columnas):
+    """
+    Muestra *filas* (diccionarios) como una tabla con las columnas alineadas.
+
+    :return: None
+    """
+    textos = [[str(c) for c in columnas]] + [['' if fila.get(c) is None else str(fila[c]) for c in columnas]
+                                            for fila in filas]
+    anchos = [max(len(t[i]) for t in textos) for i in range(len(columnas))]
+    for t in textos:
+        print("  ".join(v.rjust(a) for v, a in zip(t, anchos)))
+
+
+def correrEscenarios(argv):
+    """
+    Programa principal que recibe los parametros de entrada y corre los escenarios.
+    """
+    valores_por_peso = []
+    lista = []
+    trabajos = 1
+    fn_resultados = 'escenarios.csv'
+
+    try:
+        opts, args = getopt.getopt(argv, "g:l:j:o:")
+    except getopt.GetoptError:
+        print('Argumento no reconocido')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-g':
+            nombre, _, valores = arg.partition('=')
+            if nombre in PESOS_SIN_USO:
+                print('El peso ' + nombre + ' no se usa al calcular la prioridad, no cambia los escenarios')
+                sys.exit(2)
+            if nombre not in PESOS or not valores:
+                print('El parámetro -g debe ser un peso seguido de sus valores, por ejemplo pesoCovid=0,1. Los pesos '
+                      'son ' + ', '.join(peso for peso in PESOS if peso not in PESOS_SIN_USO))
+                sys.exit(2)
+            try:
+                valores_por_peso.append((nombre, [leerValor(v) for v in valores.split(',')]))
+            except ValueError:
+                print('Los valores de ' + nombre + ' deben ser números')
+                sys.exit(2)
+        if opt == '-l':
+            lista += leerLista(arg)
+        if opt == '-j':
+            if not arg.isdigit() or int(arg) < 1:
+                print('El número de procesos debe ser un entero positivo')
+                sys.exit(2)
+            trabajos = int(arg)
+        if opt == '-o':
+            fn_resultados = arg
+
+    params = readConfig('config.txt')
+    escenarios = (crearMalla(valores_por_peso) if valores_por_peso else []) + lista
+    if not escenarios:
+        escenarios = [('config.txt', {})]
+    for nombre, pesos in escenarios:
+        try:
+            params.conPesos(pesos)
+        except ValueError as e:
+            print('Escenario ' + nombre + ': ' + str(e))
+            sys.exit(2)
+
+    with tempfile.TemporaryDirectory(prefix='escenarios_') as directorio:
+        print("Leyendo archivos de entrada...")
+        lista_de_clinicas, lista_de_vacunas, lotes, planes = leerEscenarioBase(params, directorio, trabajos)
+        if len(set(c.getCodigo() for c in lista_de_clinicas)) < len(lista_de_clinicas):
+            print("Hay clínicas con el mismo código, no se pueden correr los escenarios.")
+            sys.exit(2)
+        avisarRepetidos(escenarios, params, directorio)
+        datos = (directorio, params, lista_de_clinicas, lista_de_vacunas, lotes, planes)
+        print("Corriendo " + str(len(escenarios)) + " escenarios en " + str(trabajos) + " procesos...")
+        if trabajos > 1:
+            with ProcessPoolExecutor(max_workers=trabajos, initializer=iniciarProceso, initargs=datos) as executor:
+                resultados = list(executor.map(correrEscenario, escenarios))
+        else:
+            iniciarProceso(*datos)
+            resultados = [correrEscenario(escenario) for escenario in escenarios]
+            _DATOS.clear()
+
+    columnas = (['escenario'] + list(PESOS) + ['pacientes'] + lista_de_clinicas.getFases() +
+                ['ultima_fecha', 'espera_promedio', 'espera_riesgo', 'espera_mayores', 'riesgo_asignados',
+                 'mayores_asignados', 'segundos'])
+    filas = [fila for fila, _ in resultados]
+    mostrarTabla(filas, columnas)
+    guardarTabla(fn_resultados, filas, columnas)
+    fn_clinicas = os.path.splitext(fn_resultados)[0] + '_clinicas.csv'
+    guardarTabla(fn_clinicas, [{'escenario': fila['escenario'], 'clinica': clinica, 'ultima_fecha': fecha}
+                               for fila, ultimas in resultados for clinica, fecha in ultimas.items()],
+                 ['escenario', 'clinica', 'ultima_fecha'])
+    print("\nTabla de escenarios guardada en " + fn_resultados + " y fechas por clínica en " + fn_clinicas)
+
+
+if __name__ == "__main__":
+    correrEscenarios(sys.argv[1:])
@@ -0,0 +1,213 @@
+"""
+============
+generador.py
+============
+
+Módulo que genera archivos de entrada sintéticos (clínicas, pacientes, lotes, vacunas, excluidos, vacunados, tablas
+de prioridades y ``config.txt``) con el mismo formato que los archivos reales, para poder medir el programa a gran
+escala sin usar datos personales. Los archivos se generan con una semilla, de modo que con los mismos parámetros
+siempre se obtienen los mismos archivos. Consta del método :func:`~generador.generarEntradas` que escribe todos los
+archivos en un folder.
+Este módulo es utilizado por :mod:benchmark.py y también se puede correr directamente:
+
+``python generador.py -n 1000000 -k 500 -s 1 folder``
+
+-n  Número de pacientes (por defecto 10000).
+-k  Número de clínicas (por defecto 50).
+-s  Semilla (por defecto 0).
+"""
+import datetime
+import getopt
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_PACIENTES = ['codigo', 'nit', 'nombre', 'sexo', 'numafiliado', 'fdn', 'edad', 'renglon', 'cargo',
+                      'numempleado', 'codigoHabita', 'departamento', 'municipio', 'zona', 'direccion',
+                      'nombredependencia', 'departamentoDependencia', 'municipioDependencia',
+                      'nombreUnidadAdscripcion', 'Fase', 'SubFase', 'tuvoCovid', 'diabetico', 'sobrepeso', 'cancer',
+                      'VIH', 'Renal']
+FASES = ['n1a', 'n1b', 'n1c', 'n2a', 'n2b', 'n2c', 'n2d', 'n3a', 'n4a', 'n4b', 'n4c', 'n4d']
+CARGOS = ['Medico', 'Enfermera', 'Tecnico', 'Administrativo', 'Conserje', 'Piloto', 'Bodeguero']
+VACUNAS = [(1, 'Pfizer', 2, 3, -70), (2, 'Moderna', 2, 4, -20), (3, 'AstraZeneca', 2, 12, 4)]
+INICIO = datetime.date(2021, 1, 1)
+# Número de pacientes que se generan y escriben a la vez.
+TAMANO_PARTE = 500000
+
+
+def _escribir(fn, df, encabezado=True):
+    with open(fn, 'a' if not encabezado else 'w', encoding='latin', newline='') as f:
+        df.to_csv(f, header=encabezado, index=False)
+
+
+def _fechas(rng, n, dias):
+    """
+    :return: *n* fechas al azar en los primeros *dias* días a partir de :data:`INICIO`, como texto dd/mm/aaaa.
+    :rtype: numpy.ndarray
+    """
+    fechas = np.datetime64(INICIO) + rng.integers(0, dias, n).astype('timedelta64[D]')
+    return pd.Series(fechas).dt.strftime('%d/%m/%Y').to_numpy()
+
+
+def generarEntradas(destino, num_pacientes=10000, num_clinicas=50, semilla=0, fraccion_capacidad=0.5,
+                    fraccion_excluidos=0.02, fraccion_vacunados=0.1, num_lotes=8, num_municipios=340):
+    """
+    Genera todos los archivos de entrada en el folder *destino*, incluyendo un ``config.txt`` que apunta a ellos.
+
+    Los pacientes se reparten entre las clínicas de forma desigual (unas pocas clínicas grandes y muchas pequeñas),
+    y a cada clínica le tocan en total vacunas para *fraccion_capacidad* de sus pacientes, repartidas al azar entre
+    las fases, de modo que nunca se queda sin pacientes. Los lotes traen un poco más del doble de esas vacunas.
+
+    :param destino: Folder donde se escriben los archivos. Se crea si no existe. No debe tener espacios.
+    :type destino: String
+    :param num_pacientes: Opcional. Número de pacientes.
+    :type num_pacientes: int
+    :param num_clinicas: Opcional. Número de clínicas.
+    :type num_clinicas: int
+    :param semilla: Opcional. Semilla del generador de números al azar.
+    :type semilla: int
+    :param fraccion_capacidad: Opcional. Fracción de los pacientes de cada clínica que se vacunan en el plan.
+    :type fraccion_capacidad: float
+    :param fraccion_excluidos: Opcional. Fracción de los pacientes que se excluyen.
+    :type fraccion_excluidos: float
+    :param fraccion_vacunados: Opcional. Fracción de los pacientes que ya fueron vacunados.
+    :type fraccion_vacunados: float
+    :param num_lotes: Opcional. Número de lotes de vacunas.
+    :type num_lotes: int
+    :param num_municipios: Opcional. Número de municipios donde habitan los pacientes.
+    :type num_municipios: int
+    :return: Ubicación del ``config.txt`` generado.
+    :rtype: String
+    """
+    os.makedirs(destino, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    ruta = os.path.join(os.path.abspath(destino), '')
+
+    codigos_clinica = 1000 + np.arange(num_clinicas)
+    pesos = 1 / (np.arange(num_clinicas) + 10)
+    pesos = rng.permutation(pesos / pesos.sum())
+    departamentos = np.array(['Departamento' + str(i % 22 + 1) for i in range(num_municipios)], dtype=object)
+    municipios = np.array(['Municipio' + str(i + 1) for i in range(num_municipios)], dtype=object)
+
+    # Pacientes, por partes para no tener todo el archivo en memoria.
+    poblacion = np.zeros(num_clinicas, dtype=np.int64)
+    si_no = np.array(['Si', 'No', ''], dtype=object)
+    cargos = np.array(CARGOS + [''], dtype=object)
+    for inicio in range(0, max(num_pacientes, 1), TAMANO_PARTE):
+        n = min(TAMANO_PARTE, num_pacientes - inicio)
+        indices = np.arange(inicio, inicio + n)
+        unidad = rng.choice(num_clinicas, n, p=pesos)
+        poblacion += np.bincount(unidad, minlength=num_clinicas)
+        edad = rng.integers(18, 96, n)
+        lugar = rng.integers(0, num_municipios, n)
+        departamento = departamentos[lugar]
+        municipio = municipios[lugar]
+        df = pd.DataFrame({
+            'codigo': 100000 + indices, 'nit': rng.integers(1000000, 99999999, n),
+            'nombre': 'Paciente ' + pd.Series(indices).astype(str), 'sexo': rng.choice(['M', 'F'], n),
+            'numafiliado': rng.integers(1, 10000000, n),
+            'fdn': '01/01/' + pd.Series(INICIO.year - edad).astype(str), 'edad': edad, 'renglon': '011',
+            'cargo': cargos[rng.integers(0, len(cargos), n)], 'numempleado': indices,
+            'codigoHabita': rng.integers(1, 100, n), 'departamento': departamento, 'municipio': municipio,
+            'zona': rng.integers(1, 22, n), 'direccion': 'Calle ' + pd.Series(indices % 100).astype(str),
+            'nombredependencia': 'Dependencia', 'departamentoDependencia': departamento,
+            'municipioDependencia': municipio, 'nombreUnidadAdscripcion': codigos_clinica[unidad],
+            'Fase': rng.integers(1, 5, n), 'SubFase': rng.choice(['a', 'b', 'c', 'd'], n)})
+        for columna in COLUMNAS_PACIENTES[21:]:
+            df[columna] = si_no[rng.integers(0, 3, n)]
+        _escribir(ruta + 'pacientes.csv', df[COLUMNAS_PACIENTES], encabezado=inicio == 0)
+
+    # Clínicas, con las vacunas de cada una repartidas al azar entre las fases.
+    total = np.floor(poblacion * fraccion_capacidad).astype(np.int64)
+    por_fase = np.array([rng.multinomial(t, np.full(len(FASES), 1 / len(FASES))) for t in total.tolist()],
+                        dtype=np.int64).reshape(num_clinicas, len(FASES))
+    lugar = codigos_clinica % num_municipios
+    clinicas = pd.DataFrame({
+        'codigo': codigos_clinica, 'dependencia': 'Clinica ' + pd.Series(codigos_clinica).astype(str),
+        'departamento': departamentos[lugar], 'municipio': municipios[lugar],
+        'latitud': np.round(rng.uniform(13.7, 17.8, num_clinicas), 4),
+        'longitud': np.round(rng.uniform(-92.2, -88.2, num_clinicas), 4),
+        'vaccCap': rng.integers(3, 41, num_clinicas), 'tiempo': rng.integers(1, 6, num_clinicas)})
+    for i, fase in enumerate(FASES):
+        clinicas[fase] = por_fase[:, i]
+    _escribir(ruta + 'clinicas.csv', clinicas)
+
+    _escribir(ruta + 'vacunas.csv', pd.DataFrame(
+        [(i, marca, dosis, semanas, temperatura, 'Sintetica') for i, marca, dosis, semanas, temperatura in VACUNAS],
+        columns=['id_marca', 'marca', 'dosis', 'tiempo_dosis (semanas)', 'temp_conserv', 'observaciones']))
+
+    dosis = int(total.sum() * 2.2) + num_lotes
+    tamanos = rng.multinomial(dosis, np.full(num_lotes, 1 / num_lotes))
+    _escribir(ruta + 'lote_vacunas.csv', pd.DataFrame({
+        'id_lote': ['L' + str(i + 1) for i in range(num_lotes)], 'fecha_ingreso': _fechas(rng, num_lotes, 180),
+        'id_marca': rng.integers(1, len(VACUNAS) + 1, num_lotes), 'num_vacunas': tamanos}))
+
+    excluidos = 100000 + rng.choice(num_pacientes, int(num_pacientes * fraccion_excluidos), replace=False)
+    _escribir(ruta + 'excluir.csv', pd.DataFrame({'codigo': np.sort(excluidos), 'razon': 'Sintetico'}))
+
+    # Vacunados, cada uno en una clínica al azar con el mismo reparto que los pacientes.
+    num_vacunados = int(num_pacientes * fraccion_vacunados)
+    vacunados = 100000 + rng.choice(num_pacientes, num_vacunados, replace=False)
+    _escribir(ruta + 'vacunados.csv', pd.DataFrame({
+        'codigo': vacunados, 'clinica': codigos_clinica[rng.choice(num_clinicas, num_vacunados, p=pesos)],
+        'fecha': _fechas(rng, num_vacunados, 180), 'vacuna': rng.integers(1, len(VACUNAS) + 1, num_vacunados)}))
+
+    _escribir(ruta + 'prioridadEdad.csv', pd.DataFrame({'edad': np.arange(10, 100, 10),
+                                                         'prioridad': np.maximum(10 - np.arange(1, 10), 1)}))
+    _escribir(ruta + 'prioridadCargos.csv', pd.DataFrame({'cargos': CARGOS,
+                                                           'prioridad': np.arange(1, len(CARGOS) + 1)}))
+    # Algunas clínicas y municipios no tienen prioridad, como en los archivos reales.
+    con_prioridad = rng.random(num_municipios) < 0.9
+    _escribir(ruta + 'prioridadMunicipios.csv', pd.DataFrame({
+        'Codigo': np.flatnonzero(con_prioridad) + 1, 'Departamento': departamentos[con_prioridad],
+        'Municipio': municipios[con_prioridad], 'Semaforo': 'Rojo',
+        'Prioridad': rng.integers(1, 5, int(con_prioridad.sum()))}))
+    con_prioridad = rng.random(num_clinicas) < 0.95
+    _escribir(ruta + 'prioridadUnidades.csv', pd.DataFrame({
+        'dependencia': codigos_clinica[con_prioridad], 'departamento': 'D', 'municipio': 'M', 'nombre': 'N',
+        'prioridad': rng.integers(1, 6, int(con_prioridad.sum()))}))
+
+    fn = ruta + 'config.txt'
+    with open(fn, 'w') as f:
+        f.write("1 #numEstacionesPorDependencia\n40 #numVacunasPorEstacionPorDia. Deprecada.\n"
+                "5 #tiempoParaLlevarVacunasAEstacion. Deprecada.\n")
+        for peso in ['edad', 'lugar donde habita', 'dependencia donde trabaja', 'cargo', 'covid', 'diabetico',
+                     'peso', 'cancer', 'vih', 'renal']:
+            f.write("1 #peso para prioridad de " + peso + "\n")
+        f.write(ruta + " #Path de los archivos de entrada\n")
+        for archivo in ['pacientes.csv', 'lote_vacunas.csv', 'prioridadCargos.csv', 'prioridadEdad.csv',
+                        'prioridadMunicipios.csv', 'prioridadUnidades.csv', 'vacunas.csv', 'clinicas.csv',
+                        'excluir.csv', 'vacunados.csv']:
+            f.write(archivo + " #\n")
+    return fn
+
+
+def main(argv):
+    """
+    Genera los archivos de entrada con los parámetros de la línea de comandos.
+    """
+    num_pacientes = 10000
+    num_clinicas = 50
+    semilla = 0
+    try:
+        opts, args = getopt.getopt(argv, "n:k:s:")
+    except getopt.GetoptError:
+        print('Argumento no reconocido')
+        sys.exit(2)
+    if len(args) != 1:
+        print('Uso: python generador.py [-n pacientes] [-k clinicas] [-s semilla] folder')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-n':
+            num_pacientes = int(arg)
+        if opt == '-k':
+            num_clinicas = int(arg)
+        if opt == '-s':
+            semilla = int(arg)
+    print("Generado " + generarEntradas(args[0], num_pacientes, num_clinicas, semilla))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
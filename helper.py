@@ -7,8 +7,9 @@ Módulo con funciones de ayuda para obtener las fechas apropiadas de vacunación
 archivos de entrada.
 
 """
-import datetime
-import pandas as pd
+from models.tablas import leerFilas
+from models.excluidos import IndiceExclusion
+from models.calendario import CalendarioCapacidad
 
 
 def getAppropriatedate(clinica, vacunas_por_dia_por_clinica, fecha_de_inicio, params, capacidadClinica):
@@ -17,18 +18,21 @@ def getAppropriatedate(clinica, vacunas_por_dia_por_clinica, fecha_de_inicio, pa
     campaña y en función de la capacidad de cada centro de vacunación.
 
     :param clinica: codigo de la clinica
-    :param vacunas_por_dia_por_clinica: numero de vacunas que se aplican por dia en la clinica
-    :param fecha_de_inicio: fecha de inicio de aplicaciones de la vacuna
+    :param vacunas_por_dia_por_clinica: numero de vacunas que se aplican por dia en la clinica, o el
+        :class:`~calendario.CalendarioCapacidad` de cada clinica.
+    :param fecha_de_inicio: día de inicio de aplicaciones de la vacuna (ver :func:`~calendario.numeroDia`)
     :param params: ConfigParams
     :return:
     """
+    if isinstance(vacunas_por_dia_por_clinica[clinica], CalendarioCapacidad):
+        return vacunas_por_dia_por_clinica[clinica].primerDiaLibre(fecha_de_inicio)
     while True:
         if fecha_de_inicio not in vacunas_por_dia_por_clinica[clinica]:
             return fecha_de_inicio
         if vacunas_por_dia_por_clinica[clinica][fecha_de_inicio] < \
                 params.getNumEstacionesPorDepencencia() * capacidadClinica:
             return fecha_de_inicio
-        fecha_de_inicio = fecha_de_inicio + datetime.timedelta(days=1)
+        fecha_de_inicio = fecha_de_inicio + 1
 
 
 def readPriorityEdad(fn):
@@ -38,10 +42,9 @@ def readPriorityEdad(fn):
     :return: diccionario con prioridades
     :rtype: dict
     """
-    df = pd.read_csv(fn, encoding="latin")
     result = {}
-    for row in df.iterrows():
-        result[row[1]['edad']] = int(row[1]['prioridad'])
+    for row in leerFilas(fn):
+        result[row['edad']] = int(row['prioridad'])
     return result
 
 
@@ -52,10 +55,9 @@ def readPriorityUnidades(fn):
     :return: diccionario con prioridades
     :rtype: dict
     """
-    df = pd.read_csv(fn, encoding="latin")
     result = {}
-    for row in df.iterrows():
-        result[row[1]['dependencia']] = int(row[1]['prioridad'])
+    for row in leerFilas(fn):
+        result[row['dependencia']] = int(row['prioridad'])
     return result
 
 
@@ -66,10 +68,9 @@ def readPriorityMunicipios(fn):
     :return: diccionario con prioridades
     :rtype: dict
     """
-    df = pd.read_csv(fn, encoding="latin")
     result = {}
-    for row in df.iterrows():
-        result[row[1]['Departamento'] + ", " + row[1]['Municipio']] = int(row[1]['Prioridad'])
+    for row in leerFilas(fn):
+        result[row['Departamento'] + ", " + row['Municipio']] = int(row['Prioridad'])
     return result
 
 
@@ -80,23 +81,24 @@ def readPriorityCargos(fn):
     :return: diccionario con prioridades
     :rtype: dict
     """
-    df = pd.read_csv(fn, encoding="latin")
     result = {}
-    for row in df.iterrows():
-        result[row[1]['cargos']] = int(row[1]['prioridad'])
+    for row in leerFilas(fn):
+        result[row['cargos']] = int(row['prioridad'])
     return result
 
 
 def excluirPaciente(paciente,lista_de_pacientes_excluidos):
     """
     Devuelve verdadero si el paciente se encuentra en la lista de pacientes a excluir
-    :param paciente: Paciente para revisar si lo excluimos o no
-    :type paciente: Paciente
-    :param lista_de_pacientes_excluidos: Lista de pacientes a excluir
-    :type lista_de_pacientes_excluidos: list
+    :param paciente: Código del paciente para revisar si lo excluimos o no
+    :type paciente: String
+    :param lista_de_pacientes_excluidos: Lista de pacientes a excluir, o índice de sus códigos (O(1) por búsqueda)
+    :type lista_de_pacientes_excluidos: list o IndiceExclusion
     :return: Verdadero o falso dependiendo si el paciente se encuentra en la lista
     :rtype: bool
     """
+    if isinstance(lista_de_pacientes_excluidos, IndiceExclusion):
+        return lista_de_pacientes_excluidos.contiene(paciente)
     for p in lista_de_pacientes_excluidos:
         if p.getCodigo() == paciente:
             return True
@@ -20,6 +20,47 @@ Parametros de uso
 -v  Si se encuentra presente, el programa desplegará información adicional durante su corrida.
 -d  Si se encuentra presente, el programa desplegará información útil para depurar el programa.
 -u  Si se encuentra preselte, el programa calcula la segunda dosis de vacunas según las personas vacunadas.
+-x  Si se encuentra presente, los pacientes excluidos se quitan de las listas de pacientes antes de asignar vacunas.
+-b  Si se encuentra presente, las vacunas de cada lote se asignan por bloques de pacientes en cada clínica, en lugar
+    de un paciente por clínica a la vez. El resultado es el mismo.
+-j  Seguido de un número N, reparte las clínicas en N grupos y asigna las vacunas de cada grupo en un proceso
+    distinto (implica -b y -x). También lee el archivo de pacientes en N partes en procesos distintos mientras lee
+    los demás archivos de entrada. El resultado es el mismo que en un solo proceso. Con -p y -i solo se usa para
+    leer los archivos.
+-f  Seguido de parquet o arrow, además de los archivos CSV escribe las asignaciones en ese formato, con columnas
+    tipadas y sin mezclar clínicas en un mismo row group. Necesita pyarrow.
+-c  Seguido del nombre de un folder, guarda ahí los datos leidos de los archivos de entrada (pacientes con sus
+    prioridades ya calculadas, clínicas, lotes, vacunas y excluidos) y los vuelve a usar mientras los archivos y los
+    pesos de config.txt no cambien.
+-p  Seguido del nombre de un folder, construye ahí el padrón de pacientes (códigos, unidades, prioridades y el orden
+    de los pacientes de cada unidad) y termina. El folder se crea dentro del path de los archivos de entrada de
+    config.txt, salvo que sea un path absoluto. Si en config.txt el archivo de pacientes es ese folder, el padrón se
+    abre mapeado en memoria en lugar de leer pacientes.csv. Si cambian pacientes.csv, los archivos de prioridades o
+    los pesos de config.txt, el programa termina con un error y el padrón se tiene que volver a construir.
+-i  Seguido del nombre de un folder, replanifica a partir del plan guardado en ese folder: solo se vuelven a asignar
+    las clínicas afectadas por cambios en los pacientes o los excluidos, y se escribe asignaciones_cambios.csv con
+    las asignaciones que cambiaron. Los vacunados que ya tienen un lugar en el plan lo conservan; los demás se
+    excluyen. La primera vez calcula y guarda el plan completo. El plan guardado no incluye los calendarios ni las
+    vacunas que quedan en cada lote, por lo que si cambian las clínicas, los lotes o las vacunas se calcula de nuevo
+    todo el plan.
+-g  Si se encuentra presente, cada clínica atiende primero a los pacientes de las primeras fases (según la Fase y
+    SubFase de pacientes.csv y el orden de las fases en clinicas.csv), y dentro de cada fase en orden de prioridad
+    (ver :class:`~colas.ColaPorFase`). Sin -g los pacientes se atienden solo en orden de prioridad. No se puede
+    usar con -i.
+-s  Si se encuentra presente, los pacientes de cada unidad no se ordenan completos por prioridad al leerlos: cada
+    clínica solo ordena a los pacientes que le tocan según los lotes y la capacidad de cada fase, y al resto si se
+    llega a ellos (ver :class:`~colas.ColaSeleccion`). El resultado es el mismo. No se usa con -g ni -i.
+--profile  Seguido del nombre de un archivo (por ejemplo perfil.json), guarda ahí el tiempo y la memoria máxima de
+    cada etapa de la corrida (lectura de cada archivo, cálculo de prioridades, ordenamiento de los pacientes, cada
+    fase de la asignación, ordenamiento final y escritura) y contadores de eventos (pacientes sacados de las colas,
+    revisiones de excluidos, búsquedas de fechas en los calendarios). También guarda el tiempo de cada etapa en
+    perfil.folded, que se puede abrir con flamegraph.pl o speedscope.
+--cprofile  Seguido del nombre de un archivo (por ejemplo perfil.prof), corre el programa con cProfile y guarda ahí
+    las estadísticas de cada función, que se pueden abrir con pstats, snakeviz o flameprof.
+--progress  Seguido del nombre de un archivo (o - para la salida de errores), escribe ahí mientras se asignan las
+    vacunas una línea JSON por segundo con la fase actual, los pacientes asignados, las dosis que faltan por asignar
+    en la fase, los pacientes asignados por segundo y el tiempo estimado para terminar. Otro proceso puede leer el
+    archivo mientras se escribe para saber si la corrida sigue avanzando.
 
 Archivos necesarios de entrada:
 -------------------------------
@@ -41,75 +82,111 @@ Archivo de salida:
 
 - asignaciones.csv conteo de personas por centro y fase a la que pertenecen con fecha de vacunación con prioridad.
 - asignaciones_reales_dosis_2.csv asignación de segunda dosis en función de las personas que fueron realmente vacunadas.
+- asignaciones.parquet o asignaciones.arrow (y asignaciones_reales_dosis_2.parquet o .arrow) si se usa -f.
+- asignaciones_cambios.csv asignaciones que se quitan (-) o agregan (+) respecto al plan anterior si se usa -i.
+- El reporte del perfil (y el archivo .folded) si se usa --profile, y las estadísticas de cProfile si se usa
+  --cprofile.
+- El avance de la asignación si se usa --progress.
 
 """
-import datetime
+import cProfile
+import os
 import sys
 import getopt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from models.asignaciones import Asignacion
+import numpy as np
+
+from models.asignaciones import Asignacion, BloqueAsignaciones
+from models.salida import EscritorAsignaciones, EscritorColumnar, FORMATOS, importarArrow, sonEnteros, \
+    escribirCambios
 from models.clinicas import readClinicas
 from models.config import readConfig
-from helper import getAppropriatedate, excluirPaciente
+from models.cache import CacheEntradas, hashArchivo
+from models.estado import EstadoPlan, leerEstado, guardarEstado, huellaCola
+from helper import excluirPaciente
 from models.lotes import readLotes
-from models.pacientes import readPacientes
+from models.pacientes import readPacientes, escribirPadron
+from models.colas import ColaPacientes, ColaPorFase, ColaSeleccion, crearColas, crearColasPorFase, \
+    crearColasSeleccion, getCursores
+from models.calendario import crearCalendarios, diasDesplazamiento, fechasDeDias, TurnosSegundasDosis
 from models.vacunas import readVacunas
-from models.excluidos import readExcluidos
-from models.vacunados import readVacunados
+from models.excluidos import IndiceExclusion, readIndiceExclusion
+from models.vacunados import leerVacunadosPorPartes, ResumenVacunados
+from models.existencias import Existencias
+from models.perfil import PERFIL
+from models.progreso import PROGRESO
 
 params = None
 
+# Cambia cuando cambia la forma de calcular los lugares de un plan, para no replanificar a partir de un plan guardado
+# por una versión anterior (ver :func:`firmaPlan`).
+VERSION_PLAN = '2'
+
 
-def areWeDone(d):
+def capacidadesFase(lista_de_clinicas, fase):
     """
-    Calcula cuantas vacunas faltan por asignar, si es 0 retorna verdadero, sino falso.
-    :param d: Diccionario con llave clinica y valor numero de vacunas que faltan por asignar
-    :type d: dict
-    :return: Verdadero si ya no hay mas vacunas a agregar, Falso sino.
-    :rtype: bool
+    :param lista_de_clinicas: Clínicas leidas con :func:`~clinicas.readClinicas`.
+    :type lista_de_clinicas: ListaClinicas
+    :param fase: Nombre de la fase.
+    :type fase: String
+    :return: Diccionario con llave el código de la clínica y valor el número de vacunas de *fase* que le tocan,
+        que es el valor inicial de las vacunas que faltan por asignar en cada clínica.
+    :rtype: dict
     """
-    n = 0
-    for k in d.keys():
-        n += d[k]
-    if n > 0:
-        return False
-    return True
+    return dict(zip([c.getCodigo() for c in lista_de_clinicas], lista_de_clinicas.getCapacidadesFase(fase).tolist()))
 
 
-def computeAsignaciones(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, pacientes, vacunas_por_dia_por_clinica,
-                        lista_de_vacunas, fase, excluidos):
+def computeAsignaciones(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, pacientes, calendarios,
+                        lista_de_vacunas, fase, excluidos, existencias=None):
+    """
+    Asigna las vacunas de todos los lotes para la fase *fase*, una persona por clínica en cada ronda.
+    :param pacientes: Diccionario con llave el código de la unidad y valor la cola de sus pacientes ordenados por
+        prioridad. Los pacientes asignados se sacan de las colas.
+    :type pacientes: dict
+    :param calendarios: Diccionario con llave el código de la clínica y valor el calendario con las vacunas ya
+        reservadas en cada día.
+    :type calendarios: dict
+    :param excluidos: Índice de los pacientes a excluir, o None si ya fueron quitados de *pacientes*.
+    :type excluidos: IndiceExclusion
+    :param existencias: Opcional. Existencias de las fases anteriores; cada lote empieza con las aplicaciones que le
+        sobraron. Si no se da, cada lote empieza con todas sus aplicaciones.
+    :type existencias: Existencias
+    :return: Lista de asignaciones de ambas dosis.
+    :rtype: list
+    """
     asignaciones = []
-    for lote in lotes:
-        num_vaccines_for_first_dose = lote.getRondas()
+    if existencias is None:
+        existencias = Existencias(lotes)
+    existencias.iniciarFase(fase, remaining_vaccines_per_clinic)
+    maximos = lista_de_clinicas.getCapacidadesFase(fase).tolist()
+    for i, lote in enumerate(lotes):
         tiempo_entre_dosis = lista_de_vacunas[lote.getMarca()].getTiempo()
-        while num_vaccines_for_first_dose > 1:
-            for clinica in lista_de_clinicas:
+        # Días a partir de los cuales cada clínica aplica las dosis de este lote (ver calendario.numeroDia).
+        inicios = [(lote.getDia() + diasDesplazamiento(clinica.getTiempo()),
+                    lote.getDia() + diasDesplazamiento(clinica.getTiempo(), tiempo_entre_dosis))
+                   for clinica in lista_de_clinicas]
+        while existencias.getRestantesLote(i) > 1:
+            inicio_ronda = existencias.getRestantesLote(i)
+            for clinica, maximo, (inicio1, inicio2) in zip(lista_de_clinicas, maximos, inicios):
                 left = remaining_vaccines_per_clinic[clinica.getCodigo()]
                 if left > 0:
                     # Obtenemos el siguiente paciente para esta clinica
-                    num_patient = pacientes[clinica.getCodigo()].pop(0).getCodigo()
+                    num_patient = pacientes[clinica.getCodigo()].pop()
                     # Si el paciente esta en la lista de excluidos lo ignoramos y sacamos el siguiente
-                    while excluirPaciente(num_patient, excluidos):
-                        num_patient = pacientes[clinica.getCodigo()].pop(0).getCodigo()
+                    while excluidos is not None and excluirPaciente(num_patient, excluidos):
+                        num_patient = pacientes[clinica.getCodigo()].pop()
                     # Calculamos el orden relativo a esta clinica del paciente
-                    orden = clinica.getMaxPerPhase(fase) - left + 1
-                    # Calculamos la fecha de la primera dosis para este paciente en funcion de cuando se recibieron
+                    orden = maximo - left + 1
+                    # Calculamos el dia de la primera dosis para este paciente en funcion de cuando se recibieron
                     # las vacunas y a cuantas personas ya hemos vacunado
-                    fecha_applicacion_dosis1 = lote.getFecha() + datetime.timedelta(days=clinica.getTiempo())
-                    fecha1 = getAppropriatedate(clinica.getCodigo(), vacunas_por_dia_por_clinica,
-                                                fecha_applicacion_dosis1, params, clinica.getCapacidad())
-                    # Calculamos la fecha de la segunda dosis tomando en cuenta el tiempo entre dosis
-                    fecha_applicacion_dosis2 = lote.getFecha() + datetime. \
-                        timedelta(days=clinica.getTiempo()) + datetime.timedelta(weeks=tiempo_entre_dosis)
-                    fecha2 = getAppropriatedate(clinica.getCodigo(), vacunas_por_dia_por_clinica,
-                                                fecha_applicacion_dosis2, params, clinica.getCapacidad())
+                    calendario = calendarios[clinica.getCodigo()]
+                    fecha1 = calendario.primerDiaLibre(inicio1)
+                    # Calculamos el dia de la segunda dosis tomando en cuenta el tiempo entre dosis
+                    fecha2 = calendario.primerDiaLibre(inicio2)
                     # Anotamos cuantas vacunas van en el dia de aplicacion
-                    if fecha1 not in vacunas_por_dia_por_clinica[clinica.getCodigo()]:
-                        vacunas_por_dia_por_clinica[clinica.getCodigo()][fecha1] = 0
-                    if fecha2 not in vacunas_por_dia_por_clinica[clinica.getCodigo()]:
-                        vacunas_por_dia_por_clinica[clinica.getCodigo()][fecha2] = 0
-                    vacunas_por_dia_por_clinica[clinica.getCodigo()][fecha1] += 1
-                    vacunas_por_dia_por_clinica[clinica.getCodigo()][fecha2] += 1
+                    calendario.reservar(fecha1)
+                    calendario.reservar(fecha2)
                     # Creamos las asignaciones para ambas dosis
                     asignacion_dosis1 = Asignacion(str(num_patient), lote.getMarca(), 1, clinica.getCodigo(), orden,
                                                    fecha1)
@@ -117,38 +194,325 @@ def computeAsignaciones(lotes, lista_de_clinicas, remaining_vaccines_per_clinic,
                                                    fecha2)
                     asignaciones.append(asignacion_dosis1)
                     asignaciones.append(asignacion_dosis2)
-                    # reducimos el numero de vacunas y el numero de vacunas que tocan por clinica
-                    remaining_vaccines_per_clinic[clinica.getCodigo()] -= 1
-                    num_vaccines_for_first_dose -= 1
-            if areWeDone(remaining_vaccines_per_clinic):
+                    # reducimos el numero de vacunas del lote y el numero de vacunas que tocan por clinica
+                    existencias.reservar(i, clinica.getCodigo())
+            PROGRESO.avanzar(inicio_ronda - existencias.getRestantesLote(i))
+            if existencias.isTerminado():
                 break
     return asignaciones
 
 
-def runInitialAssignment(verbose, debug):
+def calcularTomas(rondas, restantes):
     """
-    Si el programa se corre sin el parametro -u, calcula la distribución de vacunas a utilizar por clínica y paciente.
-    Utiliza los datos de la disponibilidad de los lotes de vacunas, la lista de pacientes, sus datos personales, y
-    las capacidades de las clínicas para asignar ambas dosis.
-    :param verbose: Si es True despliega información adicional mientras corre.
-    :type verbose: bool
-    :param debug: Si es True despliega información util para la depuración.
-    :type debug: bool
+    Calcula cuántos pacientes toma cada clínica de un lote con *rondas* aplicaciones disponibles, sin recorrer el lote
+    ronda por ronda. Igual que en :func:`computeAsignaciones`, en cada ronda cada clínica con vacunas pendientes toma
+    un paciente, y las rondas siguen mientras queden más de una aplicación en el lote y no se haya terminado la fase
+    (ver :meth:`~existencias.Existencias.isTerminado`).
+    :param rondas: Número de aplicaciones disponibles en el lote.
+    :type rondas: int
+    :param restantes: Número de vacunas que faltan por asignar en cada clínica.
+    :type restantes: numpy.ndarray
+    :return: Número de pacientes que toma cada clínica.
+    :rtype: numpy.ndarray
     """
-    if verbose:
-        print("Usando " + str(params.getNumEstacionesPorDepencencia()) + " estaciones por dependencia.")
-        print("")
+    if rondas <= 1:
+        return np.zeros(len(restantes), dtype=np.int64)
+    positivos = np.maximum(restantes, 0)
+    negativos = restantes.sum() - positivos.sum()
 
-    # Lee las clinicas, vacunas y lotes de vacunas
-    lista_de_clinicas = readClinicas(params.getPathToFiles()+params.getFileClinicas(), verbose, debug)
-    lista_de_vacunas = readVacunas(params.getPathToFiles()+params.getFileVacunas(), verbose, debug)
-    lotes = readLotes(params.getPathToFiles()+params.getFileLotes(), verbose, debug)
+    def terminado(r):
+        tomados = np.minimum(positivos, r)
+        return rondas - tomados.sum() <= 1 or (positivos - tomados).sum() + negativos <= 0
 
-    if verbose:
-        print("Leyendo pacientes...")
-    pacientes = readPacientes(params.getPathToFiles()+params.getFilePacientes(), params, verbose, debug)
+    # Buscamos la primera ronda después de la cual el ciclo de computeAsignaciones se detiene.
+    bajo, alto = 1, max(int(positivos.max(initial=0)), 1)
+    while bajo < alto:
+        medio = (bajo + alto) // 2
+        if terminado(medio):
+            alto = medio
+        else:
+            bajo = medio + 1
+    return np.minimum(positivos, bajo)
 
-    # Ordena los lotes en orden ascendente de fecha para asignar primero las vacunas que se reciben antes.
+
+def tomarPacientes(cola, k, excluidos):
+    """
+    Saca de *cola* a los siguientes *k* pacientes que no están excluidos.
+    :param cola: Cola de pacientes de la clínica.
+    :type cola: ColaPacientes
+    :param k: Número de pacientes a sacar.
+    :type k: int
+    :param excluidos: Índice de los pacientes a excluir, o None si ya fueron quitados de la cola.
+    :type excluidos: IndiceExclusion
+    :return: Los códigos de los pacientes en orden de prioridad.
+    :rtype: numpy.ndarray
+    """
+    partes = []
+    while k > 0:
+        if len(cola) == 0:
+            raise IndexError("pop from empty ColaPacientes")
+        codigos = cola.take(k)
+        if excluidos is not None:
+            codigos = codigos[~excluidos.mascara(codigos)]
+        partes.append(codigos)
+        k -= len(codigos)
+    if not partes:
+        return cola.take(0)
+    return np.concatenate(partes)
+
+
+def asignarBloque(clinica, cola, calendario, lote, k, orden, tiempo_entre_dosis, excluidos):
+    """
+    Asigna las dos dosis a los siguientes *k* pacientes de una clínica con vacunas de *lote*, llenando los días de su
+    calendario a partir de la fecha en la que el lote llega a la clínica.
+    :param orden: Orden relativo a la clínica del primer paciente del bloque.
+    :type orden: int
+    :return: Las asignaciones de la primera dosis de todos los pacientes seguidas de las de la segunda dosis.
+    :rtype: BloqueAsignaciones
+    """
+    codigos = tomarPacientes(cola, k, excluidos).astype(str)
+    dia_applicacion_dosis1 = lote.getDia() + diasDesplazamiento(clinica.getTiempo())
+    dia_applicacion_dosis2 = lote.getDia() + diasDesplazamiento(clinica.getTiempo(), tiempo_entre_dosis)
+    dias1, dias2, repeticiones = zip(*calendario.reservarPares(dia_applicacion_dosis1, dia_applicacion_dosis2, k))
+    fechas = fechasDeDias(np.concatenate([np.repeat(dias1, repeticiones), np.repeat(dias2, repeticiones)]))
+    ordenes = np.arange(orden, orden + k, dtype=np.int64)
+    return BloqueAsignaciones(np.concatenate([codigos, codigos]), np.full(2 * k, lote.getMarca()),
+                              np.repeat(np.array([1, 2], dtype=np.int8), k), np.full(2 * k, clinica.getCodigo()),
+                              np.concatenate([ordenes, ordenes]), fechas)
+
+
+def planificarFase(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, existencias=None, fase=None):
+    """
+    Calcula con :func:`calcularTomas` cuántos pacientes toma cada clínica de cada lote en una fase, y los descuenta de
+    *remaining_vaccines_per_clinic* y de las aplicaciones de cada lote. El plan solo depende de cuántas vacunas le
+    tocan a cada clínica y de cuántas le quedan a cada lote, no de los pacientes ni de las fechas.
+    :param existencias: Opcional. Existencias de las fases anteriores (ver :func:`computeAsignaciones`).
+    :type existencias: Existencias
+    :param fase: Opcional. Nombre de la fase, para los eventos de agotamiento de *existencias*.
+    :type fase: String
+    :return: Lista con un arreglo del número de pacientes que toma cada clínica por cada lote.
+    :rtype: list
+    """
+    if existencias is None:
+        existencias = Existencias(lotes)
+    existencias.iniciarFase(fase, remaining_vaccines_per_clinic)
+    plan = []
+    for i in range(len(lotes)):
+        restantes = np.array([remaining_vaccines_per_clinic[c.getCodigo()] for c in lista_de_clinicas],
+                             dtype=np.int64)
+        tomas = calcularTomas(existencias.getRestantesLote(i), restantes)
+        existencias.reservarTomas(i, lista_de_clinicas, tomas)
+        plan.append(tomas)
+    return plan
+
+
+def planificarFases(lotes, lista_de_clinicas, fases, existencias=None):
+    """
+    Calcula con :func:`planificarFase` el plan de cada fase, empezando cada fase con la capacidad de cada clínica y
+    con las aplicaciones que le sobraron a cada lote en las fases anteriores.
+    :param existencias: Opcional. Existencias con las que empieza la primera fase. Si no se da, cada lote empieza con
+        todas sus aplicaciones.
+    :type existencias: Existencias
+    :return: Lista con el plan de cada fase.
+    :rtype: list
+    """
+    if existencias is None:
+        existencias = Existencias(lotes)
+    planes = []
+    for fase in fases:
+        planes.append(planificarFase(lotes, lista_de_clinicas, capacidadesFase(lista_de_clinicas, fase), existencias,
+                                     fase))
+    return planes
+
+
+def asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios, lista_de_vacunas, excluidos):
+    """
+    Asigna a cada clínica el número de pacientes de cada lote calculado por :func:`planificarFase`, un bloque por
+    clínica y lote (ver :func:`asignarBloque`).
+    :return: Generador de las asignaciones de ambas dosis de cada clínica y lote.
+    :rtype: generator
+    """
+    asignados = dict.fromkeys([c.getCodigo() for c in lista_de_clinicas], 0)
+    for lote, tomas in zip(lotes, plan):
+        tiempo_entre_dosis = lista_de_vacunas[lote.getMarca()].getTiempo()
+        for clinica, k in zip(lista_de_clinicas, tomas.tolist()):
+            if k > 0:
+                # El orden es maximo - left + 1, donde left = maximo - asignados (ver computeAsignaciones).
+                orden = asignados[clinica.getCodigo()] + 1
+                yield asignarBloque(clinica, pacientes[clinica.getCodigo()], calendarios[clinica.getCodigo()], lote, k,
+                                    orden, tiempo_entre_dosis, excluidos)
+                asignados[clinica.getCodigo()] += k
+
+
+def computeAsignacionesPorBloques(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, pacientes, calendarios,
+                                  lista_de_vacunas, fase, excluidos, existencias=None):
+    """
+    Asigna las vacunas de todos los lotes para la fase *fase* con el mismo resultado que :func:`computeAsignaciones`,
+    pero en lugar de asignar un paciente por clínica en cada ronda, calcula con :func:`planificarFase` cuántos
+    pacientes toma cada clínica de cada lote y los asigna de una vez con :func:`asignarFase`. Requiere que cada
+    clínica tenga un código distinto.
+    :param existencias: Opcional. Existencias de las fases anteriores (ver :func:`computeAsignaciones`).
+    :type existencias: Existencias
+    :return: Asignaciones de ambas dosis.
+    :rtype: BloqueAsignaciones
+    """
+    plan = planificarFase(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, existencias, fase)
+    return BloqueAsignaciones.concatenar(list(asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios,
+                                                          lista_de_vacunas, excluidos)))
+
+
+def tomasPorUnidad(planes, lista_de_clinicas):
+    """
+    :param planes: Lista con el plan de cada fase (ver :func:`planificarFases`).
+    :type planes: list
+    :return: Diccionario con llave el código de la clínica y valor el número de pacientes que toma en todas las
+        fases, que es el número de pacientes de su unidad que se espera sacar de su cola.
+    :rtype: dict
+    """
+    result = {}
+    if not planes or not planes[0]:
+        return result
+    totales = np.sum([tomas for plan in planes for tomas in plan], axis=0)
+    for clinica, k in zip(lista_de_clinicas, totales.tolist()):
+        result[clinica.getCodigo()] = result.get(clinica.getCodigo(), 0) + k
+    return result
+
+
+def particionarClinicas(planes, trabajos):
+    """
+    Reparte las clínicas en *trabajos* grupos con un número parecido de pacientes a asignar, asignando cada clínica
+    (de la que más pacientes tiene a la que menos) al grupo con menos pacientes hasta el momento.
+    :param planes: Lista con el plan de cada fase devuelto por :func:`planificarFase`.
+    :type planes: list
+    :param trabajos: Número de grupos.
+    :type trabajos: int
+    :return: Lista con los indices de las clínicas de cada grupo, en el orden de la lista de clínicas.
+    :rtype: list
+    """
+    carga = sum(tomas for plan in planes for tomas in plan)
+    cargas = [0] * trabajos
+    particiones = [[] for _ in range(trabajos)]
+    for i in np.argsort(-carga, kind='stable').tolist():
+        j = cargas.index(min(cargas))
+        particiones[j].append(i)
+        cargas[j] += int(carga[i]) + 1
+    return [np.array(sorted(p), dtype=np.int64) for p in particiones if p]
+
+
+def asignarParticion(lista_de_clinicas, codigos_por_unidad, lotes, lista_de_vacunas, planes, parametros, directorio,
+                     max_filas, rangos_por_unidad=None, prioridades_por_unidad=None):
+    """
+    Asigna todas las fases de un grupo de clínicas y guarda las asignaciones como corridas ordenadas en *directorio*
+    (ver :class:`~salida.EscritorAsignaciones`). Se corre en un proceso aparte desde
+    :func:`computeAsignacionesEnParalelo`.
+    :param codigos_por_unidad: Diccionario con llave el código de la unidad y valor los códigos de sus pacientes (sin
+        excluidos) ordenados por prioridad.
+    :type codigos_por_unidad: dict
+    :param planes: Lista con el plan de cada fase para las clínicas del grupo.
+    :type planes: list
+    :param parametros: Parametros de la configuracion
+    :type parametros: ConfigParams
+    :param directorio: Folder temporal donde se guardan las corridas.
+    :type directorio: String
+    :param max_filas: Número máximo de asignaciones que se guardan en memoria.
+    :type max_filas: int
+    :param rangos_por_unidad: Opcional. Diccionario con llave el código de la unidad y valor el número de la fase de
+        cada uno de sus pacientes. Si se da, los pacientes se atienden en orden de fase (ver
+        :class:`~colas.ColaPorFase`).
+    :type rangos_por_unidad: dict
+    :param prioridades_por_unidad: Opcional. Diccionario con llave el código de la unidad y valor la prioridad de cada
+        uno de sus pacientes. Si se da, los códigos de cada unidad están en el orden del archivo y cada cola solo
+        ordena a los pacientes que toma la clínica (ver :class:`~colas.ColaSeleccion`).
+    :type prioridades_por_unidad: dict
+    :return: Ubicación de las corridas del grupo, en orden.
+    :rtype: list
+    """
+    pacientes = {}
+    tomas = tomasPorUnidad(planes, lista_de_clinicas) if prioridades_por_unidad is not None else None
+    for unidad, codigos in codigos_por_unidad.items():
+        if prioridades_por_unidad is not None:
+            pacientes[unidad] = ColaSeleccion(codigos, np.arange(len(codigos)), prioridades_por_unidad[unidad],
+                                              tomas.get(unidad, 0))
+        elif rangos_por_unidad is not None:
+            pacientes[unidad] = ColaPorFase(codigos, np.arange(len(codigos)), rangos_por_unidad[unidad])
+        else:
+            pacientes[unidad] = ColaPacientes(codigos, np.arange(len(codigos)))
+    # Las corridas se quedan en disco para el proceso principal, salvo que ocurra un error.
+    with EscritorAsignaciones(None, max_filas, directorio) as escritor:
+        for plan in planes:
+            calendarios = crearCalendarios(lista_de_clinicas, parametros)
+            for bloque in asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios, lista_de_vacunas, None):
+                escritor.agregar(bloque)
+        escritor.vaciar()
+    return escritor.corridas
+
+
+def computeAsignacionesEnParalelo(lotes, lista_de_clinicas, codigos, indices_por_unidad, lista_de_vacunas, fases,
+                                  trabajos, escritor, rangos=None, prioridades=None):
+    """
+    Asigna las vacunas de todas las fases repartiendo las clínicas en grupos que se asignan en procesos distintos.
+    Como las colas de pacientes y los calendarios son de cada clínica, lo único que comparten las clínicas son los
+    lotes; el plan de cuántos pacientes toma cada clínica de cada lote se calcula primero con :func:`planificarFase` y
+    cada grupo recibe su parte. Cada grupo guarda sus asignaciones como corridas ordenadas que se agregan a *escritor*
+    grupo por grupo; como cada clínica está en un solo grupo, el archivo final es idéntico al de un solo proceso.
+    :param indices_por_unidad: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus
+        pacientes (sin excluidos) ordenados por prioridad.
+    :type indices_por_unidad: dict
+    :param trabajos: Número de procesos.
+    :type trabajos: int
+    :param escritor: Escritor del archivo de salida.
+    :type escritor: EscritorAsignaciones
+    :param rangos: Opcional. Arreglo con el número de la fase de cada paciente. Si se da, los pacientes se atienden
+        en orden de fase (ver :class:`~colas.ColaPorFase`).
+    :type rangos: numpy.ndarray
+    :param prioridades: Opcional. Arreglo con la prioridad de cada paciente. Si se da, los indices de cada unidad
+        están en el orden del archivo y cada grupo solo ordena a los pacientes que toman sus clínicas (ver
+        :class:`~colas.ColaSeleccion`).
+    :type prioridades: numpy.ndarray
+    :return: None
+    """
+    planes = planificarFases(lotes, lista_de_clinicas, fases)
+    PROGRESO.iniciar({'todas': sum(int(tomas.sum()) for plan in planes for tomas in plan)})
+
+    with ProcessPoolExecutor(max_workers=trabajos) as executor:
+        futuros = []
+        for particion in particionarClinicas(planes, trabajos):
+            clinicas = [lista_de_clinicas[i] for i in particion.tolist()]
+            codigos_por_unidad = {}
+            rangos_por_unidad = None if rangos is None else {}
+            prioridades_por_unidad = None if prioridades is None else {}
+            for clinica in clinicas:
+                if clinica.getCodigo() in indices_por_unidad:
+                    codigos_por_unidad[clinica.getCodigo()] = codigos[indices_por_unidad[clinica.getCodigo()]]
+                    if rangos is not None:
+                        rangos_por_unidad[clinica.getCodigo()] = rangos[indices_por_unidad[clinica.getCodigo()]]
+                    if prioridades is not None:
+                        prioridades_por_unidad[clinica.getCodigo()] = prioridades[
+                            indices_por_unidad[clinica.getCodigo()]]
+            planes_particion = [[tomas[particion] for tomas in plan] for plan in planes]
+            futuros.append((executor.submit(asignarParticion, clinicas, codigos_por_unidad, lotes, lista_de_vacunas,
+                                            planes_particion, params, escritor.getTemporal(),
+                                            escritor.maxFilas // trabajos, rangos_por_unidad,
+                                            prioridades_por_unidad),
+                            sum(int(tomas.sum()) for plan in planes_particion for tomas in plan)))
+        # Los procesos no reportan su avance; se reporta cada grupo cuando termina.
+        PROGRESO.iniciarFase('todas')
+        for futuro, asignados in futuros:
+            escritor.agregarCorridas(futuro.result())
+            PROGRESO.avanzar(asignados)
+        PROGRESO.terminarFase()
+
+
+def prepararLotes(lotes, lista_de_vacunas, verbose=False):
+    """
+    Calcula el número de pacientes que se pueden vacunar con cada lote y ordena los lotes en orden ascendente de
+    fecha, para asignar primero las vacunas que se reciben antes.
+    :param lotes: Lista de lotes. Se modifica.
+    :type lotes: list
+    :param lista_de_vacunas: Diccionario de vacunas.
+    :type lista_de_vacunas: dict
+    :return: None
+    """
     for lote in lotes:
         tipo_vacuna = lote.getMarca()
         num_dosis = lista_de_vacunas[tipo_vacuna].getDosis()
@@ -159,77 +523,562 @@ def runInitialAssignment(verbose, debug):
     # find first lote
     lotes.sort(key=lambda x: x.ingreso)
 
+
+def leerPacientes(fn, verbose, debug, cache=None, trabajos=1, ordenar=True):
+    """
+    Lee la tabla de pacientes con :func:`~pacientes.readPacientes`. Si *fn* es un padrón que ya no corresponde a los
+    pesos o a los archivos de config.txt, muestra el error y termina el programa.
+    :param fn: Ubicación del archivo o del padrón de pacientes.
+    :type fn: String
+    :return: Tabla de pacientes.
+    :rtype: TablaPacientes
+    """
+    try:
+        return readPacientes(fn, params, verbose, debug, tabla=True, cache=cache, trabajos=trabajos, ordenar=ordenar)
+    except ValueError as e:
+        if not os.path.isdir(fn):
+            raise
+        print("Error: " + str(e))
+        sys.exit(1)
+
+
+def leerEntradas(verbose, debug, fns_excluidos, cache=None, trabajos=1, ordenar=True):
+    """
+    Lee las clínicas, vacunas, lotes, pacientes y excluidos. Si *trabajos* es mayor a 1, las clínicas, vacunas, lotes
+    y excluidos se leen en hilos mientras el archivo de pacientes se lee en *trabajos* procesos (ver
+    :func:`~pacientes.leerCSVEnPartes`). Cada archivo se lee igual que en un solo proceso, por lo que el resultado
+    es el mismo.
+    :param fns_excluidos: Ubicación de los archivos de pacientes a excluir.
+    :type fns_excluidos: list
+    :param cache: Opcional. Cache de los datos leidos de los archivos de entrada.
+    :type cache: CacheEntradas
+    :param trabajos: Opcional. Número de procesos en los que se lee el archivo de pacientes.
+    :type trabajos: int
+    :param ordenar: Opcional. Si es falso los pacientes de cada unidad no se ordenan por prioridad al leerlos (ver
+        :func:`~pacientes.readPacientes`).
+    :type ordenar: bool
+    :return: Tupla (lista de clínicas, diccionario de vacunas, lista de lotes, tabla de pacientes, índice de
+        exclusión).
+    :rtype: tuple
+    """
+    lectores = [('clinicas', readClinicas, params.getPathToFiles()+params.getFileClinicas()),
+                ('vacunas', readVacunas, params.getPathToFiles()+params.getFileVacunas()),
+                ('lotes', readLotes, params.getPathToFiles()+params.getFileLotes())]
+    fn_pacientes = params.getPathToFiles()+params.getFilePacientes()
+    if trabajos > 1:
+        with ThreadPoolExecutor(max_workers=len(lectores) + 1) as hilos:
+            futuros = [hilos.submit(leer, fn, verbose, debug, cache) for _, leer, fn in lectores]
+            futuros.append(hilos.submit(readIndiceExclusion, fns_excluidos, verbose, debug, cache=cache))
+            if verbose:
+                print("Leyendo pacientes en " + str(trabajos) + " procesos...")
+            with PERFIL.etapa('pacientes'):
+                tabla_pacientes = leerPacientes(fn_pacientes, verbose, debug, cache, trabajos, ordenar)
+            lista_de_clinicas, lista_de_vacunas, lotes, excluidos = [futuro.result() for futuro in futuros]
+        return lista_de_clinicas, lista_de_vacunas, lotes, tabla_pacientes, excluidos
+
+    leidos = []
+    for nombre, leer, fn in lectores:
+        with PERFIL.etapa(nombre):
+            leidos.append(leer(fn, verbose, debug, cache))
+    if verbose:
+        print("Leyendo pacientes...")
+    with PERFIL.etapa('pacientes'):
+        tabla_pacientes = leerPacientes(fn_pacientes, verbose, debug, cache, ordenar=ordenar)
     if verbose:
         print("Leyendo pacientes a excluir de la vacuna...")
-    excluidos = readExcluidos(params.getPathToFiles()+params.getFileExcluidos(), verbose, debug)
+    with PERFIL.etapa('excluidos'):
+        excluidos = readIndiceExclusion(fns_excluidos, verbose, debug, cache=cache)
+    return tuple(leidos) + (tabla_pacientes, excluidos)
 
-    # Por cada fase, asignamos las vacunas en orden
-    fases = ['n1a', 'n1b', 'n1c', 'n2a', 'n2b', 'n2c', 'n2d', 'n3a', 'n4a', 'n4b', 'n4c', 'n4d']
-    asignaciones = []
 
-    for fase in fases:
-        if verbose:
-            print("Calculando vacunas de la fase " + fase + " por clínica...")
-        # compute how many vaccines per clinic (start with capacity)
-        remaining_vaccines_per_clinic = {}
-        vacunas_por_dia_por_clinica = {}
-        for clinica in lista_de_clinicas:
-            remaining_vaccines_per_clinic[clinica.getCodigo()] = clinica.getMaxPerPhase(fase)
-            vacunas_por_dia_por_clinica[clinica.getCodigo()] = {}
+def crearEscritor(nombre, formato, dependencias, vacunas, ids):
+    """
+    Crea el escritor del archivo de salida *nombre*.csv y, si *formato* no es csv, también del archivo *nombre* en
+    formato Parquet o Arrow.
 
-        # start applying first lot, 1 vaccine per clinic, unless the clinic is at its full.
-        if verbose:
-            print("Asignando vacunas para la fase " + fase + "...")
-        asignaciones += computeAsignaciones(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, pacientes,
-                                           vacunas_por_dia_por_clinica, lista_de_vacunas, fase, excluidos)
+    :param nombre: Nombre del archivo de salida, sin extensión.
+    :type nombre: String
+    :param formato: 'csv', 'parquet' o 'arrow'.
+    :type formato: String
+    :param dependencias: Códigos de todas las clínicas que pueden aparecer en las asignaciones.
+    :type dependencias: list
+    :param vacunas: Códigos de todas las vacunas que pueden aparecer en las asignaciones.
+    :type vacunas: list
+    :param ids: Arreglo con los códigos de los pacientes, o True si ya se sabe que todos son números enteros y False
+        si no.
+    :type ids: numpy.ndarray
+    :return: El escritor de las asignaciones.
+    :rtype: EscritorAsignaciones
+    """
+    columnar = None
+    if formato != 'csv':
+        columnar = EscritorColumnar(params.getPathToFiles()+nombre+FORMATOS[formato], formato, dependencias, vacunas,
+                                    ids if isinstance(ids, bool) else sonEnteros(ids))
+    return EscritorAsignaciones(params.getPathToFiles()+nombre+'.csv', directorio=params.getPathToFiles(),
+                                columnar=columnar)
 
-    # Imprimimos los resultados
+
+def contarEventos(sacados, asignados, calendarios, excluidos):
+    """
+    Anota en el perfil de la corrida (ver :data:`~perfil.PERFIL`) los eventos de la asignación de una fase, a partir
+    de su resultado y no en cada evento, para no hacer más lenta la asignación:
+    * pacientes_sacados: pacientes sacados de las colas.
+    * pacientes_asignados: pacientes que recibieron una vacuna.
+    * revisiones_exclusion y excluidos_saltados: pacientes sacados que se buscaron en el índice de excluidos y cuántos
+      de ellos se saltaron por estar excluidos. Solo si los excluidos no se quitaron antes de las colas.
+    * busquedas_fecha y pasos_busqueda_fecha: búsquedas del primer día libre en los calendarios y días llenos que se
+      saltaron en ellas (ver :meth:`~calendario.CalendarioCapacidad.primerDiaLibre`).
+    :param sacados: Número de pacientes sacados de las colas en la fase.
+    :type sacados: int
+    :param asignados: Número de pacientes asignados en la fase.
+    :type asignados: int
+    :param calendarios: Calendarios de la fase.
+    :type calendarios: dict
+    :param excluidos: Índice de los pacientes a excluir, o None si ya fueron quitados de las colas.
+    :type excluidos: IndiceExclusion
+    :return: None
+    """
+    PERFIL.contar('pacientes_sacados', sacados)
+    PERFIL.contar('pacientes_asignados', asignados)
+    if excluidos is not None:
+        PERFIL.contar('revisiones_exclusion', sacados)
+        PERFIL.contar('excluidos_saltados', sacados - asignados)
+    PERFIL.contar('busquedas_fecha', sum(c.getBusquedas() for c in calendarios.values()))
+    PERFIL.contar('pasos_busqueda_fecha', sum(c.getPasos() for c in calendarios.values()))
+
+
+def runInitialAssignment(verbose, debug, prefiltrar=False, por_bloques=False, trabajos=1, formato='csv', cache=None,
+                         por_fase=False, seleccion=False):
+    """
+    Si el programa se corre sin el parametro -u, calcula la distribución de vacunas a utilizar por clínica y paciente.
+    Utiliza los datos de la disponibilidad de los lotes de vacunas, la lista de pacientes, sus datos personales, y
+    las capacidades de las clínicas para asignar ambas dosis.
+    :param verbose: Si es True despliega información adicional mientras corre.
+    :type verbose: bool
+    :param debug: Si es True despliega información util para la depuración.
+    :type debug: bool
+    :param prefiltrar: Si es True quita a los pacientes excluidos de las listas de pacientes antes de asignar.
+    :type prefiltrar: bool
+    :param por_bloques: Si es True asigna las vacunas por bloques de pacientes (ver
+        :func:`computeAsignacionesPorBloques`).
+    :type por_bloques: bool
+    :param trabajos: Número de procesos en los que se reparten las clínicas (ver
+        :func:`computeAsignacionesEnParalelo`) y se lee el archivo de pacientes (ver :func:`leerEntradas`). Si es
+        mayor a 1 implica *prefiltrar* y *por_bloques*.
+    :type trabajos: int
+    :param formato: Opcional. Formato adicional de la salida, 'parquet' o 'arrow' (ver :func:`crearEscritor`).
+    :type formato: String
+    :param cache: Opcional. Cache de los datos leidos de los archivos de entrada.
+    :type cache: CacheEntradas
+    :param por_fase: Opcional. Si es True cada clínica atiende primero a los pacientes de las primeras fases (ver
+        :class:`~colas.ColaPorFase`).
+    :type por_fase: bool
+    :param seleccion: Opcional. Si es True los pacientes de cada unidad no se ordenan completos por prioridad; cada
+        cola solo ordena a los pacientes que se espera asignar en su clínica (ver :class:`~colas.ColaSeleccion`). No
+        se usa con *por_fase*.
+    :type seleccion: bool
+    """
+    seleccion = seleccion and not por_fase
     if verbose:
-        print("Imprimiendo resultado...")
-    asignaciones.sort(key=lambda x: [x.dependencia, x.fecha, x.dosis, x.orden])
-    f = open(params.getPathToFiles()+'asignaciones.csv', 'w')
-    f.write("IdPaciente,codigoDependencia,tipo_vacuna,Dosis,orden,fecha\n")
-    for a in asignaciones:
-        f.write(str(a))
-        f.write("\n")
-    f.close()
+        print("Usando " + str(params.getNumEstacionesPorDepencencia()) + " estaciones por dependencia.")
+        print("")
+
+    # Lee las clinicas, vacunas, lotes de vacunas, pacientes y pacientes a excluir
+    lista_de_clinicas, lista_de_vacunas, lotes, tabla_pacientes, excluidos = leerEntradas(
+        verbose, debug, [params.getPathToFiles()+fn for fn in params.getFilesExcluidos()], cache, trabajos,
+        not seleccion)
+    codigos = tabla_pacientes.getCodigos()
+    # Si la tabla viene de la cache o del padrón ya está ordenada y no hace falta seleccionar.
+    seleccion = seleccion and not tabla_pacientes.isOrdenado()
+    if seleccion:
+        indices_por_unidad = tabla_pacientes.getGruposPorUnidad()
+    else:
+        indices_por_unidad = tabla_pacientes.getIndicesPorUnidad()
+
+    # Ordena los lotes en orden ascendente de fecha para asignar primero las vacunas que se reciben antes.
+    prepararLotes(lotes, lista_de_vacunas, verbose)
+
+    if trabajos > 1:
+        prefiltrar = True
+        por_bloques = True
+    if prefiltrar:
+        with PERFIL.etapa('prefiltro'):
+            for unidad in indices_por_unidad:
+                antes = len(indices_por_unidad[unidad])
+                indices_por_unidad[unidad] = excluidos.filtrar(codigos, indices_por_unidad[unidad])
+                PERFIL.contar('excluidos_quitados', antes - len(indices_por_unidad[unidad]))
+        excluidos = None
+
+    if por_bloques and len(set(c.getCodigo() for c in lista_de_clinicas)) < len(lista_de_clinicas):
+        print("Advertencia: Hay clínicas con el mismo código, no se puede asignar por bloques.")
+        por_bloques = False
+        trabajos = 1
+
+    fases = lista_de_clinicas.getFases()
+    rangos = tabla_pacientes.getRangosFase(fases) if por_fase else None
+    prioridades = tabla_pacientes.getPrioridades() if seleccion else None
+    if por_fase:
+        pacientes = crearColasPorFase(codigos, indices_por_unidad, rangos)
+    elif not seleccion:
+        pacientes = crearColas(codigos, indices_por_unidad)
+    elif trabajos == 1:
+        with PERFIL.etapa('seleccion'):
+            pacientes = crearColasSeleccion(codigos, indices_por_unidad, prioridades,
+                                            tomasPorUnidad(planificarFases(lotes, lista_de_clinicas, fases),
+                                                           lista_de_clinicas))
+    else:
+        # Con varios procesos cada grupo crea las colas de sus clínicas (ver asignarParticion).
+        pacientes = None
+
+    # Por cada fase, asignamos las vacunas en orden
+    with crearEscritor('asignaciones', formato, [c.getCodigo() for c in lista_de_clinicas],
+                       [lote.getMarca() for lote in lotes], codigos) as escritor:
+        if trabajos > 1:
+            if verbose:
+                print("Asignando vacunas de todas las fases en " + str(trabajos) + " procesos...")
+            with PERFIL.etapa('asignacion en paralelo'):
+                computeAsignacionesEnParalelo(lotes, lista_de_clinicas, codigos, indices_por_unidad, lista_de_vacunas,
+                                              fases, trabajos, escritor, rangos, prioridades)
+        else:
+            if PROGRESO.isActivo():
+                # El plan de cada fase da el número de pacientes que se asignan, igual que en computeAsignaciones.
+                PROGRESO.iniciar({fase: sum(int(tomas.sum()) for tomas in plan)
+                                  for fase, plan in zip(fases, planificarFases(lotes, lista_de_clinicas, fases))})
+            # Las existencias pasan de una fase a la siguiente: cada fase usa lo que sobró de cada lote.
+            existencias = Existencias(lotes)
+            for fase in fases:
+                if verbose:
+                    print("Calculando vacunas de la fase " + fase + " por clínica...")
+                # compute how many vaccines per clinic (start with capacity)
+                remaining_vaccines_per_clinic = capacidadesFase(lista_de_clinicas, fase)
+                calendarios = crearCalendarios(lista_de_clinicas, params)
+
+                # start applying first lot, 1 vaccine per clinic, unless the clinic is at its full.
+                if verbose:
+                    print("Asignando vacunas para la fase " + fase + "...")
+                PROGRESO.iniciarFase(fase)
+                with PERFIL.etapa('fase ' + fase):
+                    sacados = sum(getCursores(pacientes).values()) if PERFIL.isActivo() else 0
+                    asignados = 0
+                    if por_bloques:
+                        plan = planificarFase(lotes, lista_de_clinicas, remaining_vaccines_per_clinic, existencias,
+                                              fase)
+                        for bloque in asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios,
+                                                  lista_de_vacunas, excluidos):
+                            escritor.agregar(bloque)
+                            asignados += len(bloque) // 2
+                            PROGRESO.avanzar(len(bloque) // 2)
+                    else:
+                        asignaciones = computeAsignaciones(lotes, lista_de_clinicas, remaining_vaccines_per_clinic,
+                                                           pacientes, calendarios, lista_de_vacunas, fase, excluidos,
+                                                           existencias)
+                        escritor.agregar(BloqueAsignaciones.desdeLista(asignaciones))
+                        asignados = len(asignaciones) // 2
+                    if PERFIL.isActivo():
+                        contarEventos(sum(getCursores(pacientes).values()) - sacados, asignados, calendarios, excluidos)
+                if verbose:
+                    for evento in existencias.getEventos(fase):
+                        if evento['evento'] == 'lote_agotado':
+                            print("Se agotó el lote " + str(evento['lote']) + " en la fase " + fase + ".")
+                        else:
+                            print("Se agotaron las vacunas " + str(evento['marca']) + " en la fase " + fase + ".")
+                PROGRESO.terminarFase()
+        PROGRESO.terminar()
+
+        # Imprimimos los resultados
+        if verbose:
+            print("Imprimiendo resultado...")
+        with PERFIL.etapa('salida'):
+            escritor.cerrar()
     print("\nListo.")
 
 
-def runUpdate(verbose, debug):
+def calcularFechasObjetivo(vacunados, lista_de_vacunas):
+    """
+    :param vacunados: Pacientes vacunados.
+    :type vacunados: TablaVacunados
+    :param lista_de_vacunas: Diccionario de vacunas.
+    :type lista_de_vacunas: dict
+    :return: Fecha en la que le toca la segunda dosis a cada paciente, como datetime64[D]: la fecha de la primera dosis
+        más el tiempo entre dosis de la vacuna, sin tomar en cuenta la capacidad de las clínicas.
+    :rtype: numpy.ndarray
+    """
+    tiempo = {k: v.getTiempo() for k, v in lista_de_vacunas.items()}
+    tiempos = np.array([tiempo.get(vacuna, np.nan) for vacuna in vacunados.getVacunas().tolist()], dtype=np.float64)
+    if np.isnan(tiempos).any():
+        raise KeyError(vacunados.getVacunas()[np.isnan(tiempos)][0])
+    # Semanas a microsegundos, redondeando igual que datetime.timedelta, y después a días completos (ver
+    # calendario.diasDesplazamiento).
+    espera = np.rint(tiempos * 7 * 24 * 3600 * 10 ** 6).astype(np.int64) // (24 * 3600 * 10 ** 6)
+    return vacunados.getFechas() + espera.astype('timedelta64[D]')
+
+
+def calcularSegundasDosis(vacunados, lista_de_vacunas, turnos=None, orden_inicial=1):
+    """
+    Calcula las asignaciones de ambas dosis de los pacientes *vacunados* como operaciones sobre columnas: la fecha de
+    la segunda dosis es la fecha de la primera más el tiempo entre dosis de la vacuna.
+    :param vacunados: Pacientes vacunados.
+    :type vacunados: TablaVacunados
+    :param lista_de_vacunas: Diccionario de vacunas.
+    :type lista_de_vacunas: dict
+    :param turnos: Opcional. Si se da, las segundas dosis respetan la capacidad de las clínicas (ver
+        :class:`~calendario.TurnosSegundasDosis`).
+    :type turnos: TurnosSegundasDosis
+    :param orden_inicial: Opcional. Orden del primer paciente.
+    :type orden_inicial: int
+    :return: Asignaciones de ambas dosis.
+    :rtype: BloqueAsignaciones
+    """
+    fechas1 = vacunados.getFechas()
+    fechas2 = calcularFechasObjetivo(vacunados, lista_de_vacunas)
+    if turnos is not None:
+        fechas2 = turnos.asignar(vacunados.getClinicas(), fechas2)
+    n = len(vacunados)
+    ids = vacunados.getCodigos().astype(str).astype(object)
+    ordenes = np.arange(orden_inicial, orden_inicial + n, dtype=np.int64)
+    return BloqueAsignaciones(np.concatenate([ids, ids]), np.concatenate([vacunados.getVacunas()] * 2),
+                              np.repeat(np.array([1, 2], dtype=np.int8), n),
+                              np.concatenate([vacunados.getClinicas()] * 2), np.concatenate([ordenes, ordenes]),
+                              np.concatenate([fechas1, fechas2]))
+
+
+def runUpdate(verbose, debug, formato='csv', cache=None):
     """
     Si el programa se corre con el parametro -u, lee la lista de personas que fueron vacunadas en la realidad (las
-    cuales pueden ser distintas a las generadas originalmente) y calcula cuando deben recibir la segunda dosis.
+    cuales pueden ser distintas a las generadas originalmente) y calcula cuando deben recibir la segunda dosis (ver
+    :func:`calcularSegundasDosis`), respetando la capacidad de cada clínica.
+
+    El archivo de vacunados se lee dos veces por partes (ver :func:`~vacunados.leerVacunadosPorPartes`), por lo que la
+    memoria utilizada no depende de su tamaño: la primera vez solo se cuentan las dosis de cada clínica y día (ver
+    :class:`~vacunados.ResumenVacunados`) para reservar los días de las segundas dosis, y la segunda vez se calculan
+    las asignaciones de cada parte y se pasan al escritor.
+    :param formato: Opcional. Formato adicional de la salida, 'parquet' o 'arrow' (ver :func:`crearEscritor`).
+    :type formato: String
+    :param cache: Opcional. Cache de los datos leidos de los archivos de entrada.
+    :type cache: CacheEntradas
     """
-    # Lee las vacunas e información de personas vacunadas.
-    lista_de_vacunas = readVacunas(params.getPathToFiles() + params.getFileVacunas(), verbose, debug)
+    # Lee las vacunas y clínicas, y cuenta las dosis de las personas vacunadas.
+    with PERFIL.etapa('vacunas'):
+        lista_de_vacunas = readVacunas(params.getPathToFiles() + params.getFileVacunas(), verbose, debug, cache)
+    with PERFIL.etapa('clinicas'):
+        lista_de_clinicas = readClinicas(params.getPathToFiles()+params.getFileClinicas(), verbose, debug, cache)
+    fn = params.getPathToFiles()+params.getFileVacunados()
+    with PERFIL.etapa('resumen de vacunados'):
+        resumen = ResumenVacunados()
+        for vacunados in leerVacunadosPorPartes(fn, verbose=verbose, debug=debug):
+            resumen.agregar(vacunados, calcularFechasObjetivo(vacunados, lista_de_vacunas))
+    PERFIL.contar('vacunados_leidos', len(resumen))
 
-    vacunados = readVacunados(params.getPathToFiles()+params.getFileVacunados(), verbose, debug)
-    asignaciones = []
-    orden = 0
-
-    # En función de las personas vacunadas, se crea la asignación de la segunda dosis.
-    for vacunado in vacunados:
-        orden += 1
-        asignacion_dosis_1 = Asignacion(vacunado.getCodigo(), vacunado.getVacuna(), 1, vacunado.getClinica(), orden,
-                                                   str(vacunado.getFecha()))
-        tiempo_entre_dosis = lista_de_vacunas[vacunado.getVacuna()].getTiempo()
-        fecha_2 = vacunado.getFecha() + datetime.timedelta(weeks=tiempo_entre_dosis)
-        asignacion_dosis_2 = Asignacion(vacunado.getCodigo(), vacunado.getVacuna(), 2, vacunado.getClinica(), orden,
-                                        str(fecha_2))
-        asignaciones.append(asignacion_dosis_1)
-        asignaciones.append(asignacion_dosis_2)
-
-    # Imprimimos los resultados.
+    # Las primeras dosis ya fueron aplicadas, por lo que se reservan aunque excedan la capacidad.
+    with PERFIL.etapa('reserva de segundas dosis'):
+        calendarios = crearCalendarios(lista_de_clinicas, params)
+        for (clinica, dia), n in resumen.getPrimeras().items():
+            if clinica in calendarios:
+                calendarios[clinica].reservar(dia, n)
+        turnos = TurnosSegundasDosis(resumen.getSegundas(), calendarios)
+
+    # En función de las personas vacunadas, se crea la asignación de la segunda dosis y se imprime.
     if verbose:
         print("Imprimiendo asignaciones basados en vacunaciones...")
-    asignaciones.sort(key=lambda x: [x.dependencia, x.fecha, x.dosis, x.orden])
-    f = open(params.getPathToFiles()+'asignaciones_reales_dosis_2.csv', 'w')
-    f.write("IdPaciente,codigoDependencia,tipo_vacuna,Dosis,orden,fecha\n")
-    for a in asignaciones:
-        f.write(str(a))
-        f.write("\n")
-    f.close()
+    with crearEscritor('asignaciones_reales_dosis_2', formato, list(resumen.getPorClinica()),
+                       resumen.getVacunas(), resumen.getIdsEnteros()) as escritor:
+        orden = 1
+        with PERFIL.etapa('segundas dosis'):
+            for vacunados in leerVacunadosPorPartes(fn):
+                escritor.agregar(calcularSegundasDosis(vacunados, lista_de_vacunas, turnos, orden))
+                orden += len(vacunados)
+        with PERFIL.etapa('salida'):
+            escritor.cerrar()
+    print("\nListo.")
+
+
+def firmaPlan():
+    """
+    :return: Hash de los datos de los que dependen los lugares de un plan (cuántas vacunas toma cada clínica de cada
+        lote y en qué fechas): clínicas (incluyendo sus fases), lotes, vacunas, estaciones por dependencia y la
+        versión del cálculo del plan.
+    :rtype: String
+    """
+    fns = [params.getFileClinicas(), params.getFileLotes(), params.getFileVacunas()]
+    return repr(([hashArchivo(params.getPathToFiles()+fn) for fn in fns], params.getNumEstacionesPorDepencencia(),
+                 VERSION_PLAN))
+
+
+def planificarEstado(lotes, lista_de_clinicas, pacientes, lista_de_vacunas, excluidos, firma, huellas):
+    """
+    Asigna las vacunas de todas las fases por bloques (ver :func:`planificarFases` y :func:`asignarFase`) y guarda el
+    resultado como un :class:`~estado.EstadoPlan`.
+    :param pacientes: Diccionario con llave el código de la unidad y valor la cola de sus pacientes ordenados por
+        prioridad.
+    :type pacientes: dict
+    :param excluidos: Índice de los pacientes a excluir.
+    :type excluidos: IndiceExclusion
+    :return: El estado del plan.
+    :rtype: EstadoPlan
+    """
+    bloques = []
+    planes = planificarFases(lotes, lista_de_clinicas, lista_de_clinicas.getFases())
+    for plan in planes:
+        calendarios = crearCalendarios(lista_de_clinicas, params)
+        bloques += asignarFase(lotes, lista_de_clinicas, plan, pacientes, calendarios, lista_de_vacunas, excluidos)
+    return EstadoPlan.desdeBloques(firma, bloques, huellas, getCursores(pacientes), set(excluidos.getCodigos()))
+
+
+def exclusionIncremental(excluidos, vacunados, ids=None):
+    """
+    :param excluidos: Índice de los pacientes de los archivos de excluidos.
+    :type excluidos: IndiceExclusion
+    :param vacunados: Índice de los pacientes de ``vacunados.csv``.
+    :type vacunados: IndiceExclusion
+    :param ids: Opcional. Códigos (como texto) de los pacientes con un lugar en el plan anterior. Si no se da, se
+        excluye a todos los vacunados.
+    :type ids: numpy.ndarray
+    :return: Índice de los pacientes que no pueden recibir un lugar en el plan: los excluidos y los vacunados que no
+        tienen un lugar en el plan anterior. Los vacunados que sí tienen un lugar lo conservan (ver
+        :func:`runIncremental`).
+    :rtype: IndiceExclusion
+    """
+    codigos = vacunados.getCodigos()
+    if ids is not None and len(codigos):
+        codigos = codigos[~np.isin(codigos.astype(str), ids)]
+    return IndiceExclusion(set(excluidos.getCodigos().tolist()) | set(codigos.tolist()))
+
+
+def unidadesAfectadas(anterior, tabla_pacientes, excluidos, huellas):
+    """
+    Busca las unidades cuyas asignaciones pueden cambiar respecto al plan *anterior*:
+    * Las unidades cuya cola de pacientes cambió (pacientes nuevos, quitados o con otra prioridad).
+    * Las unidades de los pacientes que se excluyeron o dejaron de excluir, si el paciente está antes del cursor de
+      la cola, es decir, entre los pacientes que se revisaron al asignar. Los cambios después del cursor no cambian
+      el plan.
+    :param anterior: Estado del plan anterior.
+    :type anterior: EstadoPlan
+    :param tabla_pacientes: Tabla de pacientes.
+    :type tabla_pacientes: TablaPacientes
+    :param excluidos: Índice de los pacientes a excluir.
+    :type excluidos: IndiceExclusion
+    :param huellas: Diccionario con llave el código de la unidad y valor la huella de su cola de pacientes.
+    :type huellas: dict
+    :return: Códigos de las unidades afectadas.
+    :rtype: set
+    """
+    result = set(unidad for unidad, huella in huellas.items() if anterior.getHuellas().get(unidad) != huella)
+    cambios = IndiceExclusion(anterior.getExcluidos() ^ set(excluidos.getCodigos()))
+    indices = np.flatnonzero(cambios.mascara(tabla_pacientes.getCodigos()))
+    for i, posicion in zip(indices.tolist(), tabla_pacientes.getPosiciones(indices).tolist()):
+        if posicion < 0:
+            continue
+        unidad = tabla_pacientes.getValor('nombreUnidadAdscripcion', i)
+        if posicion < anterior.getCursores().get(unidad, 0):
+            result.add(unidad)
+    return result
+
+
+def runIncremental(verbose, debug, directorio, cache=None, trabajos=1):
+    """
+    Si el programa se corre con el parametro -i, replanifica a partir del plan guardado en *directorio*. Los
+    pacientes vacunados (``vacunados.csv``) que ya tienen un lugar en el plan lo conservan, aunque su clínica se
+    vuelva a asignar; los demás vacunados se excluyen igual que los de los archivos de excluidos (ver
+    :func:`exclusionIncremental`).
+
+    Como las colas de pacientes y los calendarios son de cada clínica y las fechas de cada lugar no dependen de los
+    pacientes, un cambio en los pacientes, los excluidos o los vacunados solo cambia qué pacientes reciben los lugares
+    de las clínicas afectadas (ver :func:`unidadesAfectadas`). Solo esas clínicas se vuelven a asignar y se escribe
+    ``asignaciones_cambios.csv`` con las asignaciones que cambiaron (ver :func:`~salida.escribirCambios`). El
+    resultado es el mismo que volver a calcular todo el plan.
+
+    Si no hay un plan guardado se calcula el plan completo, se escribe ``asignaciones.csv`` y se guarda el plan. Si
+    cambiaron las clínicas, los lotes, las vacunas o la configuración se vuelve a calcular el plan completo y se
+    escriben los cambios respecto al anterior.
+    :param directorio: Folder donde se guarda el estado del plan.
+    :type directorio: String
+    :param cache: Opcional. Cache de los datos leidos de los archivos de entrada.
+    :type cache: CacheEntradas
+    :param trabajos: Opcional. Número de procesos en los que se lee el archivo de pacientes (ver
+        :func:`leerEntradas`).
+    :type trabajos: int
+    """
+    lista_de_clinicas, lista_de_vacunas, lotes, tabla_pacientes, excluidos = leerEntradas(
+        verbose, debug, [params.getPathToFiles()+fn for fn in params.getFilesExcluidos()], cache, trabajos)
+    vacunados = readIndiceExclusion([params.getPathToFiles()+params.getFileVacunados()], verbose, debug,
+                                    cache=cache)
+    prepararLotes(lotes, lista_de_vacunas, verbose)
+    if len(set(c.getCodigo() for c in lista_de_clinicas)) < len(lista_de_clinicas):
+        print("Error: Hay clínicas con el mismo código, no se puede replanificar por clínica.")
+        sys.exit(1)
+    codigos = tabla_pacientes.getCodigos()
+    indices_por_unidad = tabla_pacientes.getIndicesPorUnidad()
+
+    firma = firmaPlan()
+    huellas = {}
+    for unidad, indices in indices_por_unidad.items():
+        huellas[unidad] = huellaCola(codigos[indices])
+    anterior = leerEstado(directorio)
+
+    if anterior is None or anterior.getFirma() != firma:
+        if verbose:
+            print("Calculando el plan completo...")
+        # Los lugares cambian, por lo que los vacunados no conservan su lugar del plan anterior.
+        estado = planificarEstado(lotes, lista_de_clinicas, crearColas(codigos, indices_por_unidad), lista_de_vacunas,
+                                  exclusionIncremental(excluidos, vacunados), firma, huellas)
+        if anterior is None:
+            with crearEscritor('asignaciones', 'csv', [c.getCodigo() for c in lista_de_clinicas],
+                               [lote.getMarca() for lote in lotes], codigos) as escritor:
+                escritor.agregar(estado.bloque())
+                escritor.cerrar()
+        else:
+            n = escribirCambios(params.getPathToFiles()+'asignaciones_cambios.csv', anterior.bloque(),
+                                estado.bloque())
+            print(str(n) + " asignaciones cambiaron.")
+    else:
+        efectivos = exclusionIncremental(excluidos, vacunados, anterior.ids)
+        afectadas = unidadesAfectadas(anterior, tabla_pacientes, efectivos, huellas)
+        # Los vacunados con lugar lo conservan, y ningún vacunado puede tomar otro lugar.
+        fijos = np.isin(anterior.ids, vacunados.getCodigos().astype(str))
+        excluidos_colas = exclusionIncremental(excluidos, vacunados)
+        ids = anterior.ids.copy()
+        cursores = dict(anterior.getCursores())
+        lugares = []
+        for clinica in lista_de_clinicas:
+            if clinica.getCodigo() not in afectadas:
+                continue
+            if verbose:
+                print("Replanificando la clínica " + str(clinica.getCodigo()) + "...")
+            lugares_clinica = anterior.getLugares(clinica.getCodigo())
+            lugares_clinica = lugares_clinica[~fijos[lugares_clinica]]
+            cola = ColaPacientes(codigos, indices_por_unidad[clinica.getCodigo()])
+            ids[lugares_clinica] = tomarPacientes(cola, len(lugares_clinica), excluidos_colas).astype(str)
+            cursores[clinica.getCodigo()] = cola.getCursor()
+            lugares.append(lugares_clinica)
+        lugares = np.concatenate(lugares) if lugares else np.zeros(0, dtype=np.int64)
+        estado = EstadoPlan(firma, anterior.dependencias, anterior.vacunas, anterior.ordenes, anterior.fechas1,
+                            anterior.fechas2, ids, huellas, cursores, set(efectivos.getCodigos()))
+        n = escribirCambios(params.getPathToFiles()+'asignaciones_cambios.csv', anterior.bloque(lugares),
+                            estado.bloque(lugares))
+        print(str(len(lugares)) + " lugares replanificados, " + str(n) + " asignaciones cambiaron.")
+
+    guardarEstado(estado, directorio)
+    print("\nListo.")
+
+
+def runPadron(verbose, debug, destino, cache=None, trabajos=1):
+    """
+    Si el programa se corre con el parametro -p, lee los pacientes y guarda su padrón en el folder *destino* (ver
+    :func:`~pacientes.escribirPadron`).
+    :param destino: Folder donde se guarda el padrón, relativo al path de los archivos de entrada de config.txt, igual
+        que el archivo de pacientes.
+    :type destino: String
+    :param cache: Opcional. Cache de los datos leidos de los archivos de entrada.
+    :type cache: CacheEntradas
+    :param trabajos: Opcional. Número de procesos en los que se lee el archivo de pacientes (ver
+        :func:`~pacientes.leerCSVEnPartes`).
+    :type trabajos: int
+    """
+    if verbose:
+        print("Leyendo pacientes...")
+    tabla_pacientes = leerPacientes(params.getPathToFiles()+params.getFilePacientes(), verbose, debug, cache,
+                                    trabajos)
+    escribirPadron(tabla_pacientes, os.path.join(params.getPathToFiles(), destino), params)
     print("\nListo.")
 
 
@@ -240,9 +1089,20 @@ def main(argv):
     verbose = True
     debug = False
     update_mode = False
+    prefiltrar = False
+    por_bloques = False
+    trabajos = 1
+    formato = 'csv'
+    cache = None
+    padron = None
+    incremental = None
+    fn_perfil = None
+    fn_cprofile = None
+    por_fase = False
+    seleccion = False
 
     try:
-        opts, args = getopt.getopt(argv, "vdu")
+        opts, args = getopt.getopt(argv, "vduxbgsj:f:c:p:i:", ["profile=", "cprofile=", "progress="])
     except getopt.GetoptError:
         print('Argumento no reconocido')
         sys.exit(2)
@@ -253,13 +1113,83 @@ def main(argv):
             debug = True
         if opt == '-u':
             update_mode = True
+        if opt == '-x':
+            prefiltrar = True
+        if opt == '-b':
+            por_bloques = True
+        if opt == '-g':
+            por_fase = True
+        if opt == '-s':
+            seleccion = True
+        if opt == '-j':
+            if not arg.isdigit() or int(arg) < 1:
+                print('El número de procesos debe ser un entero positivo')
+                sys.exit(2)
+            trabajos = int(arg)
+        if opt == '-f':
+            if arg not in FORMATOS:
+                print('El formato debe ser csv, parquet o arrow')
+                sys.exit(2)
+            formato = arg
+        if opt == '-c':
+            cache = CacheEntradas(arg)
+        if opt == '-p':
+            padron = arg
+        if opt == '-i':
+            incremental = arg
+        if opt == '--profile':
+            fn_perfil = arg
+        if opt == '--cprofile':
+            fn_cprofile = arg
+        if opt == '--progress':
+            PROGRESO.activar(arg)
 
-    if update_mode:
-        runUpdate(verbose,debug)
-    else:
-        runInitialAssignment(verbose,debug)
+    if por_fase and incremental is not None:
+        print('El parámetro -g no se puede usar con -i')
+        sys.exit(2)
+
+    if formato != 'csv':
+        try:
+            importarArrow()
+        except ImportError as e:
+            print(e)
+            sys.exit(2)
+
+    if fn_perfil is not None:
+        PERFIL.activar()
+    global params
+    if params is None:
+        with PERFIL.etapa('config'):
+            params = readConfig('config.txt')
+
+    perfilador = None
+    if fn_cprofile is not None:
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    try:
+        if padron is not None:
+            with PERFIL.etapa('padron'):
+                runPadron(verbose, debug, padron, cache, trabajos)
+        elif incremental is not None:
+            with PERFIL.etapa('incremental'):
+                runIncremental(verbose, debug, incremental, cache, trabajos)
+        elif update_mode:
+            with PERFIL.etapa('actualizacion'):
+                runUpdate(verbose, debug, formato, cache)
+        else:
+            with PERFIL.etapa('plan'):
+                runInitialAssignment(verbose, debug, prefiltrar, por_bloques, trabajos, formato, cache, por_fase,
+                                     seleccion)
+    finally:
+        # Los reportes se guardan aunque la corrida termine con error, para ver hasta dónde llegó.
+        if perfilador is not None:
+            perfilador.disable()
+            perfilador.dump_stats(fn_cprofile)
+        if fn_perfil is not None:
+            PERFIL.guardar(fn_perfil)
+            if verbose:
+                print("Perfil guardado en " + fn_perfil)
 
 
 if __name__ == "__main__":
-    params = readConfig('config.txt')
     main(sys.argv[1:])
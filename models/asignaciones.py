@@ -4,10 +4,14 @@ asignaciones.py
 ===============
 
 Clase encargada de leer y mantener los datos acerca de las asignaciones de vacunas. Consta de una clase llamada
-:class:`~asignaciones.Asignacion` que guarda todos los valores relevantes a las asignaciones.
+:class:`~asignaciones.Asignacion` que guarda todos los valores relevantes a las asignaciones, y la clase
+:class:`~asignaciones.BloqueAsignaciones` que guarda muchas asignaciones como arreglos.
 Esta clase es utilizada por el programa principal :mod:main.py al final para devolver los valores acerca
 de las asignaciones que es el resultado final.
 """
+import numpy as np
+
+from models.calendario import fechaDeDia, fechasDeDias
 
 
 class Asignacion:
@@ -18,7 +22,7 @@ class Asignacion:
     * Número de dosis.
     * Unidad de vacunación donde se utilizará esta vacunación.
     * Orden de prioridad para vacunación.
-    * Fecha de vacunación de la asignación.
+    * Día de vacunación de la asignación (ver :func:`~calendario.numeroDia`).
     """
     def __init__(self, i, vacuna, dosis, dependencia, orden, fecha):
         self.id = i
@@ -31,4 +35,88 @@ class Asignacion:
     def __str__(self):
         return self.id + "," + str(self.dependencia) + "," + \
                str(self.vacuna) + "," + str(self.dosis) + "," + str(self.orden) + "," + \
-               str(self.fecha)
+               str(fechaDeDia(self.fecha))
+
+
+class BloqueAsignaciones:
+    """
+    Guarda muchas asignaciones como arreglos, una columna por campo de :class:`~asignaciones.Asignacion`:
+    * Código de identificación de cada asignación.
+    * Código de la vacuna.
+    * Número de dosis.
+    * Unidad de vacunación.
+    * Orden de prioridad para vacunación.
+    * Fecha de vacunación, como datetime64[D].
+    """
+    def __init__(self, ids, vacunas, dosis, dependencias, ordenes, fechas):
+        self.ids = ids
+        self.vacunas = vacunas
+        self.dosis = dosis
+        self.dependencias = dependencias
+        self.ordenes = ordenes
+        self.fechas = fechas
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def desdeLista(asignaciones):
+        """
+        :param asignaciones: Lista de asignaciones.
+        :type asignaciones: list
+        :return: Las mismas asignaciones como arreglos.
+        :rtype: BloqueAsignaciones
+        """
+        return BloqueAsignaciones(np.array([a.id for a in asignaciones], dtype=object),
+                                  np.array([a.vacuna for a in asignaciones]),
+                                  np.array([a.dosis for a in asignaciones], dtype=np.int8),
+                                  np.array([a.dependencia for a in asignaciones]),
+                                  np.array([a.orden for a in asignaciones], dtype=np.int64),
+                                  fechasDeDias([a.fecha for a in asignaciones]))
+
+    @staticmethod
+    def concatenar(bloques):
+        """
+        :param bloques: Lista de bloques de asignaciones.
+        :type bloques: list
+        :return: Un solo bloque con las asignaciones de todos los *bloques*, en el mismo orden.
+        :rtype: BloqueAsignaciones
+        """
+        bloques = [b for b in bloques if len(b) > 0]
+        if not bloques:
+            return BloqueAsignaciones.desdeLista([])
+        return BloqueAsignaciones(np.concatenate([b.ids for b in bloques]),
+                                  np.concatenate([b.vacunas for b in bloques]),
+                                  np.concatenate([b.dosis for b in bloques]),
+                                  np.concatenate([b.dependencias for b in bloques]),
+                                  np.concatenate([b.ordenes for b in bloques]),
+                                  np.concatenate([b.fechas for b in bloques]))
+
+    def getParte(self, inicio, fin):
+        """
+        :return: Las asignaciones entre las posiciones *inicio* y *fin*.
+        :rtype: BloqueAsignaciones
+        """
+        return BloqueAsignaciones(self.ids[inicio:fin], self.vacunas[inicio:fin], self.dosis[inicio:fin],
+                                  self.dependencias[inicio:fin], self.ordenes[inicio:fin], self.fechas[inicio:fin])
+
+    def ordenar(self):
+        """
+        Ordena las asignaciones por dependencia, fecha, dosis y orden. El ordenamiento es estable.
+
+        :return: Las asignaciones ordenadas.
+        :rtype: BloqueAsignaciones
+        """
+        dependencias = np.unique(self.dependencias, return_inverse=True)[1]
+        orden = np.lexsort((self.ordenes, self.dosis, self.fechas, dependencias))
+        return BloqueAsignaciones(self.ids[orden], self.vacunas[orden], self.dosis[orden],
+                                  self.dependencias[orden], self.ordenes[orden], self.fechas[orden])
+
+    def filas(self):
+        """
+        :return: Las asignaciones como tuplas (id, dependencia, vacuna, dosis, orden, fecha) de valores de Python.
+        :rtype: iterator
+        """
+        return zip(self.ids.tolist(), self.dependencias.tolist(), self.vacunas.tolist(), self.dosis.tolist(),
+                   self.ordenes.tolist(), self.fechas.tolist())
+
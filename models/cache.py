@@ -0,0 +1,205 @@
+"""
+========
+cache.py
+========
+
+Clase encargada de guardar en disco los datos ya leidos de los archivos de entrada, para no volver a leerlos con
+pandas en cada corrida. Consta de una clase llamada :class:`~cache.CacheEntradas` que guarda y recupera los datos
+con una llave calculada a partir del contenido de los archivos de entrada y de los parámetros que se usaron para
+procesarlos, el método :func:`~cache.hashArchivo` que calcula el hash del contenido de un archivo, y los métodos
+:func:`~cache.guardarArreglos` y :func:`~cache.leerArreglos` que guardan y leen un folder de arreglos.
+Esta clase es utilizada por los métodos ``read*`` de los modelos cuando el programa principal :mod:main.py se corre
+con el parámetro -c.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+# Cambia cuando cambia el formato de los datos guardados, para no usar entradas de versiones anteriores.
+VERSION = '2'
+
+_hashes = {}
+
+
+def hashArchivo(fn):
+    """
+    Calcula el hash del contenido del archivo *fn*. El resultado se recuerda mientras el archivo no cambie de tamaño
+    ni de fecha de modificación, para no leer el mismo archivo dos veces en una corrida.
+
+    :param fn: Ubicación del archivo.
+    :type fn: String
+    :return: El hash del contenido del archivo en hexadecimal.
+    :rtype: String
+    """
+    estado = os.stat(fn)
+    firma = (os.path.abspath(fn), estado.st_size, estado.st_mtime_ns)
+    if firma not in _hashes:
+        h = hashlib.blake2b(digest_size=20)
+        with open(fn, 'rb') as f:
+            for parte in iter(lambda: f.read(1 << 20), b''):
+                h.update(parte)
+        _hashes[firma] = h.hexdigest()
+    return _hashes[firma]
+
+
+def guardarArreglos(ruta, arreglos, objetos=None):
+    """
+    Guarda los *arreglos* en el folder *ruta*, cada uno como un archivo ``.npy``, y el resto de los *objetos* en un
+    archivo ``objetos.pkl``.
+
+    :param ruta: Folder donde se guardan los arreglos. Debe existir.
+    :type ruta: String
+    :param arreglos: Diccionario de arreglos de NumPy.
+    :type arreglos: dict
+    :param objetos: Opcional. Otros objetos a guardar.
+    :return: None
+    """
+    for nombre, arreglo in arreglos.items():
+        np.save(os.path.join(ruta, nombre + '.npy'), arreglo, allow_pickle=True)
+    with open(os.path.join(ruta, 'objetos.pkl'), 'wb') as f:
+        pickle.dump((list(arreglos), objetos), f, pickle.HIGHEST_PROTOCOL)
+
+
+def leerArreglos(ruta, mmap=False):
+    """
+    Lee los arreglos y objetos guardados con :func:`~cache.guardarArreglos`.
+
+    :param ruta: Folder donde se guardaron los arreglos.
+    :type ruta: String
+    :param mmap: Opcional. Si es verdadero los arreglos de ancho fijo no se copian a memoria: se mapean de solo
+        lectura, de modo que varios procesos que leen el mismo folder comparten la misma memoria física.
+    :type mmap: bool
+    :return: Tupla (diccionario de arreglos, objetos).
+    :rtype: tuple
+    """
+    with open(os.path.join(ruta, 'objetos.pkl'), 'rb') as f:
+        nombres, objetos = pickle.load(f)
+    arreglos = {}
+    for nombre in nombres:
+        fn = os.path.join(ruta, nombre + '.npy')
+        try:
+            arreglos[nombre] = np.load(fn, mmap_mode='r' if mmap else None)
+        except ValueError:
+            # Los arreglos de objetos de Python no se pueden mapear.
+            arreglos[nombre] = np.load(fn, allow_pickle=True)
+    return arreglos, objetos
+
+
+class CacheEntradas:
+    """
+    Guarda datos procesados en el folder *directorio*, una entrada por llave. Cada entrada es un folder con los
+    arreglos de NumPy guardados como archivos ``.npy`` y el resto de los objetos en un archivo ``objetos.pkl``.
+
+    Las llaves se calculan con :meth:`~cache.CacheEntradas.llave` a partir del contenido de los archivos de entrada,
+    por lo que una entrada deja de usarse en cuanto cambia alguno de sus archivos. Cuando las entradas ocupan más de
+    *max_bytes* se borran las que se usaron hace más tiempo.
+    """
+    def __init__(self, directorio, max_bytes=4 * 1024 ** 3):
+        """
+        :param directorio: Folder donde se guardan las entradas. Se crea si no existe.
+        :type directorio: String
+        :param max_bytes: Opcional. Tamaño máximo que pueden ocupar todas las entradas.
+        :type max_bytes: int
+        """
+        self.directorio = directorio
+        self.maxBytes = max_bytes
+        os.makedirs(directorio, exist_ok=True)
+
+    def getDirectorio(self):
+        """
+        :return: Folder donde se guardan las entradas.
+        :rtype: String
+        """
+        return self.directorio
+
+    def llave(self, tipo, fns, extra=()):
+        """
+        :param tipo: Nombre del tipo de datos (por ejemplo 'pacientes').
+        :type tipo: String
+        :param fns: Ubicación de los archivos de entrada de los que dependen los datos.
+        :type fns: list
+        :param extra: Opcional. Otros valores de los que dependen los datos (por ejemplo los pesos de la
+            configuración).
+        :type extra: tuple
+        :return: Llave de la entrada.
+        :rtype: String
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((VERSION, tipo, [hashArchivo(fn) for fn in fns], tuple(extra))).encode())
+        return tipo + '_' + h.hexdigest()
+
+    def leer(self, llave, mmap=False):
+        """
+        :param llave: Llave de la entrada.
+        :type llave: String
+        :param mmap: Opcional. Si es verdadero los arreglos se mapean en lugar de copiarse (ver
+            :func:`~cache.leerArreglos`).
+        :type mmap: bool
+        :return: Tupla (diccionario de arreglos, objetos) guardada con :meth:`~cache.CacheEntradas.guardar`, o None
+            si la entrada no existe.
+        :rtype: tuple
+        """
+        ruta = os.path.join(self.directorio, llave)
+        try:
+            result = leerArreglos(ruta, mmap)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        os.utime(ruta)
+        return result
+
+    def guardar(self, llave, arreglos, objetos=None):
+        """
+        Guarda una entrada. La entrada se escribe en un folder temporal que se renombra al final, de modo que otro
+        proceso nunca lee una entrada a medias. Si la entrada no se puede guardar (por ejemplo, si el disco está lleno)
+        se muestra una advertencia, salvo que otro proceso ya la haya guardado.
+
+        :param llave: Llave de la entrada.
+        :type llave: String
+        :param arreglos: Diccionario de arreglos de NumPy.
+        :type arreglos: dict
+        :param objetos: Opcional. Otros objetos a guardar.
+        :return: None
+        """
+        temporal = tempfile.mkdtemp(prefix='.' + llave + '_', dir=self.directorio)
+        destino = os.path.join(self.directorio, llave)
+        try:
+            guardarArreglos(temporal, arreglos, objetos)
+            os.rename(temporal, destino)
+        except OSError as e:
+            shutil.rmtree(temporal, ignore_errors=True)
+            # Si otro proceso ya guardó la misma entrada no se pierde nada; si no, la corrida sigue sin la cache.
+            if not os.path.isdir(destino):
+                print("Advertencia: No se pudo guardar la entrada " + llave + " en la cache: " + str(e))
+        self.expulsar()
+
+    def getEntradas(self):
+        """
+        :return: Lista de tuplas (fecha del último uso, tamaño en bytes, ubicación) de las entradas guardadas.
+        :rtype: list
+        """
+        result = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if nombre.startswith('.') or not os.path.isdir(ruta):
+                continue
+            tamano = sum(os.path.getsize(os.path.join(ruta, fn)) for fn in os.listdir(ruta))
+            result.append((os.path.getmtime(ruta), tamano, ruta))
+        return result
+
+    def expulsar(self):
+        """
+        Borra las entradas que se usaron hace más tiempo hasta que todas ocupen a lo más *max_bytes*.
+
+        :return: None
+        """
+        entradas = sorted(self.getEntradas())
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in entradas:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamano
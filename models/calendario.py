@@ -0,0 +1,327 @@
+"""
+=============
+calendario.py
+=============
+
+Clase encargada de llevar la cuenta de cuántas vacunas se aplican cada día en una clínica. Consta de una clase llamada
+:class:`~calendario.CalendarioCapacidad` que guarda el número de vacunas reservadas por día y responde cuál es el
+primer día con capacidad disponible a partir de una fecha, y el método :func:`~calendario.crearCalendarios` que crea
+el calendario de cada clínica, y la clase :class:`~calendario.TurnosSegundasDosis` que reparte los días disponibles
+entre las segundas dosis de los pacientes vacunados.
+Los días se representan como enteros: el número de días desde el 1 de enero de 1970, que es el mismo valor que guarda
+NumPy en datetime64[D]. Así los calendarios no crean ni comparan objetos datetime en los ciclos de asignación; las
+fechas se obtienen de los días solo al escribir las asignaciones (ver :func:`~calendario.numeroDia` y
+:func:`~calendario.fechaDeDia`).
+Esta clase es utilizada por el programa principal :mod:main.py y por :func:`~helper.getAppropriatedate` para obtener
+la fecha de aplicación de cada vacuna.
+"""
+import datetime
+
+import numpy as np
+
+# Día 0 de los calendarios.
+EPOCA = datetime.datetime(1970, 1, 1)
+
+
+def numeroDia(fecha):
+    """
+    :param fecha: Fecha.
+    :type fecha: DateTime
+    :return: El número de días desde :data:`~calendario.EPOCA` hasta el día de *fecha*, sin contar la hora.
+    :rtype: int
+    """
+    return (fecha - EPOCA).days
+
+
+def fechaDeDia(dia):
+    """
+    :param dia: Número de días desde :data:`~calendario.EPOCA`.
+    :type dia: int
+    :return: La fecha del día *dia*, a las 00:00.
+    :rtype: DateTime
+    """
+    return EPOCA + datetime.timedelta(days=dia)
+
+
+def fechasDeDias(dias):
+    """
+    :param dias: Números de días desde :data:`~calendario.EPOCA`.
+    :type dias: list
+    :return: Las fechas de los *dias* como arreglo de datetime64[D].
+    :rtype: numpy.ndarray
+    """
+    return np.asarray(dias, dtype=np.int64).astype('datetime64[D]')
+
+
+def diasDesplazamiento(dias=0, semanas=0):
+    """
+    :param dias: Opcional. Días a sumar.
+    :type dias: float
+    :param semanas: Opcional. Semanas a sumar.
+    :type semanas: float
+    :return: Cuántos días cambia la fecha de un día a las 00:00 al sumarle *dias* y *semanas*: las fracciones de día
+        no cambian la fecha.
+    :rtype: int
+    """
+    return (datetime.timedelta(days=dias) + datetime.timedelta(weeks=semanas)).days
+
+
+class CalendarioCapacidad:
+    """
+    Guarda el número de vacunas reservadas cada día en una clínica. Los días llenos apuntan al día siguiente (como en
+    una estructura union-find) y los caminos se comprimen al buscar, de modo que encontrar el primer día libre a
+    partir de una fecha toma tiempo amortizado casi constante, aunque haya semanas de días llenos.
+
+    Un día que todavía no tiene vacunas reservadas siempre está libre, aunque la capacidad sea 0, igual que en
+    :func:`~helper.getAppropriatedate`. Los días son enteros (ver :func:`~calendario.numeroDia`).
+    """
+    def __init__(self, capacidad):
+        """
+        :param capacidad: Número máximo de vacunas que se aplican por día.
+        :type capacidad: int
+        """
+        self.capacidad = max(capacidad, 1)
+        self.uso = {}
+        self.siguiente = {}
+        self.busquedas = 0
+        self.pasos = 0
+
+    def getCapacidad(self):
+        """
+        :return: Número máximo de vacunas que se aplican por día.
+        :rtype: int
+        """
+        return self.capacidad
+
+    def getBusquedas(self):
+        """
+        :return: Número de veces que se ha buscado el primer día libre (ver
+            :meth:`~calendario.CalendarioCapacidad.primerDiaLibre`).
+        :rtype: int
+        """
+        return self.busquedas
+
+    def getPasos(self):
+        """
+        :return: Número total de días llenos que se han saltado al buscar el primer día libre.
+        :rtype: int
+        """
+        return self.pasos
+
+    def getUso(self, fecha):
+        """
+        :param fecha: Día a consultar.
+        :type fecha: int
+        :return: Número de vacunas reservadas en *fecha*.
+        :rtype: int
+        """
+        return self.uso.get(fecha, 0)
+
+    def getLibres(self, fecha):
+        """
+        :param fecha: Día a consultar.
+        :type fecha: int
+        :return: Número de vacunas que todavía se pueden reservar en *fecha*.
+        :rtype: int
+        """
+        return max(self.capacidad - self.uso.get(fecha, 0), 0)
+
+    def primerDiaLibre(self, fecha):
+        """
+        :param fecha: Día a partir del cual se busca.
+        :type fecha: int
+        :return: El primer día a partir de *fecha* (inclusive) con capacidad disponible.
+        :rtype: int
+        """
+        camino = []
+        while fecha in self.siguiente:
+            camino.append(fecha)
+            fecha = self.siguiente[fecha]
+        for dia in camino:
+            self.siguiente[dia] = fecha
+        self.busquedas += 1
+        self.pasos += len(camino)
+        return fecha
+
+    def reservar(self, fecha, k=1):
+        """
+        Reserva *k* vacunas en el día *fecha*, aunque se exceda su capacidad.
+
+        :param fecha: Día de la reserva.
+        :type fecha: int
+        :param k: Opcional. Número de vacunas a reservar.
+        :type k: int
+        :return: None
+        """
+        self.uso[fecha] = self.uso.get(fecha, 0) + k
+        if self.uso[fecha] >= self.capacidad and fecha not in self.siguiente:
+            self.siguiente[fecha] = fecha + 1
+
+    def reservarBloque(self, fecha, k):
+        """
+        Reserva *k* vacunas en los primeros días libres a partir de *fecha*, llenando cada día antes de pasar al
+        siguiente.
+
+        :param fecha: Día a partir del cual se reserva.
+        :type fecha: int
+        :param k: Número de vacunas a reservar.
+        :type k: int
+        :return: Lista de tuplas (día, número de vacunas reservadas ese día) en orden de fecha.
+        :rtype: list
+        """
+        result = []
+        while k > 0:
+            fecha = self.primerDiaLibre(fecha)
+            n = min(self.getLibres(fecha), k)
+            self.reservar(fecha, n)
+            result.append((fecha, n))
+            k -= n
+        return result
+
+    def reservarPares(self, inicio1, inicio2, k):
+        """
+        Reserva las dos dosis de *k* pacientes, la primera a partir de *inicio1* y la segunda a partir de *inicio2*.
+        El resultado es el mismo que buscar y reservar las dos fechas paciente por paciente, pero se reservan de una
+        vez todos los pacientes que caen en el mismo par de días.
+
+        :param inicio1: Día a partir del cual se reserva la primera dosis.
+        :type inicio1: int
+        :param inicio2: Día a partir del cual se reserva la segunda dosis.
+        :type inicio2: int
+        :param k: Número de pacientes.
+        :type k: int
+        :return: Lista de tuplas (día de la primera dosis, día de la segunda dosis, número de pacientes) en orden.
+        :rtype: list
+        """
+        result = []
+        while k > 0:
+            fecha1 = self.primerDiaLibre(inicio1)
+            fecha2 = self.primerDiaLibre(inicio2)
+            if fecha1 == fecha2:
+                # Cada paciente ocupa dos lugares del mismo día; el último puede exceder la capacidad por uno.
+                n = min((self.getLibres(fecha1) + 1) // 2, k)
+                self.reservar(fecha1, 2 * n)
+            else:
+                n = min(self.getLibres(fecha1), self.getLibres(fecha2), k)
+                self.reservar(fecha1, n)
+                self.reservar(fecha2, n)
+            result.append((fecha1, fecha2, n))
+            k -= n
+        return result
+
+    def getDias(self):
+        """
+        :return: Los días con al menos una vacuna reservada, en orden.
+        :rtype: list
+        """
+        return sorted(self.uso)
+
+    def utilizacion(self, desde=None, hasta=None):
+        """
+        Calcula qué fracción de la capacidad de la clínica se utiliza entre *desde* y *hasta* (inclusive).
+
+        :param desde: Opcional. Primer día a considerar. Si no se da se usa el primer día con reservas.
+        :type desde: int
+        :param hasta: Opcional. Último día a considerar. Si no se da se usa el último día con reservas.
+        :type hasta: int
+        :return: Vacunas reservadas entre la capacidad total de los días del intervalo.
+        :rtype: float
+        """
+        dias = self.getDias()
+        if not dias:
+            return 0.0
+        desde = dias[0] if desde is None else desde
+        hasta = dias[-1] if hasta is None else hasta
+        num_dias = hasta - desde + 1
+        if num_dias <= 0:
+            return 0.0
+        usadas = sum(n for dia, n in self.uso.items() if desde <= dia <= hasta)
+        return usadas / (num_dias * self.capacidad)
+
+
+class TurnosSegundasDosis:
+    """
+    Reserva en los calendarios de las clínicas los días de las segundas dosis de los pacientes vacunados, a partir
+    solo del número de segundas dosis que tocan cada día en cada clínica (ver
+    :meth:`~vacunados.ResumenVacunados.getSegundas`), y después le entrega a cada paciente su día conforme se leen
+    los pacientes en el orden del archivo (ver :meth:`~calendario.TurnosSegundasDosis.asignar`).
+
+    Las segundas dosis de cada clínica se reservan en orden de fecha, a partir de la fecha en la que les toca; las que
+    tocan en la misma clínica y fecha se reservan de una vez (ver
+    :meth:`~calendario.CalendarioCapacidad.reservarBloque`) y se entregan en el orden del archivo. Solo se guardan
+    los días reservados de cada grupo, no un día por paciente.
+    """
+    def __init__(self, segundas, calendarios):
+        """
+        :param segundas: Diccionario con llave (código de la clínica, día) y valor el número de segundas dosis que
+            tocan ese día.
+        :type segundas: dict
+        :param calendarios: Diccionario con llave el código de la clínica y valor su calendario. Se modifica. Las
+            clínicas que no tienen calendario no tienen límite.
+        :type calendarios: dict
+        """
+        llaves = sorted(llave for llave in segundas if llave[0] in calendarios)
+        self.grupos = {llave: i for i, llave in enumerate(llaves)}
+        inicios = []
+        dias = []
+        repeticiones = []
+        total = 0
+        for clinica, fecha in llaves:
+            inicios.append(total)
+            for dia, n in calendarios[clinica].reservarBloque(fecha, segundas[(clinica, fecha)]):
+                dias.append(dia)
+                repeticiones.append(n)
+            total += segundas[(clinica, fecha)]
+        self.inicios = np.array(inicios, dtype=np.int64)
+        self.cursores = np.zeros(len(llaves), dtype=np.int64)
+        self.dias = np.array(dias, dtype=np.int64)
+        self.acumulado = np.cumsum(np.array(repeticiones, dtype=np.int64))
+
+    def asignar(self, clinicas, fechas):
+        """
+        Entrega los días de las segundas dosis a una parte de los pacientes. Las partes deben darse en el orden del
+        archivo.
+
+        :param clinicas: Clínica de cada paciente.
+        :type clinicas: numpy.ndarray
+        :param fechas: Fecha en la que le toca la segunda dosis a cada paciente, como datetime64[D].
+        :type fechas: numpy.ndarray
+        :return: Fecha de la segunda dosis de cada paciente, como datetime64[D].
+        :rtype: numpy.ndarray
+        """
+        result = fechas.copy()
+        grupos = np.array([self.grupos.get(llave, -1) for llave in zip(clinicas.tolist(),
+                                                                        fechas.astype(np.int64).tolist())],
+                          dtype=np.int64)
+        validos = grupos >= 0
+        grupos = grupos[validos]
+        # Lugar de cada paciente entre los de su grupo en esta parte, en el orden del archivo.
+        orden = np.argsort(grupos, kind='stable')
+        ordenados = grupos[orden]
+        cambios = np.flatnonzero(np.diff(ordenados)) + 1
+        inicios_grupo = np.zeros(len(grupos), dtype=np.int64)
+        inicios_grupo[cambios] = cambios
+        rangos = np.empty(len(grupos), dtype=np.int64)
+        rangos[orden] = np.arange(len(grupos)) - np.maximum.accumulate(inicios_grupo)
+        posiciones = self.inicios[grupos] + self.cursores[grupos] + rangos
+        self.cursores += np.bincount(grupos, minlength=len(self.cursores))
+        result[validos] = fechasDeDias(self.dias[np.searchsorted(self.acumulado, posiciones, side='right')])
+        return result
+
+
+def crearCalendarios(lista_de_clinicas, params):
+    """
+    Crea un :class:`~calendario.CalendarioCapacidad` vacío por clínica, con capacidad igual a la capacidad de la
+    clínica por el número de estaciones por dependencia.
+
+    :param lista_de_clinicas: Lista de clínicas.
+    :type lista_de_clinicas: list
+    :param params: ConfigParams
+    :return: Diccionario con llave el código de la clínica y valor su calendario.
+    :rtype: dict
+    """
+    result = {}
+    for clinica in lista_de_clinicas:
+        result[clinica.getCodigo()] = CalendarioCapacidad(params.getNumEstacionesPorDepencencia() *
+                                                          clinica.getCapacidad())
+    return result
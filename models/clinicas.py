@@ -6,12 +6,22 @@ clinicas.py
 Clase encargada de leer y mantener los datos acerca de las clínicas / centros de vacunación. Consta de una clase llamada
 :class:`~clinicas.Clinica` que guarda todos los valores relevantes a las clínicas, y el método
 :func:`~clinicas.readClinicas` que lee los datos del archivo con la información de las clínicas y los graba en una
-instancia de la clase Clinica.
+instancia de la clase Clinica. Las clínicas leidas se devuelven en una :class:`~clinicas.ListaClinicas`, que guarda
+las fases del archivo y la matriz con la cantidad de personas de cada fase que cada clínica debe atender.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores acerca
 de las clinicas.
 
 """
-import pandas as pd
+import re
+
+import numpy as np
+
+from models.tablas import leerColumnas
+
+# Fases de vacunación de una clínica que no se leyó de un archivo.
+FASES = ['n1a', 'n1b', 'n1c', 'n2a', 'n2b', 'n2c', 'n2d', 'n3a', 'n4a', 'n4b', 'n4c', 'n4d']
+
+_FASE = re.compile(r'^n\d+\w*$')
 
 
 class Clinica:
@@ -34,18 +44,7 @@ class Clinica:
         self.lon = -1
         self.capacidad = -1
         self.tiempo = 1
-        self.n1a = -1
-        self.n1b = -1
-        self.n1c = -1
-        self.n2a = -1
-        self.n2b = -1
-        self.n2c = -1
-        self.n2d = -1
-        self.n3a = -1
-        self.n4a = -1
-        self.n4b = -1
-        self.n4c = -1
-        self.n4d = -1
+        self.porFase = dict.fromkeys(FASES, -1)
 
     def setName(self, name):
         """
@@ -145,14 +144,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n1a = n1a
+        self.setMaxPerPhase('n1a', n1a)
 
     def getN1a(self):
         """
         :return: Número de personas de la fase 1a que esta clínica debe atender.
         :rtype: int
         """
-        return self.n1a
+        return self.porFase['n1a']
 
     def setN1b(self, n1b):
         """
@@ -160,14 +159,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n1b = n1b
+        self.setMaxPerPhase('n1b', n1b)
 
     def getN1b(self):
         """
         :return: Número de personas de la fase 1b que esta clínica debe atender.
         :rtype: int
         """
-        return self.n1b
+        return self.porFase['n1b']
 
     def setN1c(self, n1c):
         """
@@ -175,14 +174,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n1c = n1c
+        self.setMaxPerPhase('n1c', n1c)
 
     def getN1c(self):
         """
         :return: Número de personas de la fase 1c que esta clínica debe atender.
         :rtype: int
         """
-        return self.n1c
+        return self.porFase['n1c']
 
     def setN2a(self, n2a):
         """
@@ -190,14 +189,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n2a = n2a
+        self.setMaxPerPhase('n2a', n2a)
 
     def getN2a(self):
         """
         :return: Número de personas de la fase 2a que esta clínica debe atender.
         :rtype: int
         """
-        return self.n2a
+        return self.porFase['n2a']
 
     def setN2b(self, n2b):
         """
@@ -205,14 +204,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n2b = n2b
+        self.setMaxPerPhase('n2b', n2b)
 
     def getN2b(self):
         """
         :return: Número de personas de la fase 2b que esta clínica debe atender.
         :rtype: int
         """
-        return self.n2b
+        return self.porFase['n2b']
 
     def setN2c(self, n2c):
         """
@@ -220,14 +219,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n2c = n2c
+        self.setMaxPerPhase('n2c', n2c)
 
     def getN2c(self):
         """
         :return: Número de personas de la fase 2c que esta clínica debe atender.
         :rtype: int
         """
-        return self.n2c
+        return self.porFase['n2c']
 
     def setN2d(self, n2d):
         """
@@ -235,14 +234,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n2d = n2d
+        self.setMaxPerPhase('n2d', n2d)
 
     def getN2d(self):
         """
         :return: Número de personas de la fase 2d que esta clínica debe atender.
         :rtype: int
         """
-        return self.n2d
+        return self.porFase['n2d']
 
     def setN3a(self, n3a):
         """
@@ -250,14 +249,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n3a = n3a
+        self.setMaxPerPhase('n3a', n3a)
 
     def getN3a(self):
         """
         :return: Número de personas de la fase 3a que esta clínica debe atender.
         :rtype: int
         """
-        return self.n3a
+        return self.porFase['n3a']
 
     def setN4a(self, n4a):
         """
@@ -265,14 +264,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n4a = n4a
+        self.setMaxPerPhase('n4a', n4a)
 
     def getN4a(self):
         """
         :return: Número de personas de la fase 4a que esta clínica debe atender.
         :rtype: int
         """
-        return self.n4a
+        return self.porFase['n4a']
 
     def setN4b(self, n4b):
         """
@@ -280,14 +279,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n4b = n4b
+        self.setMaxPerPhase('n4b', n4b)
 
     def getN4b(self):
         """
         :return: Número de personas de la fase 4b que esta clínica debe atender.
         :rtype: int
         """
-        return self.n4b
+        return self.porFase['n4b']
 
     def setN4c(self, n4c):
         """
@@ -295,14 +294,14 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n4c = n4c
+        self.setMaxPerPhase('n4c', n4c)
 
     def getN4c(self):
         """
         :return: Número de personas de la fase 4c que esta clínica debe atender.
         :rtype: int
         """
-        return self.n4c
+        return self.porFase['n4c']
 
     def setN4d(self, n4d):
         """
@@ -310,16 +309,26 @@ class Clinica:
         :type: int
         :return: None
         """
-        self.n4d = n4d
+        self.setMaxPerPhase('n4d', n4d)
 
     def getN4d(self):
         """
         :return: Número de personas de la fase 4d que esta clínica debe atender.
         :rtype: int
         """
-        return self.n4d
+        return self.porFase['n4d']
+
+    def setMaxPerPhase(self, fase, n):
+        """
+        :param fase: Nombre de la fase de vacunacion.
+        :type fase: String
+        :param n: Cantidad de personas de *fase* que esta clínica debe atender.
+        :type n: int
+        :return: None
+        """
+        self.porFase[fase] = n
 
-    def getMaxPerPhase(self,fase):
+    def getMaxPerPhase(self, fase):
         """
         Recibe el nombre de la fase y devuelve el numero de vacunas a aplicar en dicha fase.
         :param fase: Nombre de la fase de vacunacion
@@ -327,43 +336,77 @@ class Clinica:
         :return: Numero de vacunas a aplicar en *fase*
         :rtype: int
         """
-        if fase == 'n1a':
-            return self.n1a
-        elif fase == 'n1b':
-            return self.n1b
-        elif fase == 'n1c':
-            return self.n1c
-        elif fase == 'n2a':
-            return self.n2a
-        elif fase == 'n2b':
-            return self.n2b
-        elif fase == 'n2c':
-            return self.n2c
-        elif fase == 'n2d':
-            return self.n2d
-        elif fase == 'n3a':
-            return self.n3a
-        elif fase == 'n4a':
-            return self.n4a
-        elif fase == 'n4b':
-            return self.n4b
-        elif fase == 'n4c':
-            return self.n4c
-        elif fase == 'n4d':
-            return self.n4d
-        else:
+        if fase not in self.porFase:
             print("ERROR: " + fase + " no es una fase valida!")
             return -1
+        return self.porFase[fase]
 
     def __str__(self):
-        return self.name + "\t" + self.departamento + "\t" + self.municipio + "\t" + str(self.capacidad) + "\t" + \
-               str(self.tiempo) + "\t" + str(self.n1a) + "\t" + str(self.n1b) + "\t" + str(self.n1c) + "\t" + \
-               str(self.n2a) + "\t" + str(self.n2b) + "\t" + str(self.n2c) + "\t" + str(self.n2d) + "\t" + \
-               str(self.n3a) + "\t" + str(self.n4a) + "\t" + str(self.n4b) + "\t" + str(self.n4c) + "\t" + \
-               str(self.n4d)
+        return "\t".join([self.name, self.departamento, self.municipio, str(self.capacidad), str(self.tiempo)] +
+                         [str(n) for n in self.porFase.values()])
 
 
-def readClinicas(fn, verbose=False, debug=False):
+class ListaClinicas(list):
+    """
+    Lista de clínicas devuelta por :func:`~clinicas.readClinicas`, que además guarda:
+    * Las fases de vacunación, en el orden en el que se asignan.
+    * Una matriz de enteros con una fila por clínica (en el orden de la lista) y una columna por fase, con la
+      cantidad de personas de cada fase que cada clínica debe atender.
+    """
+    def __init__(self, clinicas=(), fases=FASES, capacidades=None):
+        """
+        :param clinicas: Opcional. Clínicas de la lista.
+        :type clinicas: list
+        :param fases: Opcional. Nombres de las fases.
+        :type fases: list
+        :param capacidades: Opcional. Matriz de clínicas por fases. Si no se da se calcula con
+            :meth:`~clinicas.Clinica.getMaxPerPhase`.
+        :type capacidades: numpy.ndarray
+        """
+        super().__init__(clinicas)
+        self.fases = list(fases)
+        self.indiceFases = {fase: i for i, fase in enumerate(self.fases)}
+        if capacidades is None:
+            capacidades = np.array([[c.getMaxPerPhase(fase) for fase in self.fases] for c in self],
+                                   dtype=np.int64).reshape(len(self), len(self.fases))
+        self.capacidades = capacidades
+
+    def getFases(self):
+        """
+        :return: Nombres de las fases, en el orden en el que se asignan.
+        :rtype: list
+        """
+        return self.fases
+
+    def getCapacidades(self):
+        """
+        :return: Matriz de clínicas por fases con la cantidad de personas de cada fase que cada clínica debe atender.
+        :rtype: numpy.ndarray
+        """
+        return self.capacidades
+
+    def getCapacidadesFase(self, fase):
+        """
+        :param fase: Nombre de la fase.
+        :type fase: String
+        :return: Cantidad de personas de *fase* que cada clínica debe atender, en el orden de la lista.
+        :rtype: numpy.ndarray
+        """
+        return self.capacidades[:, self.indiceFases[fase]]
+
+
+def leerFases(columnas):
+    """
+    :param columnas: Nombres de las columnas del archivo de clínicas.
+    :type columnas: list
+    :return: Nombres de las columnas que son fases (n seguido del número de la fase y opcionalmente de la subfase, por
+        ejemplo n1a o n5), en el orden del archivo.
+    :rtype: list
+    """
+    return [c for c in columnas if _FASE.match(str(c))]
+
+
+def readClinicas(fn, verbose=False, debug=False, cache=None):
     """
     Lee la información de las clínicas disponible en el archivo *fn* y la guarda en un objeto
     tipo :class:`~clinicas.Clinica`.
@@ -374,54 +417,48 @@ def readClinicas(fn, verbose=False, debug=False):
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
-    :return: Lista de Clinicas con las variables leidas del archivo.
-    :rtype: list
+    :param cache: Opcional. Si se da, los datos se leen de la cache cuando el archivo no ha cambiado.
+    :type cache: CacheEntradas
+    :return: Lista de Clinicas con las variables leidas del archivo. Las fases son las columnas del archivo que empiezan
+        con n seguida del número de la fase (ver :func:`~clinicas.leerFases`), en el orden del archivo.
+    :rtype: ListaClinicas
     """
-    df = pd.read_csv(fn, encoding="latin")
+    if cache is not None:
+        llave = cache.llave('clinicas', [fn])
+        entrada = cache.leer(llave)
+        if entrada is not None:
+            if verbose:
+                print('Leidas ' + str(len(entrada[1])) + ' dependencias de la cache...')
+            return entrada[1]
+    tabla = leerColumnas(fn)
+    filas = [dict(zip(tabla, fila)) for fila in zip(*tabla.values())]
+    fases = leerFases(tabla)
+    capacidades = np.array([tabla[fase] for fase in fases], dtype=np.int64).reshape(len(fases), len(filas)).T
     result = []
     i = 0
-    for row in df.iterrows():
+    for row in filas:
         i += 1
         if debug:
             print(row)
         c = Clinica()
-        c.setCapacidad(int(row[1]['vaccCap']))
-        c.setName(row[1]['dependencia'])
-        c.setTiempo(row[1]['tiempo'])
-
-        lat = float(row[1]['latitud'])
-        lon = float(row[1]['longitud'])
-        c.setCodigo(row[1]['codigo'])
-        c.setDepartamento(row[1]['departamento'])
-        c.setMunicipio(row[1]['municipio'])
+        c.setCapacidad(int(row['vaccCap']))
+        c.setName(row['dependencia'])
+        c.setTiempo(row['tiempo'])
+
+        lat = float(row['latitud'])
+        lon = float(row['longitud'])
+        c.setCodigo(row['codigo'])
+        c.setDepartamento(row['departamento'])
+        c.setMunicipio(row['municipio'])
         c.setLat(lat)
         c.setLon(lon)
-        if row[1]['n1a'] != 'NaN':
-            c.setN1a(int(row[1]['n1a']))
-        if row[1]['n1b'] != 'NaN':
-            c.setN1b(int(row[1]['n1b']))
-        if row[1]['n1c'] != 'NaN':
-            c.setN1c(int(row[1]['n1c']))
-        if row[1]['n2a'] != 'NaN':
-            c.setN2a(int(row[1]['n2a']))
-        if row[1]['n2b'] != 'NaN':
-            c.setN2b(int(row[1]['n2b']))
-        if row[1]['n2c'] != 'NaN':
-            c.setN2c(int(row[1]['n2c']))
-        if row[1]['n2d'] != 'NaN':
-            c.setN2d(int(row[1]['n2d']))
-        if row[1]['n3a'] != 'NaN':
-            c.setN3a(int(row[1]['n3a']))
-        if row[1]['n4a'] != 'NaN':
-            c.setN4a(int(row[1]['n4a']))
-        if row[1]['n4b'] != 'NaN':
-            c.setN4b(int(row[1]['n4b']))
-        if row[1]['n4c'] != 'NaN':
-            c.setN4c(int(row[1]['n4c']))
-        if row[1]['n4d'] != 'NaN':
-            c.setN4d(int(row[1]['n4d']))
+        for fase, n in zip(fases, capacidades[i - 1].tolist()):
+            c.setMaxPerPhase(fase, n)
 
         result.append(c)
     if verbose:
         print('Leidas ' + str(i) + ' dependencias...')
+    result = ListaClinicas(result, fases, capacidades)
+    if cache is not None:
+        cache.guardar(llave, {}, result)
     return result
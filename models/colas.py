@@ -0,0 +1,285 @@
+"""
+========
+colas.py
+========
+
+Clase encargada de mantener el orden en el que se vacuna a los pacientes de cada unidad de vacunación. Consta de una
+clase llamada :class:`~colas.ColaPacientes` que recorre con un cursor el arreglo de pacientes de una unidad ordenado
+por prioridad, la clase :class:`~colas.ColaPorFase` que además atiende primero a los pacientes de las primeras fases,
+la clase :class:`~colas.ColaSeleccion` que solo ordena a los primeros pacientes de la unidad, y los métodos
+:func:`~colas.crearColas`, :func:`~colas.crearColasPorFase`, :func:`~colas.crearColasSeleccion` y
+:func:`~colas.getCursores` que crean las colas de todas las unidades y guardan la posición de sus cursores.
+Esta clase es utilizada por el programa principal :mod:main.py para obtener el siguiente paciente a vacunar en cada
+clínica.
+"""
+import numpy as np
+
+
+class ColaPacientes:
+    """
+    Cola de los pacientes de una unidad de vacunación en orden de prioridad. Los pacientes no se quitan del arreglo,
+    solo se avanza un cursor, por lo que sacar pacientes de la cola es O(1) y una cola se puede volver a crear en una
+    posición guardada con :meth:`~colas.ColaPacientes.getCursor` sin volver a sacar a los pacientes.
+    """
+    def __init__(self, codigos, indices, cursor=0):
+        """
+        :param codigos: Arreglo con el código de cada paciente.
+        :type codigos: numpy.ndarray
+        :param indices: Indices en *codigos* de los pacientes de la unidad ordenados por prioridad.
+        :type indices: numpy.ndarray
+        :param cursor: Opcional. Posición en *indices* del siguiente paciente de la cola.
+        :type cursor: int
+        """
+        self.codigos = codigos
+        self.indices = indices
+        self.cursor = cursor
+
+    def __len__(self):
+        return len(self.indices) - self.cursor
+
+    def peek(self):
+        """
+        :return: El código del siguiente paciente de la cola, sin sacarlo de la cola.
+        """
+        if self.cursor >= len(self.indices):
+            raise IndexError("peek from empty ColaPacientes")
+        return self.codigos[self.indices[self.cursor]]
+
+    def pop(self):
+        """
+        :return: El código del siguiente paciente de la cola, sacándolo de la cola.
+        """
+        codigo = self.peek()
+        self.cursor += 1
+        return codigo
+
+    def take(self, k):
+        """
+        Saca de la cola a los siguientes *k* pacientes, o a todos los que quedan si son menos de *k*.
+
+        :param k: Número de pacientes a sacar.
+        :type k: int
+        :return: Los códigos de los pacientes sacados, en orden de prioridad.
+        :rtype: numpy.ndarray
+        """
+        indices = self.indices[self.cursor:self.cursor + k]
+        self.cursor += len(indices)
+        return self.codigos[indices]
+
+    def getCursor(self):
+        """
+        :return: La posición del siguiente paciente de la cola.
+        :rtype: int
+        """
+        return self.cursor
+
+
+class ColaPorFase(ColaPacientes):
+    """
+    Cola de los pacientes de una unidad de vacunación en orden de (fase, prioridad, llegada): primero todos los
+    pacientes de la primera fase en orden de prioridad, luego los de la segunda, etc. Los pacientes con la misma
+    prioridad se atienden en el orden en que aparecen en el archivo de pacientes.
+
+    Los indices de la unidad ya vienen ordenados por prioridad y llegada, por lo que basta con ordenarlos de forma
+    estable por fase al crear la cola; después funciona igual que :class:`~colas.ColaPacientes`.
+    """
+    def __init__(self, codigos, indices, rangos, cursor=0):
+        """
+        :param codigos: Arreglo con el código de cada paciente.
+        :type codigos: numpy.ndarray
+        :param indices: Indices en *codigos* de los pacientes de la unidad ordenados por prioridad.
+        :type indices: numpy.ndarray
+        :param rangos: Arreglo con el número de la fase (empezando en 0) de cada paciente de *indices*, en el mismo
+            orden. Entre menor sea el número antes se atiende al paciente.
+        :type rangos: numpy.ndarray
+        :param cursor: Opcional. Número de pacientes que ya se sacaron de la cola.
+        :type cursor: int
+        """
+        super().__init__(codigos, indices[np.argsort(rangos, kind='stable')], cursor)
+
+
+def seleccionarPrimeros(prioridades, k):
+    """
+    Separa a los *k* pacientes con mayor prioridad (menor número) sin ordenar a todos: los selecciona con
+    ``numpy.partition`` en O(n) y solo ordena a esos *k*. Los pacientes con la misma prioridad van en el orden en el
+    que aparecen en *prioridades*, igual que con un ordenamiento estable.
+
+    :param prioridades: Prioridad de cada paciente, en el orden del archivo.
+    :type prioridades: numpy.ndarray
+    :param k: Número de pacientes a ordenar.
+    :type k: int
+    :return: Arreglo con las posiciones en *prioridades* de los *k* primeros pacientes en orden, y arreglo con las
+        posiciones del resto sin ordenar.
+    :rtype: tuple
+    """
+    posiciones = np.arange(len(prioridades))
+    if k >= len(prioridades):
+        return posiciones[np.lexsort((posiciones, prioridades))], posiciones[:0]
+    if k <= 0:
+        return posiciones[:0], posiciones
+    limite = np.partition(prioridades, k - 1)[k - 1]
+    if np.isnan(limite):
+        menores, iguales = ~np.isnan(prioridades), np.isnan(prioridades)
+    else:
+        menores, iguales = prioridades < limite, prioridades == limite
+    # De los pacientes con la prioridad límite se toman los que aparecen primero.
+    primeros = np.flatnonzero(menores | (iguales & (np.cumsum(iguales) <= k - np.count_nonzero(menores))))
+    resto = np.ones(len(prioridades), dtype=bool)
+    resto[primeros] = False
+    return primeros[np.argsort(prioridades[primeros], kind='stable')], np.flatnonzero(resto)
+
+
+class ColaSeleccion:
+    """
+    Cola de los pacientes de una unidad de vacunación en orden de prioridad que solo ordena a los pacientes que se
+    van a sacar. Al crearla se ordena a los primeros *k* pacientes (ver :func:`~colas.seleccionarPrimeros`), donde *k*
+    es el número de pacientes que se espera asignar en la unidad; el resto se ordena solo si se llega a sacar más de
+    *k* pacientes (por ejemplo por los excluidos). Saca a los pacientes en el mismo orden que
+    :class:`~colas.ColaPacientes` con los indices ordenados por prioridad, y tiene los mismos métodos.
+    """
+    def __init__(self, codigos, indices, prioridades, k, cursor=0):
+        """
+        :param codigos: Arreglo con el código de cada paciente.
+        :type codigos: numpy.ndarray
+        :param indices: Indices en *codigos* de los pacientes de la unidad, en el orden del archivo.
+        :type indices: numpy.ndarray
+        :param prioridades: Prioridad de cada paciente de *indices*, en el mismo orden.
+        :type prioridades: numpy.ndarray
+        :param k: Número de pacientes que se ordenan al crear la cola.
+        :type k: int
+        :param cursor: Opcional. Posición del siguiente paciente de la cola.
+        :type cursor: int
+        """
+        self.codigos = codigos
+        self.indices = indices
+        self.prioridades = prioridades
+        self.ordenados, self.resto = seleccionarPrimeros(prioridades, k)
+        self.cursor = cursor
+
+    def __len__(self):
+        return len(self.indices) - self.cursor
+
+    def _ordenarHasta(self, n):
+        """
+        Ordena al resto de los pacientes si los primeros *n* no están ordenados todavía.
+
+        :return: None
+        """
+        if n > len(self.ordenados) and len(self.resto) > 0:
+            # Todos los del resto van después de los ordenados, porque se seleccionaron los de mayor prioridad.
+            resto = self.resto[np.argsort(self.prioridades[self.resto], kind='stable')]
+            self.ordenados = np.concatenate([self.ordenados, resto])
+            self.resto = self.resto[:0]
+
+    def peek(self):
+        """
+        :return: El código del siguiente paciente de la cola, sin sacarlo de la cola.
+        """
+        if self.cursor >= len(self.indices):
+            raise IndexError("peek from empty ColaSeleccion")
+        self._ordenarHasta(self.cursor + 1)
+        return self.codigos[self.indices[self.ordenados[self.cursor]]]
+
+    def pop(self):
+        """
+        :return: El código del siguiente paciente de la cola, sacándolo de la cola.
+        """
+        codigo = self.peek()
+        self.cursor += 1
+        return codigo
+
+    def take(self, k):
+        """
+        Saca de la cola a los siguientes *k* pacientes, o a todos los que quedan si son menos de *k*.
+
+        :param k: Número de pacientes a sacar.
+        :type k: int
+        :return: Los códigos de los pacientes sacados, en orden de prioridad.
+        :rtype: numpy.ndarray
+        """
+        self._ordenarHasta(self.cursor + k)
+        posiciones = self.ordenados[self.cursor:self.cursor + k]
+        self.cursor += len(posiciones)
+        return self.codigos[self.indices[posiciones]]
+
+    def getCursor(self):
+        """
+        :return: La posición del siguiente paciente de la cola.
+        :rtype: int
+        """
+        return self.cursor
+
+
+def crearColas(codigos, indices_por_unidad):
+    """
+    Crea una :class:`~colas.ColaPacientes` por unidad de vacunación.
+
+    :param codigos: Arreglo con el código de cada paciente.
+    :type codigos: numpy.ndarray
+    :param indices_por_unidad: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus
+        pacientes ordenados por prioridad.
+    :type indices_por_unidad: dict
+    :return: Diccionario con llave el código de la unidad y valor su cola de pacientes.
+    :rtype: dict
+    """
+    result = {}
+    for unidad, indices in indices_por_unidad.items():
+        result[unidad] = ColaPacientes(codigos, indices)
+    return result
+
+
+def getCursores(colas):
+    """
+    :param colas: Diccionario de colas devuelto por :func:`~colas.crearColas`.
+    :type colas: dict
+    :return: Diccionario con llave el código de la unidad y valor la posición del cursor de su cola.
+    :rtype: dict
+    """
+    result = {}
+    for unidad, cola in colas.items():
+        result[unidad] = cola.getCursor()
+    return result
+
+
+def crearColasPorFase(codigos, indices_por_unidad, rangos):
+    """
+    Crea una :class:`~colas.ColaPorFase` por unidad de vacunación.
+
+    :param codigos: Arreglo con el código de cada paciente.
+    :type codigos: numpy.ndarray
+    :param indices_por_unidad: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus
+        pacientes ordenados por prioridad.
+    :type indices_por_unidad: dict
+    :param rangos: Arreglo con el número de la fase de cada paciente de *codigos* (ver
+        :meth:`~pacientes.TablaPacientes.getRangosFase`).
+    :type rangos: numpy.ndarray
+    :return: Diccionario con llave el código de la unidad y valor su cola de pacientes.
+    :rtype: dict
+    """
+    result = {}
+    for unidad, indices in indices_por_unidad.items():
+        result[unidad] = ColaPorFase(codigos, indices, rangos[indices])
+    return result
+
+
+def crearColasSeleccion(codigos, indices_por_unidad, prioridades, tomas):
+    """
+    Crea una :class:`~colas.ColaSeleccion` por unidad de vacunación.
+
+    :param codigos: Arreglo con el código de cada paciente.
+    :type codigos: numpy.ndarray
+    :param indices_por_unidad: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus
+        pacientes en el orden del archivo (ver :meth:`~pacientes.TablaPacientes.getGruposPorUnidad`).
+    :type indices_por_unidad: dict
+    :param prioridades: Arreglo con la prioridad de cada paciente de *codigos*.
+    :type prioridades: numpy.ndarray
+    :param tomas: Diccionario con llave el código de la unidad y valor el número de pacientes que se espera asignar
+        en ella. Las unidades que no están en *tomas* no ordenan a ningún paciente hasta que se sacan.
+    :type tomas: dict
+    :return: Diccionario con llave el código de la unidad y valor su cola de pacientes.
+    :rtype: dict
+    """
+    result = {}
+    for unidad, indices in indices_por_unidad.items():
+        result[unidad] = ColaSeleccion(codigos, indices, prioridades[indices], tomas.get(unidad, 0))
+    return result
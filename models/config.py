@@ -8,6 +8,11 @@ Clase encargada de leer y mantener los datos de configuración del programa. Con
 :func:`~config.readConfig` que lee el archivo ``config.txt`` y obtiene los valores que se granab en ConfigParams.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores de
 ``config.txt``. """
+import copy
+
+# Nombres de los pesos de prioridad de config.txt, en el orden del archivo.
+PESOS = ('pesoEdad', 'pesoHabita', 'pesoTrabaja', 'pesoCargo', 'pesoCovid', 'pesoDiabetes', 'pesoPeso', 'pesoCancer',
+         'pesoVih', 'pesoRenal')
 
 
 class ConfigParams:
@@ -63,7 +68,8 @@ class ConfigParams:
         :type archivo_vacunas: String
         :param archivo_clinicas: Nombre del archivo con datos de las clinicas
         :type archivo_clinicas: String
-        :param archivo_excluidos: Nombre del archivo con datos de los pacientes a excluir
+        :param archivo_excluidos: Nombre del archivo con datos de los pacientes a excluir, o varios nombres separados
+            por comas.
         :type archivo_excluidos: String
         :param archivo_vacunados: Nombre del archivo con datos de los pacientes vacunados
         :type archivo_vacunados: String
@@ -184,6 +190,30 @@ class ConfigParams:
         """
         return self.pesoRenal
 
+    def getPesos(self):
+        """
+        :return: Diccionario con llave el nombre de cada peso de prioridad (ver :data:`~config.PESOS`) y valor su peso.
+        :rtype: dict
+        """
+        return {nombre: getattr(self, nombre) for nombre in PESOS}
+
+    def conPesos(self, pesos):
+        """
+        :param pesos: Diccionario con llave el nombre de un peso de prioridad (ver :data:`~config.PESOS`) y valor su
+            nuevo peso.
+        :type pesos: dict
+        :return: Una copia de esta configuración con los *pesos* cambiados.
+        :rtype: ConfigParams
+        :raises ValueError: Si algún nombre no es un peso de prioridad.
+        """
+        desconocidos = [nombre for nombre in pesos if nombre not in PESOS]
+        if desconocidos:
+            raise ValueError("Pesos desconocidos: " + ", ".join(desconocidos) + ". Los pesos son " + ", ".join(PESOS))
+        result = copy.copy(self)
+        for nombre, peso in pesos.items():
+            setattr(result, nombre, peso)
+        return result
+
     def getPathToFiles(self):
         """
         :return: path relativo a los archivos de entrada
@@ -254,6 +284,13 @@ class ConfigParams:
         """
         return self.archivo_excluidos
 
+    def getFilesExcluidos(self):
+        """
+        :return: nombres de los archivos de excluidos. Se pueden dar varios separados por comas en ``config.txt``.
+        :rtype: list
+        """
+        return self.archivo_excluidos.split(',')
+
     def getFileVacunados(self):
         """
         :return: nombre del archivo de vacunados
@@ -0,0 +1,186 @@
+"""
+=========
+estado.py
+=========
+
+Clase encargada de guardar el estado de un plan de vacunación para poder replanificarlo sin volver a calcularlo todo.
+Consta de una clase llamada :class:`~estado.EstadoPlan` que guarda los lugares de primera dosis del plan, el paciente
+asignado a cada uno y el estado de las colas de pacientes, y los métodos :func:`~estado.leerEstado` y
+:func:`~estado.guardarEstado` que leen y guardan el estado en un folder, y :func:`~estado.huellaCola` que resume el
+contenido de una cola de pacientes.
+Esta clase es utilizada por el programa principal :mod:main.py cuando se corre con el parámetro -i.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from models.asignaciones import BloqueAsignaciones
+from models.cache import guardarArreglos, leerArreglos
+
+
+def huellaCola(codigos):
+    """
+    :param codigos: Códigos de los pacientes de una unidad en orden de prioridad.
+    :type codigos: numpy.ndarray
+    :return: Hash de los códigos y de su orden, que cambia si se agregan, quitan o reordenan pacientes.
+    :rtype: String
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(codigos.dtype).encode())
+    h.update(np.ascontiguousarray(codigos).tobytes())
+    return h.hexdigest()
+
+
+class EstadoPlan:
+    """
+    Guarda el estado de un plan de vacunación:
+    * Firma de los datos de los que dependen los lugares del plan (clínicas, lotes, vacunas y configuración).
+    * Los lugares de primera dosis, en el orden en que se asignaron: clínica, vacuna, orden y fechas de ambas dosis.
+    * Código del paciente asignado a cada lugar.
+    * Huella (ver :func:`~estado.huellaCola`) y posición del cursor de la cola de pacientes de cada unidad.
+    * Códigos de los pacientes excluidos.
+
+    Las fechas y el orden de cada lugar solo dependen de cuántas vacunas toma cada clínica de cada lote y de los
+    calendarios de las clínicas, no de qué pacientes las reciben, por lo que no cambian al cambiar los pacientes. Por
+    eso los calendarios y los lotes no se guardan: lo que se guarda de ellos son las fechas de los lugares.
+    """
+    def __init__(self, firma, dependencias, vacunas, ordenes, fechas1, fechas2, ids, huellas, cursores, excluidos):
+        self.firma = firma
+        self.dependencias = dependencias
+        self.vacunas = vacunas
+        self.ordenes = ordenes
+        self.fechas1 = fechas1
+        self.fechas2 = fechas2
+        self.ids = ids
+        self.huellas = huellas
+        self.cursores = cursores
+        self.excluidos = excluidos
+
+    def __len__(self):
+        return len(self.ids)
+
+    def getFirma(self):
+        """
+        :return: Firma de los datos de los que dependen los lugares del plan.
+        :rtype: String
+        """
+        return self.firma
+
+    def getHuellas(self):
+        """
+        :return: Diccionario con llave el código de la unidad y valor la huella de su cola de pacientes.
+        :rtype: dict
+        """
+        return self.huellas
+
+    def getCursores(self):
+        """
+        :return: Diccionario con llave el código de la unidad y valor la posición en su cola del primer paciente que
+            no fue asignado.
+        :rtype: dict
+        """
+        return self.cursores
+
+    def getExcluidos(self):
+        """
+        :return: Códigos de los pacientes excluidos.
+        :rtype: set
+        """
+        return self.excluidos
+
+    def getLugares(self, dependencia):
+        """
+        :param dependencia: Código de la clínica.
+        :return: Indices de los lugares de la clínica, en el orden en que se asignaron.
+        :rtype: numpy.ndarray
+        """
+        return np.flatnonzero(self.dependencias == dependencia)
+
+    def bloque(self, lugares=None):
+        """
+        :param lugares: Opcional. Indices de los lugares a incluir. Si no se da se incluyen todos.
+        :type lugares: numpy.ndarray
+        :return: Las asignaciones de ambas dosis de los *lugares*.
+        :rtype: BloqueAsignaciones
+        """
+        if lugares is None:
+            lugares = np.arange(len(self))
+        n = len(lugares)
+        ids = self.ids[lugares]
+        dependencias = self.dependencias[lugares]
+        vacunas = self.vacunas[lugares]
+        ordenes = self.ordenes[lugares]
+        return BloqueAsignaciones(np.concatenate([ids, ids]), np.concatenate([vacunas, vacunas]),
+                                  np.repeat(np.array([1, 2], dtype=np.int8), n),
+                                  np.concatenate([dependencias, dependencias]), np.concatenate([ordenes, ordenes]),
+                                  np.concatenate([self.fechas1[lugares], self.fechas2[lugares]]))
+
+    @staticmethod
+    def desdeBloques(firma, bloques, huellas, cursores, excluidos):
+        """
+        :param bloques: Bloques de asignaciones en el orden en que se asignaron, cada uno con las asignaciones de la
+            primera dosis seguidas de las de la segunda dosis (ver :func:`main.asignarBloque`).
+        :type bloques: list
+        :return: El estado con los lugares de los *bloques*.
+        :rtype: EstadoPlan
+        """
+        bloques = [b for b in bloques if len(b) > 0]
+        primeras = [slice(0, len(b) // 2) for b in bloques]
+        segundas = [slice(len(b) // 2, len(b)) for b in bloques]
+        if not bloques:
+            vacio = BloqueAsignaciones.desdeLista([])
+            return EstadoPlan(firma, vacio.dependencias, vacio.vacunas, vacio.ordenes, vacio.fechas, vacio.fechas,
+                              vacio.ids, huellas, cursores, excluidos)
+        return EstadoPlan(firma, np.concatenate([b.dependencias[s] for b, s in zip(bloques, primeras)]),
+                          np.concatenate([b.vacunas[s] for b, s in zip(bloques, primeras)]),
+                          np.concatenate([b.ordenes[s] for b, s in zip(bloques, primeras)]),
+                          np.concatenate([b.fechas[s] for b, s in zip(bloques, primeras)]),
+                          np.concatenate([b.fechas[s] for b, s in zip(bloques, segundas)]),
+                          np.concatenate([b.ids[s] for b, s in zip(bloques, primeras)]),
+                          huellas, cursores, excluidos)
+
+
+# Arreglos de EstadoPlan que se guardan como archivos .npy.
+ARREGLOS = ('dependencias', 'vacunas', 'ordenes', 'fechas1', 'fechas2', 'ids')
+
+
+def leerEstado(directorio):
+    """
+    :param directorio: Folder donde se guardó el estado con :func:`~estado.guardarEstado`.
+    :type directorio: String
+    :return: El estado guardado, o None si no hay un estado guardado en *directorio*.
+    :rtype: EstadoPlan
+    """
+    if not os.path.isfile(os.path.join(directorio, 'objetos.pkl')):
+        return None
+    arreglos, objetos = leerArreglos(directorio)
+    return EstadoPlan(objetos['firma'], *[arreglos[nombre] for nombre in ARREGLOS], objetos['huellas'],
+                      objetos['cursores'], objetos['excluidos'])
+
+
+def guardarEstado(estado, directorio):
+    """
+    Guarda *estado* en el folder *directorio*, reemplazando el estado anterior. El estado se escribe primero en un
+    folder temporal, de modo que si el programa se interrumpe el estado anterior no se pierde.
+
+    :param estado: Estado del plan.
+    :type estado: EstadoPlan
+    :param directorio: Folder donde se guarda el estado.
+    :type directorio: String
+    :return: None
+    """
+    directorio = os.path.normpath(directorio)
+    temporal = tempfile.mkdtemp(prefix=os.path.basename(directorio) + '_', dir=os.path.dirname(directorio) or '.')
+    guardarArreglos(temporal, {nombre: getattr(estado, nombre) for nombre in ARREGLOS},
+                    {'firma': estado.firma, 'huellas': estado.huellas, 'cursores': estado.cursores,
+                     'excluidos': estado.excluidos})
+    anterior = None
+    if os.path.exists(directorio):
+        anterior = temporal + '_anterior'
+        os.rename(directorio, anterior)
+    os.rename(temporal, directorio)
+    if anterior is not None:
+        shutil.rmtree(anterior, ignore_errors=True)
@@ -4,63 +4,159 @@ excluidos.py
 ===========
 
 Clase encargada de leer y mantener los datos acerca de los pacientes que no serán vacunados por cualquier razón.
-Contiene la clase :class:`~excluidos.Excluido` que guarda todos los valores relevantes a los pacientes, y el método
-:func:`~excluidos.readExcluidos` que lee los datos del archivo con la información de los pacientes y los graba en una
-instancia de la clase Excluido.
+Contiene la clase :class:`~excluidos.IndiceExclusion` que guarda los códigos de los pacientes a excluir para buscarlos
+rápido, y el método :func:`~excluidos.readIndiceExclusion` que lee los códigos de los archivos de excluidos y los
+agrega a un índice.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores acerca
 de los pacientes a excluir.
 """
-import pandas as pd
+import os
 
+import numpy as np
 
-class Excluido:
+from models.tablas import TAMANO_ARCHIVO_PEQUENO, leerColumnas, arreglo
+
+
+class IndiceExclusion:
     """
-    Guarda la información de los pacientes a excluir de la vacuna:
-    * codigo
-    * razón de la exclusión
+    Índice de los códigos de los pacientes a excluir de la vacuna, para revisar si un paciente está excluido sin
+    recorrer toda la lista de excluidos:
+    * Mientras hay pocos códigos se guardan en un conjunto (búsqueda O(1)).
+    * Si el número de códigos supera *umbral* se guardan en un arreglo ordenado (búsqueda binaria), que ocupa mucha
+      menos memoria que el conjunto.
+
+    Se pueden agregar códigos de varios archivos; cada vez que se agregan se combinan con los que ya estaban.
     """
-    def __init__(self, codigo, razon):
-        self.codigo = codigo
-        self.razon = razon
+    def __init__(self, codigos=(), umbral=5000000):
+        self.umbral = umbral
+        self.conjunto = set()
+        self.ordenados = None
+        self.agregar(codigos)
+
+    def __len__(self):
+        if self.ordenados is not None:
+            return len(self.ordenados)
+        return len(self.conjunto)
+
+    def __contains__(self, codigo):
+        return self.contiene(codigo)
+
+    def agregar(self, codigos):
+        """
+        Agrega los códigos *codigos* al índice.
+
+        :param codigos: Códigos de los pacientes a excluir.
+        :type codigos: iterable
+        :return: None
+        """
+        if self.ordenados is not None:
+            self.ordenados = np.union1d(self.ordenados, np.asarray(list(codigos)))
+            return
+        self.conjunto.update(codigos)
+        if len(self.conjunto) > self.umbral:
+            ordenados = np.array(list(self.conjunto))
+            if ordenados.dtype != object:
+                ordenados.sort()
+                self.ordenados = ordenados
+                self.conjunto = set()
+
+    def contiene(self, codigo):
+        """
+        :param codigo: Código del paciente a revisar.
+        :return: Verdadero si el paciente se encuentra en el índice.
+        :rtype: bool
+        """
+        if self.ordenados is None:
+            return codigo in self.conjunto
+        i = np.searchsorted(self.ordenados, codigo)
+        return i < len(self.ordenados) and self.ordenados[i] == codigo
+
+    def getCodigos(self):
+        """
+        :return: Los códigos de todos los pacientes a excluir.
+        :rtype: numpy.ndarray
+        """
+        if self.ordenados is not None:
+            return self.ordenados
+        return np.array(list(self.conjunto), dtype=object)
 
-    def getCodigo(self):
+    def mascara(self, codigos):
         """
-        :return: El código de identificación del paciente a excluir
-        :rtype: String
+        :param codigos: Arreglo de códigos de pacientes.
+        :type codigos: numpy.ndarray
+        :return: Arreglo que es verdadero en la posición de cada paciente excluido.
+        :rtype: numpy.ndarray
         """
-        return self.codigo
+        if len(self) == 0:
+            return np.zeros(len(codigos), dtype=bool)
+        if self.ordenados is not None:
+            return np.isin(codigos, self.ordenados)
+        import pandas as pd
+        return pd.Series(codigos).isin(self.conjunto).to_numpy()
 
-    def getRazon(self):
+    def filtrar(self, codigos, indices):
         """
-        :return: La razón para excluir al paciente
-        :rtype: String
+        Quita de *indices* a todos los pacientes excluidos, conservando el orden de los demás.
+
+        :param codigos: Arreglo con el código de cada paciente.
+        :type codigos: numpy.ndarray
+        :param indices: Indices en *codigos* de los pacientes a filtrar.
+        :type indices: numpy.ndarray
+        :return: Los indices de los pacientes que no están excluidos.
+        :rtype: numpy.ndarray
         """
-        return self.razon
+        if len(self) == 0:
+            return indices
+        return indices[~self.mascara(codigos[indices])]
+
+
+def _leerCodigos(fn):
+    """
+    :return: La columna ``codigo`` del archivo *fn*. Los archivos pequeños se leen sin pandas (ver
+        :mod:`~tablas`).
+    :rtype: numpy.ndarray
+    """
+    if os.path.getsize(fn) <= TAMANO_ARCHIVO_PEQUENO:
+        return arreglo(leerColumnas(fn, ['codigo'])['codigo'])
+    import pandas as pd
+    return pd.read_csv(fn, encoding="latin", usecols=['codigo'])['codigo'].to_numpy()
 
 
-def readExcluidos(fn, verbose = False, debug = False):
+def readIndiceExclusion(fns, verbose=False, debug=False, indice=None, cache=None):
     """
-    Lee la información de los pacientes a excluir del archivo *fn* y la guarda en un objeto
-    tipo :class:`~excluidos.Excluido`.
+    Lee los códigos de los pacientes a excluir de uno o varios archivos y los agrega a un
+    :class:`~excluidos.IndiceExclusion`. Solo se lee la columna ``codigo`` de cada archivo.
 
-    :param fn: Ubicación del archivo con la información de los pacientes a excluir.
-    :type fn: String
+    :param fns: Ubicación de los archivos con la información de los pacientes a excluir.
+    :type fns: list
     :param verbose: Opcional. Si es verdadero muestra información adicional al correrse.
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
-    :return: Lista de Pacientes a excluir con las variables leidas del archivo.
-    :rtype: list
+    :param indice: Opcional. Índice al que se agregan los códigos leidos. Si no se da se crea uno nuevo.
+    :type indice: IndiceExclusion
+    :param cache: Opcional. Si se da, los códigos de cada archivo se leen de la cache cuando el archivo no ha
+        cambiado.
+    :type cache: CacheEntradas
+    :return: Índice con los códigos de todos los pacientes a excluir.
+    :rtype: IndiceExclusion
     """
-    df = pd.read_csv(fn, encoding="latin")
-    result = []
-    i = 0
-    for row in df.iterrows():
-        i += 1
+    if indice is None:
+        indice = IndiceExclusion()
+    for fn in fns:
+        codigos = None
+        if cache is not None:
+            llave = cache.llave('excluidos', [fn])
+            entrada = cache.leer(llave)
+            if entrada is not None:
+                codigos = entrada[0]['codigo']
+        if codigos is None:
+            codigos = _leerCodigos(fn)
+            if cache is not None:
+                cache.guardar(llave, {'codigo': codigos})
         if debug:
-            print(row)
-        e = Excluido(row[1]['codigo'], row[1]['razon'])
-        result.append(e)
-    if verbose:
-        print('Leidos ' + str(i) + ' pacientes a excluir...')
-    return result
+            print(codigos)
+        indice.agregar(codigos.tolist())
+        if verbose:
+            print('Leidos ' + str(len(codigos)) + ' pacientes a excluir de ' + fn + '...')
+    return indice
@@ -0,0 +1,162 @@
+"""
+==============
+existencias.py
+==============
+
+Clase encargada de llevar la cuenta de las vacunas disponibles durante la asignación. Consta de una clase llamada
+:class:`~existencias.Existencias` que guarda las aplicaciones que le quedan a cada lote y a cada marca de vacuna, y las
+vacunas que faltan por asignar en cada clínica en la fase actual. Cada reserva actualiza todos los totales en O(1), por
+lo que saber si ya se terminó una fase o cuánto le queda a un lote no requiere recorrer las clínicas.
+Las existencias se crean una vez por asignación y se pasan de una fase a la siguiente, de modo que cada fase empieza
+con lo que sobró de cada lote en las fases anteriores.
+Esta clase es utilizada por el programa principal :mod:main.py.
+"""
+
+
+class Existencias:
+    """
+    Libro de las vacunas disponibles de una asignación. Guarda:
+    * Las aplicaciones que le quedan a cada lote, en el orden de la lista de lotes.
+    * Las aplicaciones que le quedan a cada marca, la suma de las de sus lotes.
+    * Las vacunas que faltan por asignar en cada clínica en la fase actual, y su suma.
+    * Los eventos de agotamiento: cuándo un lote deja de poder usarse y cuándo ya no queda ningún lote usable de una
+      marca.
+
+    Igual que en los ciclos de asignación, en una ronda cada clínica con vacunas pendientes toma un paciente aunque el
+    lote se acabe a media ronda, por lo que las aplicaciones de un lote pueden quedar negativas; en ese caso el lote
+    pasa a la siguiente fase sin aplicaciones.
+    """
+    def __init__(self, lotes):
+        """
+        :param lotes: Lista de lotes con sus aplicaciones ya calculadas (ver :func:`main.prepararLotes`).
+        :type lotes: list
+        """
+        self.lotes = lotes
+        self.restantesLote = [lote.getRondas() for lote in lotes]
+        self.restantesMarca = {}
+        self.lotesUsablesMarca = {}
+        for lote, n in zip(lotes, self.restantesLote):
+            self.restantesMarca[lote.getMarca()] = self.restantesMarca.get(lote.getMarca(), 0) + max(n, 0)
+            self.lotesUsablesMarca[lote.getMarca()] = self.lotesUsablesMarca.get(lote.getMarca(), 0) + (n > 1)
+        self.restantesClinica = {}
+        self.pendientes = 0
+        self.fase = None
+        self.eventos = []
+
+    def iniciarFase(self, fase, restantes):
+        """
+        Empieza una fase. Los lotes conservan las aplicaciones que les sobraron de las fases anteriores.
+
+        :param fase: Nombre de la fase.
+        :type fase: String
+        :param restantes: Diccionario con llave el código de la clínica y valor el número de vacunas de la fase que
+            le tocan. Se modifica con cada reserva.
+        :type restantes: dict
+        :return: None
+        """
+        self.fase = fase
+        for i, n in enumerate(self.restantesLote):
+            self.restantesLote[i] = max(n, 0)
+        self.restantesClinica = restantes
+        self.pendientes = sum(restantes.values())
+
+    def reservar(self, i, clinica, n=1):
+        """
+        Reserva *n* aplicaciones del lote *i* para la clínica *clinica*.
+
+        :param i: Posición del lote en la lista de lotes.
+        :type i: int
+        :param clinica: Código de la clínica.
+        :type clinica: String
+        :param n: Opcional. Número de aplicaciones.
+        :type n: int
+        :return: None
+        """
+        self.restantesClinica[clinica] -= n
+        self.pendientes -= n
+        self._descontarLote(i, n)
+
+    def reservarTomas(self, i, clinicas, tomas):
+        """
+        Reserva del lote *i* las aplicaciones que toma cada clínica.
+
+        :param i: Posición del lote en la lista de lotes.
+        :type i: int
+        :param clinicas: Clínicas en el orden de *tomas*.
+        :type clinicas: ListaClinicas
+        :param tomas: Número de aplicaciones que toma cada clínica (ver :func:`main.calcularTomas`).
+        :type tomas: numpy.ndarray
+        :return: None
+        """
+        total = 0
+        for clinica, k in zip(clinicas, tomas.tolist()):
+            if k != 0:
+                self.restantesClinica[clinica.getCodigo()] -= k
+                total += k
+        self.pendientes -= total
+        self._descontarLote(i, total)
+
+    def _descontarLote(self, i, n):
+        antes = self.restantesLote[i]
+        despues = antes - n
+        self.restantesLote[i] = despues
+        marca = self.lotes[i].getMarca()
+        self.restantesMarca[marca] -= max(antes, 0) - max(despues, 0)
+        # Los ciclos de asignación solo usan un lote mientras le quede más de una aplicación, y una marca se agota
+        # cuando ya no le queda ningún lote que se pueda usar.
+        if antes > 1 >= despues:
+            self.eventos.append({'evento': 'lote_agotado', 'lote': self.lotes[i].getId(), 'fase': self.fase})
+            self.lotesUsablesMarca[marca] -= 1
+            if self.lotesUsablesMarca[marca] == 0:
+                self.eventos.append({'evento': 'marca_agotada', 'marca': marca, 'fase': self.fase})
+
+    def isTerminado(self):
+        """
+        :return: True si ya no faltan vacunas por asignar en ninguna clínica en la fase actual.
+        :rtype: bool
+        """
+        return self.pendientes <= 0
+
+    def getRestantesLote(self, i):
+        """
+        :param i: Posición del lote en la lista de lotes.
+        :type i: int
+        :return: Aplicaciones que le quedan al lote. Puede ser negativo si se acabó a media ronda en la fase actual.
+        :rtype: int
+        """
+        return self.restantesLote[i]
+
+    def getRestantesMarca(self, marca):
+        """
+        :param marca: Código de la vacuna.
+        :type marca: int
+        :return: Aplicaciones que le quedan a todos los lotes de la marca.
+        :rtype: int
+        """
+        return self.restantesMarca.get(marca, 0)
+
+    def getRestantesClinica(self, clinica):
+        """
+        :param clinica: Código de la clínica.
+        :type clinica: String
+        :return: Vacunas que faltan por asignar en la clínica en la fase actual.
+        :rtype: int
+        """
+        return self.restantesClinica.get(clinica, 0)
+
+    def getPendientes(self):
+        """
+        :return: Vacunas que faltan por asignar en todas las clínicas en la fase actual.
+        :rtype: int
+        """
+        return self.pendientes
+
+    def getEventos(self, fase=None):
+        """
+        :param fase: Opcional. Si se da, solo se devuelven los eventos de esa fase.
+        :type fase: String
+        :return: Lista de los eventos de agotamiento en el orden en que ocurrieron. Cada evento es un diccionario con
+            el campo "evento" ("lote_agotado" o "marca_agotada"), el lote o la marca, y la fase.
+        :rtype: list
+        """
+        return [e for e in self.eventos if fase is None or e['fase'] == fase]
@@ -11,7 +11,9 @@ Esta clase es utilizada por el programa principal :mod:main.py únicamente al in
 de los lotes de vacunas.
 """
 import datetime
-import pandas as pd
+
+from models.calendario import numeroDia
+from models.tablas import leerFilas
 
 
 class Lote:
@@ -44,6 +46,13 @@ class Lote:
         """
         self.ingreso = ing
 
+    def getId(self):
+        """
+        :return: El codigo de identificación del lote
+        :rtype: String
+        """
+        return self.id
+
     def getFecha(self):
         """
         :return: La fecha de recepción del lote
@@ -51,6 +60,13 @@ class Lote:
         """
         return self.ingreso
 
+    def getDia(self):
+        """
+        :return: El día de recepción del lote (ver :func:`~calendario.numeroDia`)
+        :rtype: int
+        """
+        return numeroDia(self.ingreso)
+
     def setMarca(self, marca):
         """
         :param marca: La marca de la vacuna
@@ -97,7 +113,7 @@ class Lote:
         return self.rondas
 
 
-def readLotes(fn, verbose=False, debug=False):
+def readLotes(fn, verbose=False, debug=False, cache=None):
     """
     Lee la información de los lotes disponible en el archivo *fn* y la guarda en un objeto tipo :class:`~lotes.Lote`.
 
@@ -107,22 +123,32 @@ def readLotes(fn, verbose=False, debug=False):
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
+    :param cache: Opcional. Si se da, los datos se leen de la cache cuando el archivo no ha cambiado.
+    :type cache: CacheEntradas
     :return: Lista de Lotes con las variables leidas del archivo.
     :rtype: list
     """
-    df = pd.read_csv(fn, encoding="latin")
+    if cache is not None:
+        llave = cache.llave('lotes', [fn])
+        entrada = cache.leer(llave)
+        if entrada is not None:
+            if verbose:
+                print('Leidos ' + str(len(entrada[1])) + ' lotes de la cache...')
+            return entrada[1]
     result = []
     i = 0
-    for row in df.iterrows():
+    for row in leerFilas(fn):
         i += 1
         if debug:
-            print(row[1]['id_marca'])
+            print(row['id_marca'])
         lote = Lote()
-        lote.setId(row[1]['id_lote'])
-        lote.setMarca(row[1]['id_marca'])
-        lote.setIngreso(datetime.datetime.strptime(row[1]['fecha_ingreso'], "%d/%m/%Y"))
-        lote.setNum(int(row[1]['num_vacunas']))
+        lote.setId(row['id_lote'])
+        lote.setMarca(row['id_marca'])
+        lote.setIngreso(datetime.datetime.strptime(row['fecha_ingreso'], "%d/%m/%Y"))
+        lote.setNum(int(row['num_vacunas']))
         result.append(lote)
     if verbose:
         print('Leidos ' + str(i) + ' lotes...')
+    if cache is not None:
+        cache.guardar(llave, {}, result)
     return result
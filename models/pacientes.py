@@ -4,157 +4,639 @@ pacientes.py
 ============
 
 Clase encargada de leer y mantener los datos acerca de los pacientes. Consta de una clase llamada
-:class:`~pacientes.Paciente` que guarda todos los valores relevantes a los pacientes, y el método
+:class:`~pacientes.TablaPacientes` que guarda a todos los pacientes como columnas, la clase
+:class:`~pacientes.VistaPaciente` que da acceso a los datos de un paciente de la tabla, y el método
 :func:`~pacientes.readPacientes` que lee los datos del archivo con la información de los pacientes y los graba en una
-instancia de la clase Paciente.
+TablaPacientes.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores acerca
-de las pacientes.
+de las pacientes. pandas se importa solo cuando se lee ``pacientes.csv``, para no hacer más lento el inicio de las
+corridas que no lo leen (ver :mod:`~tablas`).
 """
-import pandas as pd
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from models.cache import guardarArreglos, hashArchivo, leerArreglos
+from models.perfil import PERFIL
 from helper import readPriorityEdad, readPriorityUnidades, readPriorityMunicipios, readPriorityCargos
 
 
-class Paciente:
-    """
-    Guarda la información de un paciente:
-    * Codigo del paciente.
-    * NIT del paciente.
-    * Nombre del paciente.
-    * Sexo del Paciente.
-    * Número de afiliado.
-    * Fecha de Nacimiento.
-    * Edad del paciente.
-    * Renglon de contratación del paciente si disponible.
-    * Cargo del paciente.
-    * Número de empleado del paciente si disponible.
-    * Departamento donde el paciente habita.
-    * Municipio donde el paciente habita.
-    * Zona donde el paciente habita.
-    * Dirección donde el paciente habita.
-    * Nombre de la dependencia donde trabaja.
-    * Departamento de la dependencia donde trabaja.
-    * Municipio de la dependencia donde trabaja.
-    * Código de la unidad de vacunación.
-    * Fase a la que el paciente pertenece.
-    * Subfase a la que el paciente pertenece.
-    * Si el paciente ha tenido COVID-19.
-    * Si el paciente tiene diabetes miellitus.
-    * Si el paciente tiene sobrepeso.
-    * Si el paciente ha tenido cancer.
-    * Si el paciente es VIH Positivo.
-    * Si el paciente tiene enfermedad renal.
-    * La prioridad respecto a su edad.
-    * La prioridad respecto a su cargo.
-    * La prioridad respecto al lugar donde habita.
-    * La prioridad respecto al lugar donde trabaja.
-    """
-    def __init__(self, codigo, nit, nombre, sexo, numafiliado, fdn,
-                 edad, renglon, cargo, numempleado,
-                 deptohabita, munihabita, zonahabita, direccion,
-                 nombredependencia, deptodependencia, munidependencia,
-                 codigounidadadscripcion, fase, subfase, covid,
-                 diabetes, sobrepeso, cancer, vih, renal, priorityedad, prioritycargo,
-                 priorityhabita, prioritydependencia, params):
-        self.codigo = codigo
-        self.nit = nit
-        self.nombre = nombre
-        self.sexo = sexo
-        self.numAfiliado = numafiliado
-        self.fdn = fdn
-        self.edad = edad
-        self.renglon = renglon
-        self.cargo = cargo
-        self.numEmpleado = numempleado
-        self.deptoHabita = deptohabita
-        self.muniHabita = munihabita
-        self.zonaHabita = zonahabita
-        self.direccion = direccion
-        self.nombreDependencia = nombredependencia
-        self.deptoDependencia = deptodependencia
-        self.muniDependencia = munidependencia
-        self.codigoUnidadAdscripcion = codigounidadadscripcion
-        self.fase = fase
-        self.subfase = subfase
-        if params.getPesoCovid() > 0 and covid != -1:
-            self.covid = covid / params.getPesoCovid()
-        else:
-            self.covid = 2
-        if params.getPesoDiabetes() > 0 and diabetes != -1:
-            self.diabetes = diabetes / params.getPesoDiabetes()
-        else:
-            self.diabetes = 2
-        if params.getPesoPeso() > 0 and sobrepeso != -1:
-            self.sobrepeso = sobrepeso / params.getPesoPeso()
-        else:
-            self.sobrepeso = 2
-        if params.getPesoCancer() > 0 and cancer != -1:
-            self.cancer = cancer / params.getPesoCancer()
-        else:
-            self.cancer = 2
-        if params.getPesoVih() > 0 and vih != -1:
-            self.vih = vih / params.getPesoVih()
-        else:
-            self.vih = 2
-        if params.getPesoRenal() > 0 and renal != -1:
-            self.renal = renal / params.getPesoRenal()
-        else:
-            self.renal = 2
-        if params.getPesoEdad() > 0 and priorityedad != -1:
-            self.priorityEdad = priorityedad / params.getPesoEdad()
-        else:
-            self.priorityEdad = 10
-        if params.getPesoCargo() > 0 and prioritycargo != -1:
-            self.priorityCargo = prioritycargo / params.getPesoCargo()
-        else:
-            self.priorityCargo = 10
-        if params.getPesoHabita() > 0 and priorityhabita != -1:
-            self.priorityHabita = priorityhabita / params.getPesoHabita()
-        else:
-            self.priorityHabita = 10
-        if params.getPesoTrabaja() > 0 and prioritydependencia != -1:
-            self.priorityDependencia = prioritydependencia / params.getPesoTrabaja()
-        else:
-            self.priorityDependencia = 10
-        self.priority = 0
-        if self.priorityEdad > 0:
-            self.priority += self.priorityEdad
-        if self.priorityCargo > 0:
-            self.priority += self.priorityEdad
-        if self.priorityHabita > 0:
-            self.priority += self.priorityEdad
-        if self.priorityDependencia > 0:
-            self.priority += self.priorityEdad
-        if self.covid > 0:
-            self.priority += self.priorityEdad
-        if self.diabetes > 0:
-            self.priority += self.priorityEdad
-        if self.sobrepeso > 0:
-            self.priority += self.priorityEdad
-        if self.cancer > 0:
-            self.priority += self.priorityEdad
+def buscarPrioridades(df, priorityEdades, priorityCargos, priorityUnidades, priorityMunicipios, debug=False):
+    """
+    Busca las prioridades por edad, cargo, municipio y unidad de todos los pacientes de *df* por columnas, en lugar de
+    hacerlo paciente por paciente. Los pacientes que no se encuentran en alguna tabla reciben la prioridad por defecto.
+
+    :param df: Tabla de pacientes leida de ``pacientes.csv``.
+    :type df: DataFrame
+    :param priorityEdades: Prioridades por década de edad (ver :func:`~helper.readPriorityEdad`).
+    :type priorityEdades: dict
+    :param priorityCargos: Prioridades por cargo (ver :func:`~helper.readPriorityCargos`).
+    :type priorityCargos: dict
+    :param priorityUnidades: Prioridades por unidad (ver :func:`~helper.readPriorityUnidades`).
+    :type priorityUnidades: dict
+    :param priorityMunicipios: Prioridades por municipio (ver :func:`~helper.readPriorityMunicipios`).
+    :type priorityMunicipios: dict
+    :param debug: Opcional. Si es verdadero muestra los pacientes sin prioridad valida.
+    :type debug: Boolean
+    :return: Arreglos con la prioridad por edad, cargo, lugar donde habita y unidad de cada paciente, sin ponderar.
+    :rtype: tuple
+    """
+    edad = df['edad'].astype(np.int64)
+    priority_edad = (edad - edad % 10).map(priorityEdades)
+    priority_cargo = df['cargo'].map(priorityCargos)
+    priority_habita = (df['departamento'].astype(str) + ", " + df['municipio'].astype(str)).map(priorityMunicipios)
+    priority_dependencia = df['nombreUnidadAdscripcion'].map(priorityUnidades)
+
+    if debug:
+        for codigo in df['codigo'][priority_edad.isna()]:
+            print("Advertencia: El paciente " + str(codigo) + " no tiene una edad valida.")
+        for codigo in df['codigo'][priority_cargo.isna()]:
+            print("Advertencia: El paciente " + str(codigo) + " no tiene un cargo valido.")
+        for codigo in df['codigo'][priority_habita.isna()]:
+            print("Advertencia: Paciente " + str(codigo) + " no tiene un departamento y municipio valido.")
+        for codigo in df['codigo'][priority_dependencia.isna()]:
+            print("Advertencia: El paciente " + str(codigo) + " no tiene una unidad valida")
+
+    return (priority_edad.fillna(5).to_numpy(), priority_cargo.fillna(4).to_numpy(),
+            priority_habita.fillna(2).to_numpy(), priority_dependencia.fillna(5).to_numpy())
+
+
+def calcularPrioridades(df, params, prioridades):
+    """
+    Pondera las prioridades de todos los pacientes de *df* y calcula la prioridad combinada como operaciones sobre
+    columnas. Agrega a *df* las columnas ``priorityEdad``, ``priorityCargo``, ``priorityHabita``,
+    ``priorityDependencia`` y ``priority`` (ver :func:`~pacientes.ponderarPrioridades`).
+
+    :param df: Tabla de pacientes leida de ``pacientes.csv``.
+    :type df: DataFrame
+    :param params: Parametros de la configuracion
+    :type params: ConfigParams
+    :param prioridades: Prioridades sin ponderar devueltas por :func:`~pacientes.buscarPrioridades`.
+    :type prioridades: tuple
+    :return: La misma tabla *df* con las columnas de prioridad agregadas.
+    :rtype: DataFrame
+    """
+    ponderadas = ponderarPrioridades(prioridades, buscarCondiciones(df), params)
+    df['priorityEdad'], df['priorityCargo'], df['priorityHabita'], df['priorityDependencia'] = ponderadas[:4]
+    df['priority'] = ponderadas[4]
+    return df
+
+
+def buscarCondiciones(df):
+    """
+    :param df: Tabla de pacientes leida de ``pacientes.csv``.
+    :type df: DataFrame
+    :return: Arreglos con 1 si el paciente tuvo COVID-19, es diabético, tiene sobrepeso o ha tenido cancer, y 0 si
+        no.
+    :rtype: tuple
+    """
+    return tuple((df[columna] == "Si").to_numpy(np.int64) for columna in ('tuvoCovid', 'diabetico', 'sobrepeso',
+                                                                          'cancer'))
+
+
+def ponderarPrioridades(prioridades, condiciones, params):
+    """
+    Pondera las prioridades y condiciones de los pacientes con los pesos de *params* y calcula la prioridad combinada:
+    cada prioridad y condición se divide entre su peso (ver :func:`~pacientes._ponderar`), y la prioridad combinada
+    suma la prioridad por edad ponderada una vez por cada una de ellas que sea positiva. Solo usa arreglos, por lo que
+    se puede volver a calcular con otros pesos sin volver a leer ``pacientes.csv``.
+
+    :param prioridades: Prioridades sin ponderar devueltas por :func:`~pacientes.buscarPrioridades`.
+    :type prioridades: tuple
+    :param condiciones: Condiciones devueltas por :func:`~pacientes.buscarCondiciones`.
+    :type condiciones: tuple
+    :param params: Parametros de la configuracion
+    :type params: ConfigParams
+    :return: Arreglos con la prioridad ponderada por edad, cargo, lugar donde habita y unidad, y la prioridad
+        combinada de cada paciente.
+    :rtype: tuple
+    """
+    priority_edad, priority_cargo, priority_habita, priority_dependencia = prioridades
+    priority_edad = _ponderar(priority_edad, params.getPesoEdad(), 10)
+    priority_cargo = _ponderar(priority_cargo, params.getPesoCargo(), 10)
+    priority_habita = _ponderar(priority_habita, params.getPesoHabita(), 10)
+    priority_dependencia = _ponderar(priority_dependencia, params.getPesoTrabaja(), 10)
+    tuvo_covid, diabetico, con_sobrepeso, tuvo_cancer = condiciones
+    covid = _ponderar(tuvo_covid, params.getPesoCovid(), 2)
+    diabetes = _ponderar(diabetico, params.getPesoDiabetes(), 2)
+    sobrepeso = _ponderar(con_sobrepeso, params.getPesoPeso(), 2)
+    cancer = _ponderar(tuvo_cancer, params.getPesoCancer(), 2)
+
+    # Se suma componente por componente, siempre en el mismo orden, para obtener los mismos valores de punto flotante.
+    priority = np.zeros(len(priority_edad))
+    for componente in (priority_edad, priority_cargo, priority_habita, priority_dependencia, covid, diabetes,
+                       sobrepeso, cancer):
+        priority += np.where(componente > 0, priority_edad, 0)
+    return priority_edad, priority_cargo, priority_habita, priority_dependencia, priority
+
+
+def _ponderar(valores, peso, defecto):
+    """
+    Divide los *valores* de una prioridad entre su *peso*, o devuelve *defecto* si el peso no es positivo. Los valores
+    -1 (sin prioridad) también se cambian por *defecto*.
+    """
+    if peso > 0:
+        return np.where(valores != -1, valores / peso, defecto)
+    return np.full(len(valores), defecto, dtype=np.float64)
+
+
+def ordenarPorUnidad(codigos_unidad, num_unidades, priority):
+    """
+    Ordena a los pacientes de cada unidad de vacunación por prioridad. El ordenamiento es estable, de modo que los
+    pacientes con la misma prioridad conservan el orden en el que aparecen en el archivo.
+
+    :param codigos_unidad: Indice de la unidad de vacunación de cada paciente (-1 si no tiene unidad).
+    :type codigos_unidad: numpy.ndarray
+    :param num_unidades: Número de unidades de vacunación distintas.
+    :type num_unidades: int
+    :param priority: Prioridad de cada paciente.
+    :type priority: numpy.ndarray
+    :return: Arreglo con los indices de los pacientes ordenados por unidad y prioridad, y arreglo con los limites de
+        cada unidad dentro del primero (los pacientes de la unidad *k* están en ``orden[limites[k]:limites[k + 1]]``).
+    :rtype: tuple
+    """
+    orden = np.lexsort((priority, codigos_unidad))
+    limites = np.searchsorted(codigos_unidad[orden], np.arange(num_unidades + 1))
+    return orden, limites
+
+
+def agruparPorUnidad(codigos_unidad, num_unidades):
+    """
+    Agrupa a los pacientes por unidad de vacunación sin ordenarlos por prioridad: los pacientes de cada unidad quedan
+    en el orden en el que aparecen en el archivo. Con menos de 32767 unidades el agrupamiento es O(n), porque NumPy
+    ordena los enteros de 16 bits con radix sort.
+
+    :param codigos_unidad: Indice de la unidad de vacunación de cada paciente (-1 si no tiene unidad).
+    :type codigos_unidad: numpy.ndarray
+    :param num_unidades: Número de unidades de vacunación distintas.
+    :type num_unidades: int
+    :return: Arreglo con los indices de los pacientes agrupados por unidad, y arreglo con los limites de cada unidad
+        dentro del primero (ver :func:`~pacientes.ordenarPorUnidad`).
+    :rtype: tuple
+    """
+    llaves = codigos_unidad.astype(np.int16) if num_unidades < np.iinfo(np.int16).max else codigos_unidad
+    orden = np.argsort(llaves, kind='stable')
+    limites = np.searchsorted(codigos_unidad[orden], np.arange(num_unidades + 1))
+    return orden, limites
+
+
+class TablaPacientes:
+    """
+    Guarda la información de todos los pacientes en arreglos contiguos, una columna por campo, en lugar de un objeto
+    por paciente:
+    * Código de cada paciente.
+    * Unidad de vacunación, fase y subfase de cada paciente, codificadas como indices a sus valores distintos.
+    * Prioridad de cada paciente.
+    * Indices de los pacientes de cada unidad ordenados por prioridad.
+
+    Si la tabla se crea con *ordenar* falso, los pacientes solo se agrupan por unidad (ver
+    :func:`~pacientes.agruparPorUnidad`) y se ordenan por prioridad la primera vez que se pide el orden (ver
+    :meth:`~pacientes.TablaPacientes.ordenar`).
+
+    El resto de columnas (nombre, NIT, dirección, etc.) no se cargan en memoria hasta que se piden con
+    :meth:`~pacientes.TablaPacientes.getColumna`.
+    """
+    def __init__(self, fn, codigos, unidades, nombres_unidad, fases, nombres_fase, subfases, nombres_subfase,
+                 priority, orden=None, limites=None, ordenar=True):
+        self.fn = fn
+        self.codigos = codigos
+        self.unidades = unidades
+        self.nombresUnidad = nombres_unidad
+        self.fases = fases
+        self.nombresFase = nombres_fase
+        self.subfases = subfases
+        self.nombresSubfase = nombres_subfase
+        self.priority = priority
+        self.ordenado = orden is not None or ordenar
+        if orden is None:
+            if ordenar:
+                orden, limites = ordenarPorUnidad(unidades, len(nombres_unidad), priority)
+            else:
+                orden, limites = agruparPorUnidad(unidades, len(nombres_unidad))
+        self.orden = orden
+        self.limites = limites
+        self.columnas = {}
+
+    # Arreglos que se guardan en la cache (ver getArreglos y desdeArreglos).
+    ARREGLOS = ('codigos', 'unidades', 'fases', 'subfases', 'priority', 'orden', 'limites')
+
+    # Columnas guardadas como indices a sus valores distintos.
+    CATEGORICAS = {'nombreUnidadAdscripcion': lambda t: (t.unidades, t.nombresUnidad),
+                   'Fase': lambda t: (t.fases, t.nombresFase),
+                   'SubFase': lambda t: (t.subfases, t.nombresSubfase)}
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def getArreglos(self):
+        """
+        :return: Diccionario con los arreglos de la tabla, y tupla con los nombres de las unidades, fases y subfases.
+        :rtype: tuple
+        """
+        self.ordenar()
+        arreglos = {nombre: getattr(self, nombre) for nombre in TablaPacientes.ARREGLOS}
+        return arreglos, (self.nombresUnidad, self.nombresFase, self.nombresSubfase)
+
+    @staticmethod
+    def desdeDataFrame(fn, df, ordenar=True):
+        """
+        :param fn: Ubicación de ``pacientes.csv``, de donde se leen las demás columnas.
+        :type fn: String
+        :param df: Tabla con las columnas de asignación de ``pacientes.csv`` y la prioridad ya calculada (ver
+            :func:`~pacientes.calcularPrioridades`).
+        :type df: DataFrame
+        :param ordenar: Opcional. Si es falso los pacientes solo se agrupan por unidad.
+        :type ordenar: Boolean
+        :return: La tabla con los datos de *df*.
+        :rtype: TablaPacientes
+        """
+        codigos = df['codigo'].to_numpy()
+        if codigos.dtype == object:
+            codigos = codigos.astype(str)
+        unidades, nombres_unidad = _codificar(df['nombreUnidadAdscripcion'])
+        fases, nombres_fase = _codificar(df['Fase'])
+        subfases, nombres_subfase = _codificar(df['SubFase'])
+        return TablaPacientes(fn, codigos, unidades, nombres_unidad, fases, nombres_fase, subfases, nombres_subfase,
+                              df['priority'].to_numpy(), ordenar=ordenar)
+
+    @staticmethod
+    def desdeArreglos(fn, arreglos, nombres):
+        """
+        :param fn: Ubicación de ``pacientes.csv``, de donde se leen las demás columnas.
+        :type fn: String
+        :param arreglos: Diccionario de arreglos devuelto por :meth:`~pacientes.TablaPacientes.getArreglos`.
+        :type arreglos: dict
+        :param nombres: Nombres de las unidades, fases y subfases devueltos por
+            :meth:`~pacientes.TablaPacientes.getArreglos`.
+        :type nombres: tuple
+        :return: La tabla con esos arreglos, sin volver a ordenar a los pacientes.
+        :rtype: TablaPacientes
+        """
+        nombres_unidad, nombres_fase, nombres_subfase = nombres
+        return TablaPacientes(fn, arreglos['codigos'], arreglos['unidades'], nombres_unidad, arreglos['fases'],
+                              nombres_fase, arreglos['subfases'], nombres_subfase, arreglos['priority'],
+                              arreglos['orden'], arreglos['limites'])
+
+    def getCodigos(self):
+        """
+        :return: El código de identificación de cada paciente.
+        :rtype: numpy.ndarray
+        """
+        return self.codigos
+
+    def getPrioridades(self):
+        """
+        :return: La prioridad de cada paciente (entre menor sea el numero mayor prioridad).
+        :rtype: numpy.ndarray
+        """
+        return self.priority
+
+    def isOrdenado(self):
+        """
+        :return: True si los pacientes de cada unidad ya están ordenados por prioridad.
+        :rtype: bool
+        """
+        return self.ordenado
+
+    def ordenar(self):
+        """
+        Ordena a los pacientes de cada unidad por prioridad, si no se ordenaron al crear la tabla.
+
+        :return: None
+        """
+        if not self.ordenado:
+            self.orden, self.limites = ordenarPorUnidad(self.unidades, len(self.nombresUnidad), self.priority)
+            self.ordenado = True
+
+    def getIndicesPorUnidad(self):
+        """
+        :return: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus pacientes ordenados
+            por prioridad. Los arreglos son vistas sobre el mismo arreglo de orden, no copias.
+        :rtype: dict
+        """
+        self.ordenar()
+        return self.getGruposPorUnidad()
+
+    def getGruposPorUnidad(self):
+        """
+        :return: Diccionario con llave el código de la unidad y valor el arreglo de indices de sus pacientes, sin
+            ordenarlos: en orden de prioridad si la tabla ya está ordenada (ver
+            :meth:`~pacientes.TablaPacientes.isOrdenado`) y si no en el orden del archivo.
+        :rtype: dict
+        """
+        result = {}
+        for k, unidad in enumerate(self.nombresUnidad):
+            result[unidad] = self.orden[self.limites[k]:self.limites[k + 1]]
+        return result
+
+    def getRangosFase(self, fases):
+        """
+        :param fases: Nombres de las fases en el orden en que se asignan (ver :meth:`~clinicas.ListaClinicas.getFases`).
+        :type fases: list
+        :return: El número de la fase de cada paciente en *fases*. La fase del paciente es n seguida de su Fase y
+            SubFase (por ejemplo n1a), o solo de su Fase si esa no está en *fases*; si tampoco está, el número es
+            ``len(fases)``, es decir, después de todas las fases.
+        :rtype: numpy.ndarray
+        """
+        rango = {fase: i for i, fase in enumerate(fases)}
+
+        def nombre(valor):
+            # Con pacientes sin Fase pandas lee la columna como números reales (1.0 en lugar de 1).
+            return str(int(valor)) if isinstance(valor, float) and valor.is_integer() else str(valor)
+
+        por_fase = [rango.get('n' + nombre(f), len(fases)) for f in self.nombresFase]
+        tabla = np.full((len(self.nombresFase) + 1, len(self.nombresSubfase) + 1), len(fases), dtype=np.int32)
+        for i, f in enumerate(self.nombresFase):
+            tabla[i, :] = por_fase[i]
+            for j, sub in enumerate(self.nombresSubfase):
+                tabla[i, j] = rango.get('n' + nombre(f) + nombre(sub), por_fase[i])
+        # Los códigos -1 (sin Fase o sin SubFase) toman la última fila o columna de la tabla.
+        return tabla[self.fases, self.subfases]
+
+    def getPosiciones(self, indices):
+        """
+        :param indices: Indices de pacientes en la tabla.
+        :type indices: numpy.ndarray
+        :return: La posición de cada paciente en el arreglo ordenado por prioridad de su unidad (ver
+            :meth:`~pacientes.TablaPacientes.getIndicesPorUnidad`), o -1 si no tiene unidad.
+        :rtype: numpy.ndarray
+        """
+        self.ordenar()
+        inversa = np.empty(len(self.orden), dtype=np.int64)
+        inversa[self.orden] = np.arange(len(self.orden))
+        unidades = self.unidades[indices]
+        return np.where(unidades >= 0, inversa[indices] - self.limites[np.maximum(unidades, 0)], -1)
+
+    def getColumna(self, nombre):
+        """
+        Devuelve una columna de ``pacientes.csv``. Las columnas que no se usan para asignar las vacunas se leen del
+        archivo la primera vez que se piden.
+
+        :param nombre: Nombre de la columna en ``pacientes.csv``.
+        :type nombre: String
+        :return: Los valores de la columna para cada paciente.
+        :rtype: numpy.ndarray
+        """
+        if nombre == 'codigo':
+            return self.codigos
+        if nombre in self.CATEGORICAS:
+            codigos, nombres = self.CATEGORICAS[nombre](self)
+            return np.append(np.asarray(nombres, dtype=object), np.nan)[codigos]
+        if nombre not in self.columnas:
+            import pandas as pd
+            self.columnas[nombre] = pd.read_csv(self.fn, encoding="latin", usecols=[nombre])[nombre].to_numpy()
+        return self.columnas[nombre]
+
+    def getValor(self, nombre, i):
+        """
+        :param nombre: Nombre de la columna en ``pacientes.csv``.
+        :type nombre: String
+        :param i: Indice del paciente en la tabla.
+        :type i: int
+        :return: El valor de la columna *nombre* para el paciente *i*.
+        """
+        if nombre in self.CATEGORICAS:
+            codigos, nombres = self.CATEGORICAS[nombre](self)
+            return nombres[codigos[i]] if codigos[i] >= 0 else np.nan
+        return self.getColumna(nombre)[i]
+
+    def getPaciente(self, i):
+        """
+        :param i: Indice del paciente en la tabla.
+        :type i: int
+        :return: Vista del paciente *i*.
+        :rtype: VistaPaciente
+        """
+        return VistaPaciente(self, i)
+
+    def porUnidad(self):
+        """
+        :return: Diccionario con llave el código de la unidad y valor la lista de sus pacientes ordenados por
+            prioridad, igual que la devuelve :func:`~pacientes.readPacientes`. Cada paciente es una
+            :class:`~pacientes.VistaPaciente` sobre esta tabla.
+        :rtype: dict
+        """
+        result = {}
+        for unidad, orden in self.getIndicesPorUnidad().items():
+            result[unidad] = [VistaPaciente(self, i) for i in orden.tolist()]
+        return result
+
+
+class VistaPaciente:
+    """
+    Vista de un paciente dentro de una :class:`~pacientes.TablaPacientes`. Ofrece la prioridad, el código y los datos
+    del paciente como atributos (ver ``ATRIBUTOS``), pero solo guarda la tabla y el indice del paciente.
+    """
+    __slots__ = ('tabla', 'indice')
+
+    # Atributo del paciente -> columna de pacientes.csv
+    ATRIBUTOS = {'codigo': 'codigo', 'nit': 'nit', 'nombre': 'nombre', 'sexo': 'sexo', 'numAfiliado': 'numafiliado',
+                 'fdn': 'fdn', 'edad': 'edad', 'renglon': 'renglon', 'cargo': 'cargo', 'numEmpleado': 'numempleado',
+                 'deptoHabita': 'departamento', 'muniHabita': 'municipio', 'zonaHabita': 'zona',
+                 'direccion': 'direccion', 'nombreDependencia': 'nombredependencia',
+                 'deptoDependencia': 'departamentoDependencia', 'muniDependencia': 'municipioDependencia',
+                 'codigoUnidadAdscripcion': 'nombreUnidadAdscripcion', 'fase': 'Fase', 'subfase': 'SubFase'}
+
+    def __init__(self, tabla, indice):
+        self.tabla = tabla
+        self.indice = indice
+
+    def __getattr__(self, nombre):
+        if nombre == 'priority':
+            return self.getPrioridad()
+        if nombre in VistaPaciente.ATRIBUTOS:
+            return self.tabla.getValor(VistaPaciente.ATRIBUTOS[nombre], self.indice)
+        raise AttributeError(nombre)
 
     def getPrioridad(self):
         """
         :return: La prioridad en la que la persona debe ser vacunada (entre menor sea el numero mayor prioridad).
-        :rtype: int
+        :rtype: float
         """
-        return self.priority
+        return self.tabla.priority[self.indice]
 
     def getCodigo(self):
         """
         :return: El código de identificación del paciente.
         :rtype: String
         """
-        return self.codigo
+        return self.tabla.codigos[self.indice]
 
     def __str__(self):
-        return self.codigo + "," + self.nombre + "," + str(self.edad)
+        return str(self.getCodigo()) + "," + str(self.nombre) + "," + str(self.edad)
+
+
+# Columnas de pacientes.csv necesarias para calcular prioridades y asignar vacunas.
+COLUMNAS_ASIGNACION = ['codigo', 'edad', 'cargo', 'departamento', 'municipio', 'nombreUnidadAdscripcion', 'Fase',
+                       'SubFase', 'tuvoCovid', 'diabetico', 'sobrepeso', 'cancer']
+
+
+# Tamaño mínimo en bytes de cada parte de pacientes.csv que se lee en un proceso aparte.
+TAMANO_MINIMO_PARTE = 8 * 1024 ** 2
+
+
+def dividirArchivo(fn, partes):
+    """
+    Divide el archivo CSV *fn* en a lo más *partes* rangos de bytes de tamaño parecido que empiezan y terminan en un
+    cambio de línea, sin contar el encabezado. Supone que ningún campo tiene cambios de línea dentro de comillas.
+
+    :param fn: Ubicación del archivo.
+    :type fn: String
+    :param partes: Número de rangos.
+    :type partes: int
+    :return: Tupla (encabezado en bytes, lista de tuplas (inicio, fin) de cada rango, en orden).
+    :rtype: tuple
+    """
+    tamano = os.path.getsize(fn)
+    with open(fn, 'rb') as f:
+        encabezado = f.readline()
+        limites = [f.tell()]
+        for k in range(1, partes):
+            posicion = limites[0] + (tamano - limites[0]) * k // partes
+            if posicion <= limites[-1]:
+                continue
+            # Se avanza hasta el inicio de la siguiente línea.
+            f.seek(posicion - 1)
+            f.readline()
+            if limites[-1] < f.tell() < tamano:
+                limites.append(f.tell())
+    limites.append(tamano)
+    return encabezado, list(zip(limites[:-1], limites[1:]))
+
+
+def _leerRango(fn, encabezado, inicio, fin, columnas):
+    """
+    Lee las *columnas* de las líneas del archivo *fn* entre los bytes *inicio* y *fin*. Se corre en un proceso aparte
+    desde :func:`~pacientes.leerCSVEnPartes`.
+    """
+    import pandas as pd
+    with open(fn, 'rb') as f:
+        f.seek(inicio)
+        datos = f.read(fin - inicio)
+    return pd.read_csv(io.BytesIO(encabezado + datos), encoding="latin", usecols=columnas)
+
+
+def leerCSVEnPartes(fn, columnas, trabajos):
+    """
+    Lee las *columnas* del archivo CSV *fn* dividiéndolo con :func:`~pacientes.dividirArchivo` en partes que se leen
+    en *trabajos* procesos. Las partes se juntan en el orden del archivo, por lo que el resultado es el mismo que al
+    leerlo de una vez. Los archivos de menos de :data:`TAMANO_MINIMO_PARTE` bytes por proceso se leen en menos procesos.
+
+    :param fn: Ubicación del archivo.
+    :type fn: String
+    :param columnas: Columnas a leer.
+    :type columnas: list
+    :param trabajos: Número de procesos.
+    :type trabajos: int
+    :return: Tabla con las columnas leidas.
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    partes = max(1, min(trabajos, os.path.getsize(fn) // TAMANO_MINIMO_PARTE))
+    if partes == 1:
+        return pd.read_csv(fn, encoding="latin", usecols=columnas)
+    encabezado, rangos = dividirArchivo(fn, partes)
+    # Con -j los demás archivos se leen en hilos al mismo tiempo, y un fork desde un proceso con varios hilos puede
+    # dejar al hijo con candados tomados por los otros hilos. Los procesos se crean desde un servidor que ya importó
+    # pandas (o desde cero donde no hay forkserver).
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(['pandas', 'models.pacientes'])
+    else:
+        contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(rangos), mp_context=contexto) as executor:
+        futuros = [executor.submit(_leerRango, fn, encabezado, inicio, fin, columnas) for inicio, fin in rangos]
+        return pd.concat([futuro.result() for futuro in futuros], ignore_index=True)
+
+
+def _codificar(serie):
+    """
+    Codifica *serie* como indices a sus valores distintos, en el orden en que aparecen por primera vez.
+    """
+    import pandas as pd
+    codigos, nombres = pd.factorize(serie)
+    return codigos.astype(np.int32), nombres.tolist()
+
+
+def _pesos(params):
+    """
+    :return: Los pesos de la configuración, de los que dependen las prioridades de los pacientes.
+    """
+    return (params.getPesoEdad(), params.getPesoHabita(), params.getPesoTrabaja(), params.getPesoCargo(),
+            params.getPesoCovid(), params.getPesoDiabetes(), params.getPesoPeso(), params.getPesoCancer(),
+            params.getPesoVih(), params.getPesoRenal())
+
+
+def _archivosPrioridad(params):
+    """
+    :return: Ubicación de los archivos de prioridades por edad, cargo, unidad y municipio de la configuración.
+    """
+    return [params.getPathToFiles()+params.getFileEdad(), params.getPathToFiles()+params.getFileCargos(),
+            params.getPathToFiles()+params.getFileUnidades(), params.getPathToFiles()+params.getFileMuni()]
 
 
-def readPacientes(fn, params, verbose=False, debug=False):
+def escribirPadron(tabla, destino, params):
     """
-    Lee la información de los pacientes disponible en el archivo *fn* y la guarda en un objeto tipo
-    :class:`~pacientes.Paciente`.
+    Guarda los arreglos de *tabla* (códigos de ancho fijo, unidades, prioridades y el orden de los pacientes de cada
+    unidad) en el folder *destino*, para poder abrirlos después con :func:`~pacientes.leerPadron` sin volver a leer
+    ``pacientes.csv``. También se guardan los pesos de la configuración y el hash de ``pacientes.csv`` y de los
+    archivos de prioridades, para saber si el padrón sigue vigente.
+
+    :param tabla: Tabla de pacientes.
+    :type tabla: TablaPacientes
+    :param destino: Folder donde se guarda el padrón. Se crea si no existe.
+    :type destino: String
+    :param params: Parametros de la configuracion con la que se calcularon las prioridades.
+    :type params: ConfigParams
+    :return: None
+    """
+    arreglos, nombres = tabla.getArreglos()
+    arreglos = dict(arreglos)
+    if arreglos['codigos'].dtype == object:
+        arreglos['codigos'] = arreglos['codigos'].astype(str)
+    os.makedirs(destino, exist_ok=True)
+    hashes = [hashArchivo(fn) for fn in [tabla.fn] + _archivosPrioridad(params)]
+    guardarArreglos(destino, arreglos, {'fn': os.path.abspath(tabla.fn), 'nombres': nombres,
+                                        'pesos': _pesos(params), 'hashes': hashes})
+
+
+def leerPadron(fn, params):
+    """
+    Abre un padrón guardado con :func:`~pacientes.escribirPadron`. Los arreglos se mapean de solo lectura: no se
+    copian a memoria, los indices de cada unidad son vistas sobre las páginas mapeadas, y varios procesos que abren
+    el mismo padrón comparten la misma memoria física.
+
+    :param fn: Folder del padrón.
+    :type fn: String
+    :param params: Parametros de la configuracion
+    :type params: ConfigParams
+    :return: Tabla de pacientes sobre los arreglos mapeados.
+    :rtype: TablaPacientes
+    :raises ValueError: Si el padrón se construyó con pesos distintos a los de *params*, o si cambiaron o ya no
+        existen ``pacientes.csv`` o los archivos de prioridades desde que se construyó.
+    """
+    arreglos, objetos = leerArreglos(fn, mmap=True)
+    if tuple(objetos['pesos']) != _pesos(params):
+        raise ValueError("El padrón " + fn + " se construyó con otros pesos de prioridad, hay que volver a "
+                         "construirlo.")
+    if not os.path.isfile(objetos['fn']):
+        raise ValueError("El padrón " + fn + " se construyó con el archivo " + objetos['fn'] + ", que ya no existe, "
+                         "hay que volver a construirlo.")
+    fns = [objetos['fn']] + _archivosPrioridad(params)
+    if objetos.get('hashes') != [hashArchivo(fn_entrada) for fn_entrada in fns]:
+        raise ValueError("El padrón " + fn + " se construyó con otro archivo de pacientes o de prioridades, hay que "
+                         "volver a construirlo.")
+    return TablaPacientes.desdeArreglos(objetos['fn'], arreglos, objetos['nombres'])
+
+
+def readPacientes(fn, params, verbose=False, debug=False, tabla=False, cache=None, trabajos=1, ordenar=True):
+    """
+    Lee la información de los pacientes disponible en el archivo *fn* y la guarda en una
+    :class:`~pacientes.TablaPacientes`. Solo se leen las columnas necesarias para asignar las vacunas y las
+    prioridades se calculan por columnas con :func:`~pacientes.calcularPrioridades`. Si *fn* es un folder se abre
+    como un padrón guardado con :func:`~pacientes.escribirPadron`.
 
     :param fn: Ubicación del archivo con la información de los pacientes.
     :type fn: String
@@ -164,83 +646,70 @@ def readPacientes(fn, params, verbose=False, debug=False):
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
-    :return: Diccionario de Pacientes con las variables leidas del archivo.
+    :param tabla: Opcional. Si es verdadero devuelve la TablaPacientes en lugar del diccionario de pacientes.
+    :type tabla: Boolean
+    :param cache: Opcional. Si se da, la tabla con las prioridades calculadas y los pacientes ya ordenados se lee de
+        la cache cuando no han cambiado ``pacientes.csv``, los archivos de prioridades ni los pesos de la
+        configuración.
+    :type cache: CacheEntradas
+    :param trabajos: Opcional. Número de procesos en los que se lee el archivo (ver
+        :func:`~pacientes.leerCSVEnPartes`).
+    :type trabajos: int
+    :param ordenar: Opcional. Si es falso los pacientes solo se agrupan por unidad y se ordenan por prioridad hasta
+        que se pide el orden (ver :class:`~pacientes.TablaPacientes`). Los pacientes que se leen del padrón o de la
+        cache, o que se guardan en la cache, siempre están ordenados.
+    :type ordenar: Boolean
+    :return: Diccionario de Pacientes (ver :meth:`~pacientes.TablaPacientes.porUnidad`) o TablaPacientes.
     :rtype: dict
     """
-    df = pd.read_csv(fn, encoding="latin")
-
-    priorityEdades = readPriorityEdad(params.getPathToFiles()+params.getFileEdad())
-    priorityCargos = readPriorityCargos(params.getPathToFiles()+params.getFileCargos())
-    priorityUnidades = readPriorityUnidades(params.getPathToFiles()+params.getFileUnidades())
-    priorityMunicipios = readPriorityMunicipios(params.getPathToFiles()+params.getFileMuni())
-
-    result = {}
-    for row in df.iterrows():
-        codigo = row[1]['codigo']
-        nit = row[1]['nit']
-        nombre = row[1]['nombre']
-        sexo = row[1]['sexo']
-        num_afiliado = row[1]['numafiliado']
-        fdn = row[1]['fdn']
-        edad = int(row[1]['edad'])
-        renglon = row[1]['renglon']
-        cargo = row[1]['cargo']
-        num_empleado = row[1]['numempleado']
-        codigo_habita = row[1]['codigoHabita']
-        depto_habita = row[1]['departamento']
-        muni_habita = row[1]['municipio']
-        zona_habita = row[1]['zona']
-        direccion = row[1]['direccion']
-        nombre_dependencia = row[1]['nombredependencia']
-        depto_dependencia = row[1]['departamentoDependencia']
-        muni_dependencia = row[1]['municipioDependencia']
-        codigo_unidad_adscripcion = row[1]['nombreUnidadAdscripcion']
-        fase = row[1]['Fase']
-        subfase = row[1]['SubFase']
-        covid = 1 if row[1]['tuvoCovid'] == "Si" else 0
-        diabetes = 1 if row[1]['diabetico'] == "Si" else 0
-        sobrepeso = 1 if row[1]['sobrepeso'] == "Si" else 0
-        cancer = 1 if row[1]['cancer'] == "Si" else 0
-        vih = 1 if row[1]['VIH'] == "Si" else 0
-        renal = 1 if row[1]['Renal'] == "Si" else 0
-        if edad - edad % 10 in priorityEdades:
-            priority_edad = priorityEdades[edad - edad % 10]
-        else:
-            if debug:
-                print("Advertencia: El paciente "+str(codigo)+" no tiene una edad valida.")
-            priority_edad = 5
-        if cargo in priorityCargos:
-            priority_cargo = priorityCargos[cargo]
-        else:
-            if debug:
-                print("Advertencia: El paciente " + str(codigo) + " no tiene un cargo valido.")
-            priority_cargo = 4
-        if str(depto_habita)+", "+str(muni_habita) in priorityMunicipios:
-            priority_habita = priorityMunicipios[str(depto_habita)+", "+str(muni_habita)]
-        else:
-            if debug:
-                print("Advertencia: Paciente " + str(codigo) + " no tiene un departamento y municipio valido.")
-            priority_habita = 2
-        if codigo_unidad_adscripcion in priorityUnidades:
-            priority_dependencia = priorityUnidades[codigo_unidad_adscripcion]
+    if os.path.isdir(fn):
+        result = leerPadron(fn, params)
+        if verbose or debug:
+            print('Abierto el padrón de ' + str(len(result)) + ' pacientes...')
+        return result if tabla else result.porUnidad()
+
+    fns_prioridad = _archivosPrioridad(params)
+    if cache is not None:
+        llave = cache.llave('pacientes', [fn] + fns_prioridad, _pesos(params))
+        entrada = cache.leer(llave, mmap=True)
+        if entrada is not None:
+            result = TablaPacientes.desdeArreglos(fn, entrada[0], entrada[1])
+            if verbose or debug:
+                print('Leidos ' + str(len(result)) + ' pacientes de la cache...')
+            return result if tabla else result.porUnidad()
+
+    lectores = (readPriorityEdad, readPriorityCargos, readPriorityUnidades, readPriorityMunicipios)
+    tablas = None
+    if trabajos > 1:
+        # Las tablas de prioridades se leen en hilos mientras se lee el archivo de pacientes.
+        with ThreadPoolExecutor(max_workers=len(lectores)) as hilos:
+            tablas = [hilos.submit(leer, fn_prioridad) for leer, fn_prioridad in zip(lectores, fns_prioridad)]
+            with PERFIL.etapa('lectura'):
+                df = leerCSVEnPartes(fn, COLUMNAS_ASIGNACION, trabajos)
+    else:
+        with PERFIL.etapa('lectura'):
+            df = leerCSVEnPartes(fn, COLUMNAS_ASIGNACION, trabajos)
+
+    with PERFIL.etapa('prioridades'):
+        if tablas is not None:
+            priorityEdades, priorityCargos, priorityUnidades, priorityMunicipios = [t.result() for t in tablas]
         else:
-            if debug:
-                print("Advertencia: El paciente " + str(codigo) + " no tiene una unidad valida")
-            priority_dependencia = 5
-        p = Paciente(codigo, nit, nombre, sexo, num_afiliado, fdn, edad, renglon,
-                     cargo, num_empleado, depto_habita, muni_habita,
-                     zona_habita, direccion, nombre_dependencia, depto_dependencia,
-                     muni_dependencia, codigo_unidad_adscripcion, fase, subfase,
-                     covid, diabetes, sobrepeso, cancer, vih, renal, priority_edad,
-                     priority_cargo, priority_habita, priority_dependencia, params)
-        if codigo_unidad_adscripcion not in result:
-            result[codigo_unidad_adscripcion] = []
-        result[codigo_unidad_adscripcion].append(p)
-
-    for k in result.keys():
-        result[k].sort(key=lambda x: x.priority)
+            priorityEdades, priorityCargos, priorityUnidades, priorityMunicipios = [
+                leer(fn_prioridad) for leer, fn_prioridad in zip(lectores, fns_prioridad)]
+
+        prioridades = buscarPrioridades(df, priorityEdades, priorityCargos, priorityUnidades, priorityMunicipios,
+                                        debug)
+        calcularPrioridades(df, params, prioridades)
+
+    with PERFIL.etapa('orden'):
+        result = TablaPacientes.desdeDataFrame(fn, df, ordenar)
+    PERFIL.contar('pacientes_leidos', len(result))
 
     if verbose or debug:
-        print('Leidos ' + str(len(result)) + ' pacientes...')
+        print('Leidos ' + str(len(result.nombresUnidad)) + ' pacientes...')
+    if cache is not None:
+        cache.guardar(llave, *result.getArreglos())
 
-    return result
+    if tabla:
+        return result
+    return result.porUnidad()
@@ -0,0 +1,291 @@
+"""
+=========
+perfil.py
+=========
+
+Clase encargada de medir cuánto tiempo y memoria toma cada etapa de una corrida del programa. Consta de una clase
+llamada :class:`~perfil.Perfil` que guarda el árbol de etapas medidas y contadores de eventos, y los métodos
+:func:`~perfil.memoriaActual`, :func:`~perfil.memoriaMaxima` y :func:`~perfil.reiniciarMemoriaMaxima` que leen la
+memoria del proceso. El perfil de la corrida es :data:`~perfil.PERFIL`, que no mide nada hasta que se activa.
+Esta clase es utilizada por el programa principal :mod:main.py y por los modelos que leen y escriben archivos; las
+etapas solo se miden cuando :mod:main.py se corre con el parámetro --profile. :mod:benchmark.py también la usa para
+medir la memoria de cada escenario.
+"""
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # En Windows no hay resource y no se mide la memoria.
+    resource = None
+
+_STATUS = '/proc/self/status'
+
+
+def _leerStatus(campo):
+    """
+    :return: Valor de *campo* de ``/proc/self/status`` en MB, o None si no existe (por ejemplo fuera de Linux).
+    :rtype: float
+    """
+    try:
+        with open(_STATUS) as f:
+            for linea in f:
+                if linea.startswith(campo + ':'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def memoriaActual():
+    """
+    :return: Memoria que utiliza el proceso en este momento en MB, o None si no se puede medir.
+    :rtype: float
+    """
+    return _leerStatus('VmRSS')
+
+
+def memoriaMaxima():
+    """
+    :return: Memoria máxima utilizada por el proceso en MB (desde que empezó o desde la última vez que se llamó a
+        :func:`~perfil.reiniciarMemoriaMaxima`), o None si no se puede medir.
+    :rtype: float
+    """
+    # En Linux ru_maxrss incluye la memoria del proceso que lo creó, por lo que se usa VmHWM.
+    result = _leerStatus('VmHWM')
+    if result is not None or resource is None:
+        return result
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS da el resultado en bytes y los demás sistemas en KB.
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def reiniciarMemoriaMaxima():
+    """
+    Hace que la memoria máxima del proceso vuelva a ser la memoria actual. Solo funciona en Linux; en otros sistemas
+    la memoria máxima es la de todo el proceso.
+
+    :return: True si se pudo reiniciar.
+    :rtype: bool
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Etapa:
+    """
+    Guarda las medidas de una etapa:
+    * Nombre de la etapa.
+    * Tiempo que tomó, en segundos.
+    * Memoria máxima utilizada durante la etapa y memoria al terminar, en MB.
+    * Contadores de eventos que ocurrieron durante la etapa.
+    * Etapas que se midieron dentro de esta etapa, en orden.
+    """
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.segundos = 0.0
+        self.memoriaMaxima = None
+        self.memoriaFinal = None
+        self.contadores = {}
+        self.etapas = []
+        self.inicio = None
+
+    def anotarMemoria(self, memoria):
+        """
+        :param memoria: Memoria máxima medida mientras la etapa estaba abierta, en MB.
+        :type memoria: float
+        :return: None
+        """
+        if memoria is not None:
+            self.memoriaMaxima = memoria if self.memoriaMaxima is None else max(self.memoriaMaxima, memoria)
+
+    def getDict(self):
+        """
+        :return: Las medidas de la etapa y de sus etapas internas como diccionario, para guardarlas en JSON.
+        :rtype: dict
+        """
+        return {'nombre': self.nombre, 'segundos': round(self.segundos, 6),
+                'memoria_maxima_mb': None if self.memoriaMaxima is None else round(self.memoriaMaxima, 1),
+                'memoria_final_mb': None if self.memoriaFinal is None else round(self.memoriaFinal, 1),
+                'contadores': self.contadores, 'etapas': [e.getDict() for e in self.etapas]}
+
+    def getPilas(self, prefijo=''):
+        """
+        :return: Lista de tuplas (pila de nombres separados por punto y coma, microsegundos) con el tiempo propio de
+            cada etapa, sin contar el de sus etapas internas.
+        :rtype: list
+        """
+        pila = prefijo + ';' + self.nombre if prefijo else self.nombre
+        propio = self.segundos - sum(e.segundos for e in self.etapas)
+        result = [(pila, int(round(max(propio, 0) * 10 ** 6)))]
+        for etapa in self.etapas:
+            result.extend(etapa.getPilas(pila))
+        return result
+
+
+class _EtapaAbierta:
+    """
+    Context manager devuelto por :meth:`~perfil.Perfil.etapa`.
+    """
+    def __init__(self, perfil, nombre):
+        self.perfil = perfil
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.perfil.abrir(self.nombre)
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.perfil.cerrar()
+        return False
+
+
+class _SinMedir:
+    """
+    Context manager que no hace nada, devuelto por :meth:`~perfil.Perfil.etapa` cuando el perfil no está activo.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        return False
+
+
+_SIN_MEDIR = _SinMedir()
+
+
+class Perfil:
+    """
+    Mide el tiempo y la memoria máxima de las etapas de una corrida. Las etapas se abren con
+    :meth:`~perfil.Perfil.etapa` y pueden tener etapas internas. Cuando el perfil no está activo no se mide nada y
+    abrir una etapa no cuesta casi nada, por lo que las etapas se pueden dejar en el código.
+
+    La memoria máxima de cada etapa se mide reiniciando la memoria máxima del proceso al abrir la etapa (ver
+    :func:`~perfil.reiniciarMemoriaMaxima`); antes de reiniciarla se le anota la memoria máxima hasta ese momento a
+    todas las etapas abiertas, de modo que cada etapa incluye la memoria máxima de sus etapas internas.
+    """
+    def __init__(self, activo=False):
+        """
+        :param activo: Opcional. Si es verdadero se miden las etapas.
+        :type activo: bool
+        """
+        self.activo = activo
+        self.raiz = Etapa('total')
+        self.abiertas = []
+        self.contadores = {}
+        self.inicio = time.perf_counter()
+
+    def activar(self):
+        """
+        Empieza a medir las etapas. El tiempo total de la corrida se cuenta desde que se crea el perfil.
+
+        :return: None
+        """
+        self.activo = True
+
+    def isActivo(self):
+        """
+        :return: True si se están midiendo las etapas.
+        :rtype: bool
+        """
+        return self.activo
+
+    def etapa(self, nombre):
+        """
+        :param nombre: Nombre de la etapa.
+        :type nombre: String
+        :return: Context manager que mide la etapa *nombre* mientras está abierto.
+        """
+        if not self.activo:
+            return _SIN_MEDIR
+        return _EtapaAbierta(self, nombre)
+
+    def _anotarMemoria(self):
+        memoria = memoriaMaxima()
+        self.raiz.anotarMemoria(memoria)
+        for etapa in self.abiertas:
+            etapa.anotarMemoria(memoria)
+
+    def abrir(self, nombre):
+        """
+        Abre una etapa dentro de la última etapa abierta. Es mejor usar :meth:`~perfil.Perfil.etapa`.
+
+        :param nombre: Nombre de la etapa.
+        :type nombre: String
+        :return: None
+        """
+        self._anotarMemoria()
+        reiniciarMemoriaMaxima()
+        etapa = Etapa(nombre)
+        (self.abiertas[-1] if self.abiertas else self.raiz).etapas.append(etapa)
+        self.abiertas.append(etapa)
+        etapa.inicio = time.perf_counter()
+
+    def cerrar(self):
+        """
+        Cierra la última etapa abierta.
+
+        :return: None
+        """
+        etapa = self.abiertas[-1]
+        etapa.segundos = time.perf_counter() - etapa.inicio
+        self._anotarMemoria()
+        etapa.memoriaFinal = memoriaActual()
+        self.abiertas.pop()
+
+    def contar(self, nombre, n=1):
+        """
+        Suma *n* al contador *nombre* de la última etapa abierta y al total de la corrida.
+
+        :param nombre: Nombre del contador.
+        :type nombre: String
+        :param n: Opcional. Número de eventos.
+        :type n: int
+        :return: None
+        """
+        if not self.activo:
+            return
+        etapa = self.abiertas[-1] if self.abiertas else self.raiz
+        etapa.contadores[nombre] = etapa.contadores.get(nombre, 0) + int(n)
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + int(n)
+
+    def getReporte(self):
+        """
+        :return: Las medidas de la corrida como diccionario: tiempo total, memoria máxima, contadores totales y el
+            árbol de etapas.
+        :rtype: dict
+        """
+        self.raiz.segundos = time.perf_counter() - self.inicio
+        self._anotarMemoria()
+        self.raiz.memoriaFinal = memoriaActual()
+        result = self.raiz.getDict()
+        result['contadores'] = self.contadores
+        return result
+
+    def guardar(self, fn):
+        """
+        Guarda el reporte de la corrida (ver :meth:`~perfil.Perfil.getReporte`) en el archivo JSON *fn*, y el tiempo
+        propio de cada etapa en un archivo con el mismo nombre y extensión ``.folded``, con una línea
+        "etapa;subetapa microsegundos" por etapa, que se puede abrir con flamegraph.pl o speedscope.
+
+        :param fn: Ubicación del archivo del reporte.
+        :type fn: String
+        :return: None
+        """
+        reporte = self.getReporte()
+        with open(fn, 'w') as f:
+            json.dump(reporte, f, indent=2, default=int)
+        with open(os.path.splitext(fn)[0] + '.folded', 'w') as f:
+            for pila, microsegundos in self.raiz.getPilas():
+                f.write(pila.replace(' ', '_') + ' ' + str(microsegundos) + '\n')
+
+
+# Perfil de la corrida, compartido por todos los módulos. Se activa con --profile (ver :mod:main.py).
+PERFIL = Perfil()
@@ -0,0 +1,161 @@
+"""
+===========
+progreso.py
+===========
+
+Clase encargada de reportar el avance de la asignación de vacunas mientras corre. Consta de una clase llamada
+:class:`~progreso.Progreso` que cuenta los pacientes asignados en cada fase y escribe cada cierto tiempo una línea JSON
+con los pacientes asignados por segundo, las dosis que faltan por asignar en la fase y el tiempo estimado para
+terminar. El progreso de la corrida es :data:`~progreso.PROGRESO`, que no reporta nada hasta que se activa.
+Esta clase es utilizada por el programa principal :mod:main.py; solo reporta cuando se corre con el parámetro
+--progress.
+"""
+import json
+import sys
+import time
+
+# Segundos mínimos entre dos reportes de avance.
+INTERVALO = 1.0
+
+
+class Progreso:
+    """
+    Reporta el avance de la asignación en un archivo con una línea JSON por reporte, que otro proceso puede leer
+    mientras se escribe (por ejemplo con ``tail -f``). Cada línea tiene el campo "evento", que es:
+    * "inicio": Empieza la asignación; incluye el número de pacientes a asignar en cada fase.
+    * "fase": Empieza una fase.
+    * "avance": Reporte periódico, a lo más uno cada *intervalo* segundos.
+    * "fin_fase": Termina una fase.
+    * "fin": Termina la asignación.
+    Todas las líneas incluyen los segundos desde el inicio, la fase actual, los pacientes asignados en la fase y en
+    total, las dosis que faltan por asignar en la fase, los pacientes asignados por segundo y el tiempo estimado para
+    terminar en segundos. En la línea "fin" ya no hay fase actual, por lo que la fase es null y los campos de la fase
+    son 0.
+
+    Los ciclos de asignación solo llaman a :meth:`~progreso.Progreso.avanzar`, que suma los pacientes asignados y
+    solo revisa el reloj cuando el progreso está activo, por lo que se puede dejar en el código.
+    """
+    def __init__(self, intervalo=INTERVALO):
+        """
+        :param intervalo: Opcional. Segundos mínimos entre dos reportes de avance.
+        :type intervalo: float
+        """
+        self.intervalo = intervalo
+        self.archivo = None
+        self.activo = False
+        self.objetivos = {}
+        self.fase = None
+        self.asignados = 0
+        self.asignadosFase = 0
+        self.inicio = None
+        self.siguiente = 0.0
+
+    def activar(self, fn):
+        """
+        Empieza a reportar el avance en el archivo *fn*. Si *fn* es '-' se reporta en la salida de errores.
+
+        :param fn: Ubicación del archivo de avance.
+        :type fn: String
+        :return: None
+        """
+        self.archivo = sys.stderr if fn == '-' else open(fn, 'w', buffering=1)
+        self.activo = True
+
+    def isActivo(self):
+        """
+        :return: True si se está reportando el avance.
+        :rtype: bool
+        """
+        return self.activo
+
+    def iniciar(self, objetivos):
+        """
+        Empieza a medir la asignación.
+
+        :param objetivos: Diccionario con llave la fase y valor el número de pacientes que se asignan en esa fase.
+        :type objetivos: dict
+        :return: None
+        """
+        if not self.activo:
+            return
+        self.objetivos = {fase: int(n) for fase, n in objetivos.items()}
+        self.asignados = 0
+        self.inicio = time.perf_counter()
+        self.siguiente = self.inicio + self.intervalo
+        self._escribir('inicio', objetivos=self.objetivos)
+
+    def iniciarFase(self, fase):
+        """
+        :param fase: Fase que se empieza a asignar.
+        :type fase: String
+        :return: None
+        """
+        if not self.activo:
+            return
+        self.fase = fase
+        self.asignadosFase = 0
+        self._escribir('fase')
+
+    def avanzar(self, n):
+        """
+        Suma *n* pacientes asignados a la fase actual y escribe un reporte si pasaron más de *intervalo* segundos desde
+        el último.
+
+        :param n: Número de pacientes asignados.
+        :type n: int
+        :return: None
+        """
+        if not self.activo:
+            return
+        self.asignados += n
+        self.asignadosFase += n
+        if time.perf_counter() >= self.siguiente:
+            self._escribir('avance')
+
+    def terminarFase(self):
+        """
+        :return: None
+        """
+        if self.activo:
+            self._escribir('fin_fase')
+
+    def terminar(self):
+        """
+        Escribe el último reporte y cierra el archivo de avance.
+
+        :return: None
+        """
+        if not self.activo:
+            return
+        self.fase = None
+        self.asignadosFase = 0
+        self._escribir('fin')
+        if self.archivo is not sys.stderr:
+            self.archivo.close()
+        self.archivo = None
+        self.activo = False
+
+    def getRestantes(self):
+        """
+        :return: Número de pacientes que faltan por asignar en la fase actual y en toda la asignación.
+        :rtype: tuple
+        """
+        fase = self.objetivos.get(self.fase, 0) - self.asignadosFase if self.fase is not None else 0
+        return max(fase, 0), max(sum(self.objetivos.values()) - self.asignados, 0)
+
+    def _escribir(self, evento, **extra):
+        ahora = time.perf_counter()
+        segundos = ahora - self.inicio
+        tasa = self.asignados / segundos if segundos > 0 else 0.0
+        restantes_fase, restantes = self.getRestantes()
+        linea = {'evento': evento, 'segundos': round(segundos, 3), 'fase': self.fase,
+                 'asignados_fase': self.asignadosFase, 'asignados': self.asignados,
+                 'dosis_restantes_fase': restantes_fase, 'pacientes_por_segundo': round(tasa, 1),
+                 'eta_segundos': round(restantes / tasa, 1) if tasa > 0 else None}
+        linea.update(extra)
+        self.archivo.write(json.dumps(linea) + '\n')
+        self.siguiente = ahora + self.intervalo
+
+
+# Progreso de la corrida. Se activa con --progress (ver :mod:main.py).
+PROGRESO = Progreso()
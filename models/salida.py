@@ -0,0 +1,471 @@
+"""
+=========
+salida.py
+=========
+
+Clase encargada de escribir las asignaciones en el archivo de salida. Consta de una clase llamada
+:class:`~salida.EscritorAsignaciones` que recibe las asignaciones por bloques a medida que se calculan, guarda en disco
+corridas ordenadas cuando se acumulan demasiadas y al final las mezcla en el archivo de salida, la clase
+:class:`~salida.EscritorColumnar` que además escribe las asignaciones en formato Parquet o Arrow, y de los métodos
+:func:`~salida.escribirCorrida`, :func:`~salida.escribirAsignaciones` y :func:`~salida.escribirCambios`.
+Esta clase es utilizada por el programa principal :mod:main.py para escribir ``asignaciones.csv`` sin tener todas las
+asignaciones en memoria.
+"""
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from models.asignaciones import BloqueAsignaciones
+from models.calendario import fechasDeDias
+from models.perfil import PERFIL
+from models.tablas import arreglo
+
+ENCABEZADO = "IdPaciente,codigoDependencia,tipo_vacuna,Dosis,orden,fecha\n"
+COLUMNAS = ENCABEZADO.strip().split(',')
+FORMATOS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def importarArrow():
+    """
+    Importa pyarrow, que solo se necesita para escribir en formato Parquet o Arrow.
+
+    :return: El módulo pyarrow.
+    :raises ImportError: Si pyarrow no está instalado.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Para escribir en formato parquet o arrow se necesita instalar pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def _texto(columna):
+    """
+    Convierte cada valor de *columna* a texto con ``str``. Las columnas de enteros y de fechas se convierten valor
+    distinto por valor distinto, ya que se repiten mucho (clínicas, vacunas, dosis, días).
+    """
+    if columna.dtype.kind not in 'iuM':
+        return [str(valor) for valor in columna.tolist()]
+    valores, inversa = np.unique(columna, return_inverse=True)
+    if columna.dtype.kind == 'M':
+        valores = valores.astype('datetime64[us]')
+    texto = np.array([str(valor) for valor in valores.tolist()], dtype=object)
+    return texto[inversa.reshape(-1)].tolist()
+
+
+def _lineas(bloque):
+    """
+    :return: Las líneas del archivo de salida de las asignaciones de *bloque*, en el orden del bloque.
+    """
+    columnas = [_texto(columna) for columna in (bloque.ids, bloque.dependencias, bloque.vacunas, bloque.dosis,
+                                                bloque.ordenes, bloque.fechas)]
+    return [",".join(fila) + "\n" for fila in zip(*columnas)]
+
+
+def _llaves(bloque):
+    """
+    :return: La llave de ordenamiento (dependencia, día, dosis, orden) de cada asignación de *bloque*.
+    """
+    # Las fechas se comparan como días, aunque un bloque venga de un plan guardado con otra unidad.
+    dias = bloque.fechas.astype('datetime64[D]').astype('int64')
+    return zip(bloque.dependencias.tolist(), dias.tolist(), bloque.dosis.tolist(), bloque.ordenes.tolist())
+
+
+def _filasConLlave(bloque):
+    """
+    Ordena *bloque* y devuelve cada asignación como una tupla (llave de ordenamiento, línea del archivo de salida).
+    """
+    bloque = bloque.ordenar()
+    return zip(_llaves(bloque), _lineas(bloque))
+
+
+def _bloqueDeFilas(filas):
+    """
+    :param filas: Filas leidas con :func:`~salida.leerCorrida`.
+    :type filas: list
+    :return: Las asignaciones de *filas* como arreglos, en el mismo orden.
+    :rtype: BloqueAsignaciones
+    """
+    llaves, _, ids, vacunas = zip(*filas)
+    dependencias, dias, dosis, ordenes = zip(*llaves)
+    return BloqueAsignaciones(arreglo(ids), arreglo(vacunas), np.array(dosis, dtype=np.int8), arreglo(dependencias),
+                              np.array(ordenes, dtype=np.int64), fechasDeDias(dias))
+
+
+def _partesBloque(bloque, lineas, columnar, filas_por_parte=10000):
+    """
+    Parte las asignaciones ya ordenadas de *bloque* y sus *lineas* del archivo de salida en partes de
+    *filas_por_parte*. Si *columnar* es falso, las asignaciones de cada parte no se necesitan y se dan como None.
+    """
+    for i in range(0, len(bloque), filas_por_parte):
+        yield lineas[i:i + filas_por_parte], bloque.getParte(i, i + filas_por_parte) if columnar else None
+
+
+def _partesMezcla(filas, columnar, filas_por_parte=10000):
+    """
+    Igual que :func:`~salida._partesBloque`, pero a partir de las *filas* mezcladas de las corridas.
+    """
+    filas = iter(filas)
+    while True:
+        parte = list(itertools.islice(filas, filas_por_parte))
+        if not parte:
+            return
+        yield [fila[1] for fila in parte], _bloqueDeFilas(parte) if columnar else None
+
+
+def sonEnteros(ids):
+    """
+    Solo se consideran enteros los códigos que ya se leyeron como enteros: un texto como "00123" perdería los ceros
+    al convertirlo y uno de más de 19 dígitos no cabe en int64.
+
+    :param ids: Arreglo con los códigos de los pacientes.
+    :type ids: numpy.ndarray
+    :return: True si los códigos son de un tipo entero que cabe en int64.
+    :rtype: bool
+    """
+    return ids.dtype.kind in 'iu' and np.can_cast(ids.dtype, np.int64)
+
+
+def escribirCorrida(bloque, fn, filas_por_parte=10000):
+    """
+    Ordena las asignaciones de *bloque* y las guarda en el archivo temporal *fn* en partes de *filas_por_parte*
+    filas, para poder leerlas después poco a poco con :func:`~salida.leerCorrida`.
+
+    :param bloque: Asignaciones a guardar.
+    :type bloque: BloqueAsignaciones
+    :param fn: Ubicación del archivo temporal.
+    :type fn: String
+    :param filas_por_parte: Opcional. Número de filas que se guardan juntas.
+    :type filas_por_parte: int
+    :return: None
+    """
+    bloque = bloque.ordenar()
+    filas = list(zip(_llaves(bloque), _lineas(bloque), bloque.ids.tolist(), bloque.vacunas.tolist()))
+    f = open(fn, 'wb')
+    for i in range(0, len(filas), filas_por_parte):
+        pickle.dump(filas[i:i + filas_por_parte], f, pickle.HIGHEST_PROTOCOL)
+    f.close()
+
+
+def leerCorrida(fn):
+    """
+    Lee poco a poco las filas guardadas con :func:`~salida.escribirCorrida`.
+
+    :param fn: Ubicación del archivo temporal.
+    :type fn: String
+    :return: Generador de tuplas (llave de ordenamiento, línea del archivo de salida, código del paciente, vacuna) en
+        orden.
+    :rtype: generator
+    """
+    with open(fn, 'rb') as f:
+        while True:
+            try:
+                parte = pickle.load(f)
+            except EOFError:
+                return
+            for fila in parte:
+                yield fila
+
+
+class EscritorAsignaciones:
+    """
+    Escribe las asignaciones ordenadas por dependencia, fecha, dosis y orden con memoria acotada:
+    * Las asignaciones se reciben por bloques con :meth:`~salida.EscritorAsignaciones.agregar`.
+    * Cuando se acumulan más de *max_filas* asignaciones se ordenan y se guardan en disco como una corrida.
+    * Al cerrar, las corridas se mezclan (k-way merge) y se escriben en el archivo de salida en partes.
+
+    La mezcla es estable: las asignaciones con la misma llave quedan en el orden en el que se agregaron, igual que al
+    ordenar todas las asignaciones en memoria.
+
+    Se puede usar con ``with``: si ocurre un error antes de :meth:`~salida.EscritorAsignaciones.cerrar`, las corridas
+    temporales se borran al salir del bloque.
+    """
+    def __init__(self, fn, max_filas=2000000, directorio=None, columnar=None):
+        """
+        :param fn: Ubicación del archivo de salida.
+        :type fn: String
+        :param max_filas: Opcional. Número máximo de asignaciones que se guardan en memoria.
+        :type max_filas: int
+        :param directorio: Opcional. Folder donde se crean las corridas temporales. Por defecto el del sistema.
+        :type directorio: String
+        :param columnar: Opcional. Si se da, las asignaciones también se escriben en este escritor al cerrar.
+        :type columnar: EscritorColumnar
+        """
+        self.fn = fn
+        self.maxFilas = max_filas
+        self.directorio = directorio
+        self.columnar = columnar
+        self.temporal = None
+        self.pendientes = []
+        self.numPendientes = 0
+        self.corridas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        # Si hubo un error antes de cerrar se borran las corridas temporales, que tienen los códigos de los pacientes.
+        if tipo is not None:
+            self.borrarTemporal()
+        return False
+
+    def getTemporal(self):
+        """
+        :return: Folder temporal donde se guardan las corridas. Se crea la primera vez que se necesita.
+        :rtype: String
+        """
+        if self.temporal is None:
+            self.temporal = tempfile.mkdtemp(prefix='asignaciones_', dir=self.directorio)
+        return self.temporal
+
+    def nuevaCorrida(self):
+        """
+        :return: Ubicación para una nueva corrida temporal. Las corridas se mezclan en el orden en que se piden.
+        :rtype: String
+        """
+        fn = os.path.join(self.getTemporal(), 'corrida_' + str(len(self.corridas)) + '.pkl')
+        self.corridas.append(fn)
+        return fn
+
+    def agregarCorridas(self, fns):
+        """
+        Agrega corridas que ya fueron guardadas con :func:`~salida.escribirCorrida` (por ejemplo, por otro proceso).
+        Las asignaciones pendientes se guardan antes, para que se mezclen en el orden en que se agregaron.
+
+        :param fns: Ubicación de las corridas, en orden.
+        :type fns: list
+        :return: None
+        """
+        self.vaciar()
+        self.corridas += fns
+
+    def agregar(self, bloque):
+        """
+        :param bloque: Asignaciones a escribir.
+        :type bloque: BloqueAsignaciones
+        :return: None
+        """
+        if len(bloque) == 0:
+            return
+        self.pendientes.append(bloque)
+        self.numPendientes += len(bloque)
+        if self.numPendientes >= self.maxFilas:
+            self.vaciar()
+
+    def vaciar(self):
+        """
+        Ordena las asignaciones pendientes y las guarda en disco como una corrida.
+
+        :return: None
+        """
+        if self.numPendientes == 0:
+            return
+        escribirCorrida(BloqueAsignaciones.concatenar(self.pendientes), self.nuevaCorrida())
+        self.pendientes = []
+        self.numPendientes = 0
+
+    def cerrar(self):
+        """
+        Escribe todas las asignaciones en el archivo de salida y borra las corridas temporales.
+
+        :return: None
+        """
+        with PERFIL.etapa('orden final'):
+            if self.corridas:
+                self.vaciar()
+                filas = heapq.merge(*[leerCorrida(fn) for fn in self.corridas], key=lambda fila: fila[0])
+                partes = _partesMezcla(filas, self.columnar is not None)
+            else:
+                bloque = BloqueAsignaciones.concatenar(self.pendientes).ordenar()
+                partes = _partesBloque(bloque, _lineas(bloque), self.columnar is not None)
+        PERFIL.contar('corridas_temporales', len(self.corridas))
+        with PERFIL.etapa('escritura'):
+            filas = 0
+            f = open(self.fn, 'w', buffering=1 << 20)
+            f.write(ENCABEZADO)
+            for lineas, bloque in partes:
+                filas += len(lineas)
+                f.write("".join(lineas))
+                if self.columnar is not None:
+                    self.columnar.agregar(bloque)
+            f.close()
+            if self.columnar is not None:
+                self.columnar.cerrar()
+            PERFIL.contar('filas_escritas', filas)
+        self.pendientes = []
+        self.numPendientes = 0
+        self.borrarTemporal()
+
+    def borrarTemporal(self):
+        """
+        Borra el folder temporal con las corridas, si existe.
+
+        :return: None
+        """
+        if self.temporal is not None:
+            shutil.rmtree(self.temporal, ignore_errors=True)
+            self.temporal = None
+
+
+class EscritorColumnar:
+    """
+    Escribe las asignaciones en formato Parquet o Arrow IPC con columnas tipadas:
+    * IdPaciente como entero si los códigos de los pacientes se leyeron como enteros (ver
+      :func:`~salida.sonEnteros`), o como texto.
+    * codigoDependencia y tipo_vacuna como categorías (diccionarios).
+    * Dosis como int8 y orden como int64.
+    * fecha como date32.
+
+    Las asignaciones se reciben como arreglos ya ordenados por dependencia (ver :class:`~salida.EscritorAsignaciones`),
+    con los tipos con los que se calcularon, y ningún row group (Parquet) o record batch (Arrow) tiene filas de dos
+    clínicas, de modo que se puede leer el calendario de una clínica sin leer todo el archivo.
+    """
+    def __init__(self, fn, formato, dependencias, vacunas, ids_enteros=True, max_filas=1000000):
+        """
+        :param fn: Ubicación del archivo de salida.
+        :type fn: String
+        :param formato: 'parquet' o 'arrow'.
+        :type formato: String
+        :param dependencias: Códigos de todas las clínicas que pueden aparecer en las asignaciones.
+        :type dependencias: list
+        :param vacunas: Códigos de todas las vacunas que pueden aparecer en las asignaciones.
+        :type vacunas: list
+        :param ids_enteros: Opcional. Si es True los códigos de los pacientes se guardan como enteros.
+        :type ids_enteros: bool
+        :param max_filas: Opcional. Número máximo de filas por row group.
+        :type max_filas: int
+        """
+        if formato not in ('parquet', 'arrow'):
+            raise ValueError("Formato desconocido: " + str(formato))
+        pa = importarArrow()
+        self.pa = pa
+        self.maxFilas = max_filas
+        self.idsEnteros = ids_enteros
+        self.dependencias = pa.array(list(dict.fromkeys(dependencias)))
+        self.vacunas = pa.array(list(dict.fromkeys(vacunas)))
+        self.indiceDependencia = {str(d): i for i, d in enumerate(self.dependencias.to_pylist())}
+        self.indiceVacuna = {str(v): i for i, v in enumerate(self.vacunas.to_pylist())}
+        self.schema = pa.schema([(COLUMNAS[0], pa.int64() if ids_enteros else pa.string()),
+                                 (COLUMNAS[1], pa.dictionary(pa.int32(), self.dependencias.type)),
+                                 (COLUMNAS[2], pa.dictionary(pa.int32(), self.vacunas.type)),
+                                 (COLUMNAS[3], pa.int8()),
+                                 (COLUMNAS[4], pa.int64()),
+                                 (COLUMNAS[5], pa.date32())])
+        if formato == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(fn, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(fn, self.schema)
+        self.formato = formato
+        self.pendientes = []
+        self.numFilas = 0
+        self.actual = None
+
+    def agregar(self, bloque):
+        """
+        :param bloque: Asignaciones a escribir, ordenadas por dependencia.
+        :type bloque: BloqueAsignaciones
+        :return: None
+        """
+        dependencias = np.array([str(d) for d in bloque.dependencias.tolist()], dtype=object)
+        cortes = np.flatnonzero(dependencias[1:] != dependencias[:-1]) + 1
+        for inicio, fin in zip([0] + cortes.tolist(), cortes.tolist() + [len(bloque)]):
+            while inicio < fin:
+                if dependencias[inicio] != self.actual or self.numFilas >= self.maxFilas:
+                    self.vaciar()
+                    self.actual = dependencias[inicio]
+                parte = min(fin, inicio + self.maxFilas - self.numFilas)
+                self.pendientes.append(bloque.getParte(inicio, parte))
+                self.numFilas += parte - inicio
+                inicio = parte
+
+    def vaciar(self):
+        """
+        Escribe las asignaciones pendientes, que son todas de la misma clínica, como un row group o record batch.
+
+        :return: None
+        """
+        if self.numFilas == 0:
+            return
+        pa = self.pa
+        bloque = BloqueAsignaciones.concatenar(self.pendientes)
+        if self.idsEnteros:
+            ids = bloque.ids.astype(np.int64)
+        else:
+            ids = np.array([str(i) for i in bloque.ids.tolist()], dtype=object)
+        dependencias = np.full(len(bloque), self.indiceDependencia[self.actual], dtype=np.int32)
+        vacunas = np.array([self.indiceVacuna[str(v)] for v in bloque.vacunas.tolist()], dtype=np.int32)
+        batch = pa.RecordBatch.from_arrays([pa.array(ids, self.schema.field(0).type),
+                                            pa.DictionaryArray.from_arrays(dependencias, self.dependencias),
+                                            pa.DictionaryArray.from_arrays(vacunas, self.vacunas),
+                                            pa.array(bloque.dosis.astype(np.int8)),
+                                            pa.array(bloque.ordenes.astype(np.int64)),
+                                            pa.array(bloque.fechas.astype('datetime64[D]'), pa.date32())],
+                                           schema=self.schema)
+        if self.formato == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(bloque))
+        else:
+            self.writer.write_batch(batch)
+        self.pendientes = []
+        self.numFilas = 0
+
+    def cerrar(self):
+        """
+        Escribe las filas pendientes y cierra el archivo.
+
+        :return: None
+        """
+        self.vaciar()
+        self.writer.close()
+
+
+def escribirAsignaciones(fn, bloque):
+    """
+    Ordena las asignaciones de *bloque* por dependencia, fecha, dosis y orden, y las escribe en el archivo *fn* en el
+    mismo formato que :class:`~asignaciones.Asignacion`.
+
+    :param fn: Ubicación del archivo de salida.
+    :type fn: String
+    :param bloque: Asignaciones a escribir.
+    :type bloque: BloqueAsignaciones
+    :return: None
+    """
+    escritor = EscritorAsignaciones(fn)
+    escritor.agregar(bloque)
+    escritor.cerrar()
+
+
+def escribirCambios(fn, anterior, nuevo):
+    """
+    Escribe en el archivo *fn* las diferencias entre dos conjuntos de asignaciones, con el mismo formato que
+    ``asignaciones.csv`` y una columna ``cambio`` al inicio: '-' para las asignaciones de *anterior* que ya no están
+    en *nuevo*, y '+' para las de *nuevo* que no estaban en *anterior*. Las filas se ordenan igual que en
+    ``asignaciones.csv``; si dos filas tienen la misma llave la que se quita va primero.
+
+    :param fn: Ubicación del archivo de salida.
+    :type fn: String
+    :param anterior: Asignaciones anteriores.
+    :type anterior: BloqueAsignaciones
+    :param nuevo: Asignaciones nuevas.
+    :type nuevo: BloqueAsignaciones
+    :return: Número de filas escritas.
+    :rtype: int
+    """
+    filas_anteriores = list(_filasConLlave(anterior))
+    filas_nuevas = list(_filasConLlave(nuevo))
+    lineas_anteriores = set(linea for _, linea in filas_anteriores)
+    lineas_nuevas = set(linea for _, linea in filas_nuevas)
+    bajas = [(llave, 0, "-," + linea) for llave, linea in filas_anteriores if linea not in lineas_nuevas]
+    altas = [(llave, 1, "+," + linea) for llave, linea in filas_nuevas if linea not in lineas_anteriores]
+    f = open(fn, 'w', buffering=1 << 20)
+    f.write("cambio," + ENCABEZADO)
+    for _, _, linea in heapq.merge(bajas, altas):
+        f.write(linea)
+    f.close()
+    return len(bajas) + len(altas)
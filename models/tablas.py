@@ -0,0 +1,143 @@
+"""
+=========
+tablas.py
+=========
+
+Métodos para leer archivos CSV pequeños (vacunas, lotes, clínicas, prioridades y vacunados de pocas filas) con el
+módulo csv de Python, sin importar pandas. Importar pandas toma más tiempo que leer estos archivos, por lo que solo se
+importa cuando se lee un archivo grande como el de pacientes. El método :func:`~tablas.leerColumnas` lee las columnas
+de un archivo y convierte los valores de cada columna igual que ``pandas.read_csv`` (enteros, números reales,
+booleanos o textos, y NaN en los vacíos), :func:`~tablas.leerFilas` devuelve las filas como diccionarios, y
+:func:`~tablas.arreglo` convierte una columna en un arreglo de NumPy del mismo tipo que tendría en pandas.
+Estos métodos son utilizados por los métodos ``read*`` de los modelos y de :mod:helper.py.
+"""
+import csv
+import math
+
+import numpy as np
+
+# Tamaño en bytes a partir del cual los archivos que pueden ser grandes (como vacunados.csv) se leen con pandas.
+TAMANO_ARCHIVO_PEQUENO = 4 * 1024 ** 2
+
+# Valores que pandas.read_csv lee como NaN.
+VALORES_NAN = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+               'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+_BOOLEANOS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+# Límites de los enteros que caben en una columna int64.
+_MIN_INT64 = -2 ** 63
+_MAX_INT64 = 2 ** 63 - 1
+
+
+def _numero(convertir, v):
+    # A diferencia de int y float, pandas no acepta guiones bajos entre los dígitos ni otras formas de escribir NaN.
+    if '_' in v:
+        raise ValueError(v)
+    numero = convertir(v)
+    if numero != numero:
+        raise ValueError(v)
+    return numero
+
+
+def convertirColumna(valores):
+    """
+    Convierte los textos leidos de una columna igual que ``pandas.read_csv``: si todos los valores son enteros la
+    columna es de enteros; si son números (o hay vacíos entre los enteros) es de números reales con NaN en los
+    vacíos, salvo que algún entero no quepa en int64, en cuyo caso se conservan los enteros; si son booleanos es de
+    booleanos con NaN en los vacíos; si no, es de textos con NaN en los vacíos. Igual que pandas, los enteros que
+    solo caben en uint64 junto a negativos o vacíos dejan la columna como textos sin convertir.
+
+    :param valores: Textos de la columna.
+    :type valores: list
+    :return: Los valores convertidos.
+    :rtype: list
+    """
+    vacios = [v in VALORES_NAN for v in valores]
+    llenos = [v for v, vacio in zip(valores, vacios) if not vacio]
+    try:
+        enteros = [_numero(int, v) for v in llenos]
+        if any(_MAX_INT64 < n < 2 ** 64 for n in enteros) and \
+                (any(vacios) or any(v.lstrip().startswith('-') for v in llenos)):
+            # Enteros que solo caben en uint64 junto a negativos o vacíos: pandas deja la columna como textos.
+            return list(valores)
+        if not any(vacios) or not all(_MIN_INT64 <= n <= _MAX_INT64 for n in enteros):
+            numeros = iter(enteros)
+            return [math.nan if vacio else next(numeros) for vacio in vacios]
+    except ValueError:
+        pass
+    if llenos and all(v in _BOOLEANOS for v in llenos):
+        return [math.nan if vacio else _BOOLEANOS[v] for v, vacio in zip(valores, vacios)]
+    try:
+        numeros = iter([_numero(float, v) for v in llenos])
+        return [math.nan if vacio else next(numeros) for vacio in vacios]
+    except ValueError:
+        return [math.nan if vacio else v for v, vacio in zip(valores, vacios)]
+
+
+def leerColumnas(fn, columnas=None):
+    """
+    Lee el archivo CSV *fn*, con la primera línea como encabezado.
+
+    :param fn: Ubicación del archivo.
+    :type fn: String
+    :param columnas: Opcional. Nombres de las columnas a leer. Si no se da se leen todas.
+    :type columnas: list
+    :return: Diccionario con llave el nombre de la columna (en el orden del archivo) y valor la lista de sus valores
+        convertidos con :func:`~tablas.convertirColumna`.
+    :rtype: dict
+    :raises ValueError: Si falta alguna de las *columnas* en el archivo.
+    """
+    with open(fn, encoding="latin", newline='') as f:
+        lector = csv.reader(f)
+        encabezado = next(lector, [])
+        # Igual que pandas, las columnas sin nombre se llaman "Unnamed: i".
+        nombres = [nombre if nombre != '' else 'Unnamed: ' + str(i) for i, nombre in enumerate(encabezado)]
+        if columnas is None:
+            indices = list(range(len(nombres)))
+        else:
+            faltantes = [c for c in columnas if c not in nombres]
+            if faltantes:
+                raise ValueError("Faltan las columnas " + ", ".join(faltantes) + " en " + fn)
+            indices = [i for i, nombre in enumerate(nombres) if nombre in columnas]
+        valores = [[] for _ in indices]
+        for fila in lector:
+            if not fila:
+                continue
+            for lista, i in zip(valores, indices):
+                lista.append(fila[i] if i < len(fila) else '')
+    return {nombres[i]: convertirColumna(lista) for i, lista in zip(indices, valores)}
+
+
+def leerFilas(fn):
+    """
+    :param fn: Ubicación del archivo CSV.
+    :type fn: String
+    :return: Las filas del archivo como diccionarios con llave el nombre de la columna (ver
+        :func:`~tablas.leerColumnas`).
+    :rtype: list
+    """
+    tabla = leerColumnas(fn)
+    return [dict(zip(tabla, fila)) for fila in zip(*tabla.values())]
+
+
+def arreglo(valores):
+    """
+    :param valores: Valores convertidos de una columna (ver :func:`~tablas.convertirColumna`).
+    :type valores: list
+    :return: La columna como arreglo de NumPy con el mismo tipo que le da pandas: int64, uint64 (si hay enteros que
+        no caben en int64), float64, bool u object.
+    :rtype: numpy.ndarray
+    """
+    if all(type(v) is int for v in valores):
+        if all(_MIN_INT64 <= v <= _MAX_INT64 for v in valores):
+            return np.array(valores, dtype=np.int64)
+        if all(0 <= v < 2 ** 64 for v in valores):
+            return np.array(valores, dtype=np.uint64)
+    if all(type(v) is float for v in valores):
+        return np.array(valores, dtype=np.float64)
+    if all(type(v) is bool for v in valores):
+        return np.array(valores, dtype=bool)
+    result = np.empty(len(valores), dtype=object)
+    result[:] = valores
+    return result
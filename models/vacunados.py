@@ -4,81 +4,242 @@ vacunados.py
 ============
 
 Clase encargada de leer y mantener los datos acerca de los pacientes ya vacunados. Consta de una clase llamada
-:class:`~vacunados.Vacunado` que guarda todos los valores relevantes a los pacientes, y el método
-:func:`~vacunados.readVacunados` que lee los datos del archivo con la información de los pacientes y los graba en una
-instancia de la clase Vacunado.
+:class:`~vacunados.TablaVacunados` que guarda a los vacunados como columnas, el método
+:func:`~vacunados.leerVacunadosPorPartes` que lee el archivo de vacunados por partes, y la clase
+:class:`~vacunados.ResumenVacunados` que lleva las cuentas de todos los vacunados que necesita la actualización.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores acerca
-de las pacientes vacunados.
+de las pacientes vacunados. Los archivos de pocos vacunados se leen sin pandas (ver :mod:`~tablas`), de modo que
+una corrida con -u que no tiene muchos vacunados no tiene que importar pandas.
 """
-import pandas as pd
+import collections
 import datetime
+import os
 
+import numpy as np
 
-class Vacunado:
+from models.salida import sonEnteros
+from models.tablas import TAMANO_ARCHIVO_PEQUENO, leerColumnas, arreglo
+
+
+class TablaVacunados:
     """
-    Guarda la información de un paciente vacunado:
-    * Código del paciente
-    * Clínica de vacunación
-    * Fecha de Vacunación
-    * Vacuna utilizada
+    Guarda la información de muchos pacientes vacunados en arreglos, una columna por campo de ``vacunados.csv``:
+    * Código de cada paciente.
+    * Clínica de vacunación.
+    * Fecha de vacunación (datetime64[D]).
+    * Vacuna utilizada.
     """
-    def __init__(self, codigo, clinica, fecha, vacuna):
-        self.codigo = codigo
-        self.clinica = clinica
-        self.fecha = fecha
-        self.vacuna = vacuna
+    def __init__(self, codigos, clinicas, fechas, vacunas):
+        self.codigos = codigos
+        self.clinicas = clinicas
+        self.fechas = fechas
+        self.vacunas = vacunas
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def getCodigos(self):
+        """
+        :return: El código de cada paciente vacunado.
+        :rtype: numpy.ndarray
+        """
+        return self.codigos
+
+    def getClinicas(self):
+        """
+        :return: El código de la clínica donde se vacunó cada paciente.
+        :rtype: numpy.ndarray
+        """
+        return self.clinicas
+
+    def getFechas(self):
+        """
+        :return: La fecha en la que se vacunó cada paciente.
+        :rtype: numpy.ndarray
+        """
+        return self.fechas
 
-    def getCodigo(self):
+    def getVacunas(self):
         """
-        :return: El codigo del paciente vacunado
-        :rtype: String
+        :return: El código de la vacuna que recibió cada paciente.
+        :rtype: numpy.ndarray
         """
-        return self.codigo
+        return self.vacunas
 
-    def getClinica(self):
+    @staticmethod
+    def desdeDataFrame(df):
         """
-        :return: El codigo de la clínica donde el paciente fue vacunado
-        :rtype: String
+        :param df: Tabla leida de ``vacunados.csv``.
+        :type df: DataFrame
+        :return: Los vacunados de *df* como columnas.
+        :rtype: TablaVacunados
         """
-        return self.clinica
+        import pandas as pd
+        fechas = pd.to_datetime(df['fecha'], format="%d/%m/%Y").to_numpy().astype('datetime64[D]')
+        return TablaVacunados(df['codigo'].to_numpy(), df['clinica'].to_numpy(), fechas, df['vacuna'].to_numpy())
 
-    def getFecha(self):
+    @staticmethod
+    def desdeColumnas(columnas):
         """
-        :return: La fecha cuando el paciente fue vacunado.
-        :rtype: Datetime
+        :param columnas: Columnas leidas de ``vacunados.csv`` con :func:`~tablas.leerColumnas`.
+        :type columnas: dict
+        :return: Los vacunados de *columnas* como arreglos del mismo tipo que con
+            :meth:`~vacunados.TablaVacunados.desdeDataFrame`.
+        :rtype: TablaVacunados
         """
-        return self.fecha
+        # Las fechas se repiten mucho, por lo que cada texto distinto se convierte una sola vez.
+        dias = {}
+        for texto in columnas['fecha']:
+            if texto not in dias:
+                dias[texto] = datetime.datetime.strptime(texto, "%d/%m/%Y").date() if isinstance(texto, str) else None
+        fechas = np.array([dias[texto] for texto in columnas['fecha']], dtype='datetime64[D]')
+        return TablaVacunados(arreglo(columnas['codigo']), arreglo(columnas['clinica']), fechas,
+                              arreglo(columnas['vacuna']))
 
-    def getVacuna(self):
+    def getParte(self, inicio, fin):
         """
-        :return: El codigo de la vacuna utilizada
-        :rtype: int
+        :return: Los vacunados entre las posiciones *inicio* y *fin*.
+        :rtype: TablaVacunados
         """
-        return self.vacuna
+        return TablaVacunados(self.codigos[inicio:fin], self.clinicas[inicio:fin], self.fechas[inicio:fin],
+                              self.vacunas[inicio:fin])
+
 
+# Número de filas de vacunados.csv que se leen a la vez.
+TAMANO_PARTE = 250000
 
-def readVacunados(fn, verbose=False, debug=False):
+
+def leerVacunadosPorPartes(fn, tamano=TAMANO_PARTE, verbose=False, debug=False):
     """
-    Lee la información de los pacientes vacunados disponible en el archivo *fn* y la guarda en un objeto
-    tipo :class:`~vacunados.Vacunado`.
+    Lee la información de los pacientes vacunados disponible en el archivo *fn* por partes de a lo más *tamano*
+    filas, de modo que la memoria utilizada no depende del tamaño del archivo. Cada parte se devuelve como columnas
+    en una :class:`~vacunados.TablaVacunados`, sin crear un objeto por paciente. Los archivos de menos de
+    :data:`~tablas.TAMANO_ARCHIVO_PEQUENO` bytes se leen de una vez sin pandas.
 
     :param fn: Ubicación del archivo con la información de los pacientes vacunados.
     :type fn: String
+    :param tamano: Opcional. Número máximo de filas de cada parte.
+    :type tamano: int
     :param verbose: Opcional. Si es verdadero muestra información adicional al correrse.
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
-    :return: Lista de pacientes vacunados con las variables leidas del archivo.
-    :rtype: list
+    :return: Generador de tablas con los pacientes vacunados, en el orden del archivo.
+    :rtype: generator
     """
-    df = pd.read_csv(fn, encoding="latin")
-    resultados = []
-    i = 0
-    for row in df.iterrows():
-        i += 1
-        v = Vacunado(row[1]['codigo'], row[1]['clinica'], datetime.datetime.strptime(row[1]['fecha'], "%d/%m/%Y"),
-                     row[1]['vacuna'])
-        resultados.append(v)
+    total = 0
+    columnas = ['codigo', 'clinica', 'fecha', 'vacuna']
+    if os.path.getsize(fn) <= TAMANO_ARCHIVO_PEQUENO:
+        tabla = TablaVacunados.desdeColumnas(leerColumnas(fn, columnas))
+        for inicio in range(0, len(tabla), tamano):
+            parte = tabla.getParte(inicio, inicio + tamano)
+            if debug:
+                print(parte.getCodigos())
+            total += len(parte)
+            yield parte
+    else:
+        import pandas as pd
+        # El lector se cierra a mano: se puede usar con "with" solo desde pandas 1.2.
+        partes = pd.read_csv(fn, encoding="latin", usecols=columnas, chunksize=tamano)
+        try:
+            for df in partes:
+                if debug:
+                    print(df)
+                total += len(df)
+                yield TablaVacunados.desdeDataFrame(df)
+        finally:
+            partes.close()
     if verbose:
-        print('Leidos ' + str(i) + ' vacunados...')
-    return resultados
+        print('Leidos ' + str(total) + ' vacunados...')
+
+
+class ResumenVacunados:
+    """
+    Lleva la cuenta de los pacientes vacunados conforme se leen por partes (ver
+    :func:`~vacunados.leerVacunadosPorPartes`), sin guardar a los pacientes:
+    * Número de vacunados por clínica, en el orden en que aparece cada clínica.
+    * Vacunas utilizadas, en el orden en que aparece cada vacuna.
+    * Número de primeras dosis por clínica y día (ver :func:`~calendario.numeroDia`).
+    * Número de segundas dosis por clínica y día en el que le toca.
+    * Si todos los códigos de los pacientes son números enteros.
+    """
+    def __init__(self):
+        self.total = 0
+        self.porClinica = {}
+        self.vacunas = {}
+        self.primeras = {}
+        self.segundas = {}
+        self.idsEnteros = True
+
+    def __len__(self):
+        return self.total
+
+    def getPorClinica(self):
+        """
+        :return: Diccionario con llave el código de la clínica y valor el número de pacientes vacunados en ella.
+        :rtype: dict
+        """
+        return self.porClinica
+
+    def getVacunas(self):
+        """
+        :return: Códigos de las vacunas utilizadas, en el orden en que aparecen.
+        :rtype: list
+        """
+        return list(self.vacunas)
+
+    def getPrimeras(self):
+        """
+        :return: Diccionario con llave (código de la clínica, día) y valor el número de primeras dosis aplicadas.
+        :rtype: dict
+        """
+        return self.primeras
+
+    def getSegundas(self):
+        """
+        :return: Diccionario con llave (código de la clínica, día) y valor el número de segundas dosis que tocan ese
+            día.
+        :rtype: dict
+        """
+        return self.segundas
+
+    def getIdsEnteros(self):
+        """
+        :return: True si todos los códigos de los pacientes son números enteros.
+        :rtype: bool
+        """
+        return self.idsEnteros
+
+    @staticmethod
+    def _contar(conteo, llaves):
+        # Igual que al agrupar con pandas, no se cuentan las llaves vacías (NaN o NaT).
+        for llave, n in collections.Counter(llaves).items():
+            if all(valor is not None and valor == valor for valor in (llave if type(llave) is tuple else (llave,))):
+                conteo[llave] = conteo.get(llave, 0) + n
+
+    @staticmethod
+    def _dias(fechas):
+        # Los días como enteros de Python, con None en lugar de NaT para no contarlos.
+        dias = fechas.astype(np.int64)
+        vacias = np.isnat(fechas)
+        if not vacias.any():
+            return dias.tolist()
+        return [None if vacia else dia for dia, vacia in zip(dias.tolist(), vacias.tolist())]
+
+    def agregar(self, vacunados, fechas2):
+        """
+        Agrega a las cuentas una parte de los pacientes vacunados.
+
+        :param vacunados: Pacientes vacunados.
+        :type vacunados: TablaVacunados
+        :param fechas2: Fecha en la que le toca la segunda dosis a cada paciente, como datetime64[D].
+        :type fechas2: numpy.ndarray
+        :return: None
+        """
+        self.total += len(vacunados)
+        clinicas = vacunados.getClinicas().tolist()
+        ResumenVacunados._contar(self.porClinica, clinicas)
+        self.vacunas.update(dict.fromkeys(vacunados.getVacunas().tolist()))
+        ResumenVacunados._contar(self.primeras, zip(clinicas, ResumenVacunados._dias(vacunados.getFechas())))
+        ResumenVacunados._contar(self.segundas, zip(clinicas, ResumenVacunados._dias(fechas2)))
+        self.idsEnteros = self.idsEnteros and sonEnteros(vacunados.getCodigos())
@@ -10,7 +10,7 @@ instancia de la clase Vacuna.
 Esta clase es utilizada por el programa principal :mod:main.py únicamente al inicio para cargar los valores acerca
 de las vacunas.
 """
-import pandas as pd
+from models.tablas import leerFilas
 
 
 class Vacuna:
@@ -99,7 +99,7 @@ class Vacuna:
         return self.dosis
 
 
-def readVacunas(fn, verbose=False, debug=False):
+def readVacunas(fn, verbose=False, debug=False, cache=None):
     """
     Lee la información de las vacunas disponible en el archivo *fn* y la guarda en un objeto
     tipo :class:`~vacunas.Vacuna`.
@@ -110,27 +110,37 @@ def readVacunas(fn, verbose=False, debug=False):
     :type verbose: Boolean
     :param debug: Opcional. Si es verdadero muestra información útil para la depuración.
     :type debug: Boolean
+    :param cache: Opcional. Si se da, los datos se leen de la cache cuando el archivo no ha cambiado.
+    :type cache: CacheEntradas
     :return: Lista de Vacunas con las variables leidas del archivo.
     :rtype: list
     """
-    df = pd.read_csv(fn, encoding="latin")
+    if cache is not None:
+        llave = cache.llave('vacunas', [fn])
+        entrada = cache.leer(llave)
+        if entrada is not None:
+            if verbose:
+                print('Leidas ' + str(len(entrada[1])) + ' tipos de vacunas de la cache...')
+            return entrada[1]
     result = {}
     i = 0
-    for row in df.iterrows():
+    for row in leerFilas(fn):
         i += 1
         if debug:
-            print(row[1]['marca'])
+            print(row['marca'])
         v = Vacuna()
-        v.setId(row[1]['id_marca'])
-        v.setMarca(row[1]['marca'])
-        v.setDosis(int(row[1]['dosis']))
-        if row[1]['tiempo_dosis (semanas)'] != "":
-            v.setTiempo(float(row[1]['tiempo_dosis (semanas)']))
+        v.setId(row['id_marca'])
+        v.setMarca(row['marca'])
+        v.setDosis(int(row['dosis']))
+        if row['tiempo_dosis (semanas)'] != "":
+            v.setTiempo(float(row['tiempo_dosis (semanas)']))
         else:
             v.setTiempo(-1.0)
-        v.setTemp(row[1]['temp_conserv'])
-        v.setObs(row[1]['observaciones'])
+        v.setTemp(row['temp_conserv'])
+        v.setObs(row['observaciones'])
         result[v.getId()] = v
     if verbose:
         print('Leidas ' + str(i) + ' tipos de vacunas...')
+    if cache is not None:
+        cache.guardar(llave, {}, result)
     return result
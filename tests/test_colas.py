@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from models.colas import ColaPacientes, ColaSeleccion, seleccionarPrimeros
+
+
+def prioridadesDePrueba(generador, n):
+    # Pocas prioridades distintas para que haya muchos empates, y algunos pacientes sin prioridad (NaN).
+    prioridades = generador.integers(0, 5, n).astype(np.float64)
+    prioridades[generador.random(n) < 0.2] = np.nan
+    return prioridades
+
+
+@pytest.mark.parametrize('n', [0, 1, 7, 100])
+def test_seleccionarPrimeros_igual_que_lexsort(n):
+    generador = np.random.default_rng(n)
+    for _ in range(20):
+        prioridades = prioridadesDePrueba(generador, n)
+        # lexsort es estable y deja los NaN al final, igual que ordenar a todos los pacientes.
+        esperado = np.lexsort((np.arange(n), prioridades))
+        for k in sorted({0, 1, n // 3, n // 2, n - 1, n, n + 5}):
+            primeros, resto = seleccionarPrimeros(prioridades, k)
+            assert primeros.tolist() == esperado[:max(k, 0)].tolist()
+            assert resto.tolist() == sorted(esperado[max(k, 0):].tolist())
+
+
+def test_seleccionarPrimeros_k_cero_y_mayor():
+    prioridades = np.array([3., np.nan, 1., 1., np.nan, 0.])
+    primeros, resto = seleccionarPrimeros(prioridades, 0)
+    assert primeros.tolist() == [] and resto.tolist() == list(range(6))
+    for k in (6, 10):
+        primeros, resto = seleccionarPrimeros(prioridades, k)
+        assert primeros.tolist() == [5, 2, 3, 0, 1, 4] and resto.tolist() == []
+
+
+def test_ColaSeleccion_igual_que_lexsort():
+    generador = np.random.default_rng(1)
+    prioridades = prioridadesDePrueba(generador, 200)
+    codigos = np.arange(1000, 1200)
+    cola = ColaSeleccion(codigos, np.arange(200), prioridades, 30)
+    sacados = np.concatenate([cola.take(25), cola.take(50), cola.take(500)])
+    assert sacados.tolist() == codigos[np.lexsort((np.arange(200), prioridades))].tolist()
+
+
+def test_ColaPacientes_desde_cursor_guardado():
+    codigos = np.arange(1000, 1050)
+    indices = np.random.default_rng(2).permutation(50)
+    cola = ColaPacientes(codigos, indices)
+    cola.take(7)
+    cola.pop()
+    copia = ColaPacientes(codigos, indices, cola.getCursor())
+    assert copia.peek() == cola.peek()
+    assert copia.take(100).tolist() == cola.take(100).tolist()
@@ -0,0 +1,177 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from generador import generarEntradas
+from main import calcularTomas
+from models.estado import ARREGLOS, leerEstado
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'main.py')
+
+
+def tomasPorRondas(rondas, restantes):
+    """
+    Cuenta los pacientes que toma cada clínica recorriendo el lote ronda por ronda, igual que computeAsignaciones.
+    """
+    restantes = list(restantes)
+    tomas = [0] * len(restantes)
+    pendientes = sum(restantes)
+    while rondas > 1:
+        for j, left in enumerate(restantes):
+            if left > 0:
+                restantes[j] -= 1
+                tomas[j] += 1
+                rondas -= 1
+                pendientes -= 1
+        if pendientes <= 0:
+            break
+    return tomas
+
+
+@pytest.mark.parametrize('rondas', [-5, 0, 1])
+def test_calcularTomas_lote_sobregirado(rondas):
+    # Un lote que quedó negativo en una fase anterior (ver Existencias) no se usa.
+    assert calcularTomas(rondas, np.array([3, 5, 1])).tolist() == [0, 0, 0]
+
+
+def test_calcularTomas_capacidad_cero_o_negativa():
+    restantes = np.array([3, 0, -2, 5, 1])
+    tomas = calcularTomas(20, restantes)
+    assert tomas.tolist() == tomasPorRondas(20, restantes)
+    assert tomas[1] == 0 and tomas[2] == 0
+    # Las capacidades negativas cuentan para terminar la fase: solo faltan 7 vacunas en total.
+    assert tomas.sum() == 7
+    assert calcularTomas(10, np.array([0, -1, 0])).tolist() == [0, 0, 0]
+
+
+def test_calcularTomas_igual_que_por_rondas():
+    generador = np.random.default_rng(0)
+    for _ in range(500):
+        restantes = generador.integers(-3, 8, generador.integers(1, 8))
+        rondas = int(generador.integers(-2, 40))
+        assert calcularTomas(rondas, restantes).tolist() == tomasPorRondas(rondas, restantes)
+
+
+@pytest.fixture(scope='module')
+def entradas(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('entradas'))
+    generarEntradas(ruta, num_pacientes=3000, num_clinicas=12)
+    return ruta
+
+
+def correr(ruta, argumentos):
+    fn = os.path.join(ruta, 'asignaciones.csv')
+    if os.path.exists(fn):
+        os.remove(fn)
+    subprocess.run([sys.executable, MAIN] + argumentos, cwd=ruta, check=True, stdout=subprocess.DEVNULL)
+    with open(fn) as f:
+        return f.read()
+
+
+def test_modos_igual_resultado(entradas):
+    esperado = correr(entradas, [])
+    assert len(esperado.splitlines()) > 1
+    for argumentos in (['-b'], ['-j', '2'], ['-x'], ['-s']):
+        assert correr(entradas, argumentos) == esperado, argumentos
+
+
+def replanificar(ruta, directorio):
+    subprocess.run([sys.executable, MAIN, '-i', directorio], cwd=ruta, check=True, stdout=subprocess.DEVNULL)
+    return leerEstado(os.path.join(ruta, directorio))
+
+
+def agregarFilas(fn, filas):
+    with open(fn, 'a') as f:
+        f.writelines(','.join(fila) + '\n' for fila in filas)
+
+
+def assertMismoEstado(estado, esperado):
+    assert estado.getFirma() == esperado.getFirma()
+    for nombre in ARREGLOS:
+        assert getattr(estado, nombre).tolist() == getattr(esperado, nombre).tolist(), nombre
+    assert estado.getCursores() == esperado.getCursores()
+    assert estado.getHuellas() == esperado.getHuellas()
+    assert estado.getExcluidos() == esperado.getExcluidos()
+
+
+@pytest.fixture
+def entradasIncremental(tmp_path):
+    ruta = str(tmp_path)
+    generarEntradas(ruta, num_pacientes=3000, num_clinicas=12)
+    return ruta
+
+
+def test_incremental_igual_que_plan_completo(entradasIncremental):
+    ruta = entradasIncremental
+    anterior = replanificar(ruta, 'estado')
+    # Se excluyen pacientes con lugar en varias clínicas, y otros sin lugar.
+    excluir = anterior.ids[::97].tolist() + ['999999999']
+    agregarFilas(os.path.join(ruta, 'excluir.csv'), [[codigo, 'Prueba'] for codigo in excluir])
+    estado = replanificar(ruta, 'estado')
+    assert os.path.exists(os.path.join(ruta, 'asignaciones_cambios.csv'))
+    assert not set(excluir) & set(estado.ids.tolist())
+    assertMismoEstado(estado, replanificar(ruta, 'estado_nuevo'))
+
+
+def test_incremental_vacunados_conservan_lugar(entradasIncremental):
+    ruta = entradasIncremental
+    anterior = replanificar(ruta, 'estado')
+    clinica = anterior.dependencias[0]
+    lugares = anterior.getLugares(clinica)
+    vacunados, excluir = lugares[:3], lugares[3:6]
+    agregarFilas(os.path.join(ruta, 'vacunados.csv'),
+                 [[anterior.ids[i], str(clinica), '01/03/2021', str(anterior.vacunas[i])] for i in vacunados])
+    agregarFilas(os.path.join(ruta, 'excluir.csv'), [[anterior.ids[i], 'Prueba'] for i in excluir])
+    estado = replanificar(ruta, 'estado')
+    # La clínica se volvió a asignar, pero los vacunados conservan su lugar y no toman otro.
+    assert not set(anterior.ids[excluir].tolist()) & set(estado.ids.tolist())
+    assert estado.ids[vacunados].tolist() == anterior.ids[vacunados].tolist()
+    assert all(estado.ids.tolist().count(codigo) == 1 for codigo in anterior.ids[vacunados].tolist())
+
+
+def test_incremental_replanifica_todo_si_cambia_la_firma(entradasIncremental):
+    ruta = entradasIncremental
+    anterior = replanificar(ruta, 'estado')
+    fn = os.path.join(ruta, 'lote_vacunas.csv')
+    with open(fn) as f:
+        lineas = f.read().splitlines()
+    # Un lote con la mitad de las vacunas cambia los lugares de todo el plan.
+    campos = lineas[1].split(',')
+    campos[3] = str(int(campos[3]) // 2)
+    lineas[1] = ','.join(campos)
+    with open(fn, 'w') as f:
+        f.write('\n'.join(lineas) + '\n')
+    estado = replanificar(ruta, 'estado')
+    assert estado.getFirma() != anterior.getFirma()
+    assert os.path.exists(os.path.join(ruta, 'asignaciones_cambios.csv'))
+    assertMismoEstado(estado, replanificar(ruta, 'estado_nuevo'))
+
+
+def test_padron_en_path_de_entrada(tmp_path):
+    ruta = str(tmp_path / 'datos')
+    generarEntradas(ruta, num_pacientes=500, num_clinicas=4)
+    # El programa se corre desde otro folder, con una copia de config.txt que apunta a los datos.
+    corrida = tmp_path / 'corrida'
+    corrida.mkdir()
+    with open(os.path.join(ruta, 'config.txt')) as f:
+        config = f.read().splitlines()
+    fn_config = str(corrida / 'config.txt')
+    with open(fn_config, 'w') as f:
+        f.write('\n'.join(config) + '\n')
+    subprocess.run([sys.executable, MAIN, '-p', 'padron'], cwd=str(corrida), check=True, stdout=subprocess.DEVNULL)
+    assert os.path.isdir(os.path.join(ruta, 'padron'))
+    config = ['padron #' if linea.startswith('pacientes.csv') else linea for linea in config]
+    with open(fn_config, 'w') as f:
+        f.write('\n'.join(config) + '\n')
+    subprocess.run([sys.executable, MAIN], cwd=str(corrida), check=True, stdout=subprocess.DEVNULL)
+    # Con otro peso de prioridad el padrón ya no sirve y el programa termina con un error, sin traceback.
+    config[3] = '2' + config[3][1:]
+    with open(fn_config, 'w') as f:
+        f.write('\n'.join(config) + '\n')
+    corrida = subprocess.run([sys.executable, MAIN], cwd=str(corrida), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             text=True)
+    assert corrida.returncode == 1
+    assert 'Error: El padrón' in corrida.stdout and 'Traceback' not in corrida.stderr
@@ -0,0 +1,22 @@
+import json
+
+from models.progreso import Progreso
+
+
+def test_fin_sin_datos_de_fase(tmp_path):
+    fn = str(tmp_path / 'avance.jsonl')
+    progreso = Progreso()
+    progreso.activar(fn)
+    progreso.iniciar({'n1a': 10, 'n1b': 5})
+    for fase, n in (('n1a', 10), ('n1b', 4)):
+        progreso.iniciarFase(fase)
+        progreso.avanzar(n)
+        progreso.terminarFase()
+    progreso.terminar()
+    with open(fn) as f:
+        lineas = [json.loads(linea) for linea in f]
+    assert [linea['evento'] for linea in lineas] == ['inicio', 'fase', 'fin_fase', 'fase', 'fin_fase', 'fin']
+    assert lineas[-2]['fase'] == 'n1b' and lineas[-2]['asignados_fase'] == 4
+    fin = lineas[-1]
+    assert fin['fase'] is None and fin['asignados_fase'] == 0 and fin['dosis_restantes_fase'] == 0
+    assert fin['asignados'] == 14
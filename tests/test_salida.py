@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from models.asignaciones import BloqueAsignaciones
+from models.calendario import fechasDeDias
+from models.salida import EscritorAsignaciones, EscritorColumnar, sonEnteros
+
+
+def bloqueDePrueba(ids):
+    n = len(ids)
+    generador = np.random.default_rng(0)
+    return BloqueAsignaciones(ids, generador.choice(np.array([1, 2]), n), np.full(n, 1, dtype=np.int8),
+                              generador.choice(np.array(['1000', '2000', '3000'], dtype=object), n),
+                              np.arange(1, n + 1, dtype=np.int64), fechasDeDias(generador.integers(18700, 18710, n)))
+
+
+def escribir(tmp_path, nombre, bloque, max_filas, columnar=None):
+    fn = str(tmp_path / nombre)
+    escritor = EscritorAsignaciones(fn, max_filas, str(tmp_path), columnar=columnar)
+    for i in range(0, len(bloque), 7):
+        escritor.agregar(bloque.getParte(i, i + 7))
+    escritor.cerrar()
+    with open(fn) as f:
+        return f.read()
+
+
+def test_sonEnteros():
+    assert sonEnteros(np.array([1, 2, 3]))
+    assert sonEnteros(np.array([1, 2, 3], dtype=np.uint32))
+    assert not sonEnteros(np.array(['00123', '45']))
+    assert not sonEnteros(np.array(['123', '45'], dtype=object))
+    assert not sonEnteros(np.array([2 ** 63], dtype=np.uint64))
+
+
+def test_corridas_igual_que_en_memoria(tmp_path):
+    bloque = bloqueDePrueba(np.arange(100, 200))
+    assert escribir(tmp_path, 'corridas.csv', bloque, 10) == escribir(tmp_path, 'memoria.csv', bloque, 1000)
+    assert not [fn for fn in tmp_path.iterdir() if fn.is_dir()]
+
+
+@pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+@pytest.mark.parametrize('max_filas', [10, 1000])
+def test_columnar(tmp_path, formato, max_filas):
+    pa = pytest.importorskip('pyarrow')
+    ipc = pytest.importorskip('pyarrow.ipc')
+    pq = pytest.importorskip('pyarrow.parquet')
+    ids = np.array(['00' + str(i) for i in range(100)])
+    bloque = bloqueDePrueba(ids)
+    fn = str(tmp_path / ('asignaciones.' + formato))
+    columnar = EscritorColumnar(fn, formato, ['1000', '2000', '3000'], [1, 2], sonEnteros(ids), max_filas=8)
+    texto = escribir(tmp_path, 'asignaciones.csv', bloque, max_filas, columnar)
+    if formato == 'parquet':
+        tabla = pq.read_table(fn)
+    else:
+        tabla = ipc.open_file(fn).read_all()
+    assert tabla.schema.field('IdPaciente').type == pa.string()
+    assert tabla.schema.field('fecha').type == pa.date32()
+    filas = [linea.split(',') for linea in texto.splitlines()[1:]]
+    assert tabla.column('IdPaciente').to_pylist() == [fila[0] for fila in filas]
+    assert [str(d) for d in tabla.column('codigoDependencia').to_pylist()] == [fila[1] for fila in filas]
+    assert [str(v) for v in tabla.column('tipo_vacuna').to_pylist()] == [fila[2] for fila in filas]
+    assert [str(f) for f in tabla.column('fecha').to_pylist()] == [fila[5][:10] for fila in filas]
+
+
+def test_error_borra_corridas(tmp_path):
+    bloque = bloqueDePrueba(np.arange(100, 200))
+    with pytest.raises(RuntimeError):
+        with EscritorAsignaciones(str(tmp_path / 'asignaciones.csv'), 10, str(tmp_path)) as escritor:
+            escritor.agregar(bloque)
+            assert escritor.temporal is not None
+            raise RuntimeError()
+    assert list(tmp_path.iterdir()) == []